@@ -0,0 +1,89 @@
+"""
+Two-scale ArUco detection (shared_utils/arucodetector.py) vs full resolution detectMarkers, on recorded frames.
+
+Run from main workspace:
+    python 0Diagnostics/bench_aruco.py shared_params.params recordings/flight_12_20250317_101500
+    python 0Diagnostics/bench_aruco.py shared_params.params some_video.mp4 --video --scale 0.5 --min-side 60
+
+Both run on every frame; full resolution is the reference. Reports per-frame detection time, how many of the
+reference's markers the two-scale detector found (and any extra ids), corner error (px) and the difference in
+estimated distance (cm, params' CAMERA_MATRIX / DIST_COEFF, 19cm markers) on the markers both found.
+"""
+
+import argparse, importlib, sys, time
+from pathlib import Path
+
+import cv2
+from cv2 import aruco
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))    # workspace root, same as PPFLY2
+
+from shared_utils.arucodetector import ArucoDetector
+
+def frames(args):
+    from shared_utils.flightrecorder import FlightRecording
+    from shared_utils.replay import RecordedFrameSource, VideoFileFrameSource
+    source = VideoFileFrameSource(args.recording) if args.video else RecordedFrameSource(FlightRecording(args.recording))
+    for _, frame in source:
+        yield frame
+
+def distance_cm(corner, params, marker_size):
+    _, tvecs, _ = aruco.estimatePoseSingleMarkers(corner.reshape(1, 4, 2), marker_size, params.CAMERA_MATRIX, params.DIST_COEFF)
+    return float(np.linalg.norm(tvecs[0][0]))
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) if samples else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-scale vs full resolution ArUco detection")
+    parser.add_argument("params_module", help="e.g. shared_params.params (camera matrix for pose)")
+    parser.add_argument("recording", help="FlightRecorder prefix, or a video file with --video")
+    parser.add_argument("--video", action="store_true")
+    parser.add_argument("--scale", type=float, default=0.5, help="search scale")
+    parser.add_argument("--min-side", type=float, default=60, help="min marker side (px) to search downscaled")
+    parser.add_argument("--marker-size", type=float, default=19.0, help="cm")
+    args = parser.parse_args()
+    params = importlib.import_module(args.params_module)
+
+    full = ArucoDetector(two_scale=False)
+    two_scale = ArucoDetector(two_scale=True, search_scale=args.scale, min_side_px=args.min_side)
+    times = {"full": [], "two_scale": []}
+    reference_markers = found = extra = 0
+    corner_errors, distance_errors = [], []
+
+    for frame in frames(args):
+        start = time.perf_counter()
+        ref_corners, ref_ids = full.detect(frame)
+        times["full"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        corners, ids = two_scale.detect(frame)
+        times["two_scale"].append((time.perf_counter() - start) * 1000)
+
+        reference = {} if ref_ids is None else dict(zip(ref_ids.flatten(), ref_corners))
+        detected = {} if ids is None else dict(zip(ids.flatten(), corners))
+        reference_markers += len(reference)
+        extra += len(set(detected) - set(reference))
+        for marker_id, ref_corner in reference.items():
+            if marker_id not in detected:
+                continue
+            found += 1
+            corner_errors.append(float(np.linalg.norm(detected[marker_id].reshape(4, 2) - ref_corner.reshape(4, 2), axis=1).mean()))
+            distance_errors.append(abs(distance_cm(detected[marker_id], params, args.marker_size)
+                                       - distance_cm(ref_corner, params, args.marker_size)))
+
+    n = len(times["full"])
+    if not n:
+        print("No frames.")
+        return
+    print(f"{n} frames, search scale {args.scale}, min side {args.min_side}px: {two_scale.metrics}")
+    for name, samples in times.items():
+        print(f"{name:>10}: mean {np.mean(samples):.2f}ms, p50 {percentile(samples, 50):.2f}ms, p95 {percentile(samples, 95):.2f}ms")
+    print(f"{'speedup':>10}: {np.mean(times['full']) / np.mean(times['two_scale']):.2f}x")
+    print(f"{'recall':>10}: {found}/{reference_markers} reference markers found, {extra} extra ids")
+    if corner_errors:
+        print(f"{'corners':>10}: mean {np.mean(corner_errors):.2f}px, p95 {percentile(corner_errors, 95):.2f}px, max {max(corner_errors):.2f}px")
+        print(f"{'distance':>10}: mean {np.mean(distance_errors):.2f}cm, p95 {percentile(distance_errors, 95):.2f}cm, max {max(distance_errors):.2f}cm")
+
+if __name__ == "__main__":
+    main()
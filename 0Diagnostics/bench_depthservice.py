@@ -0,0 +1,109 @@
+"""
+Aggregate depth FPS for 1..N drone processes: each process with its own MiDaS (as flown so far) vs all of them
+sharing one batched shared_utils/depthservice.py. Needs the MiDaS weights (torch.hub cache or internet).
+
+Run from main workspace:
+    python 0Diagnostics/bench_depthservice.py --clients 4 --duration 20
+    python 0Diagnostics/bench_depthservice.py --clients 4 --video some_video.mp4 --window-ms 10
+
+Every client loops "frame -> depth colormap" as fast as it can, like navigation_thread does. Model loading is
+excluded: timing starts once every process is ready.
+"""
+
+import argparse, multiprocessing, sys, time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))    # workspace root, same as PPFLY2
+
+from shared_utils.depthservice import DepthService, DepthClient, load_midas_model, depth_to_colormap
+
+def load_frame(video: str = None) -> np.ndarray:
+    """First frame of video, or a fixed random 480P frame"""
+    if video:
+        ret, frame = cv2.VideoCapture(video).read()
+        if ret:
+            return frame
+    return np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+def local_worker(frame, duration_s, ready, start, results):
+    """One drone process with its own model, batch size 1 (DroneController.generate_color_depth_map)"""
+    import torch
+    midas, transform, device = load_midas_model()
+    ready.wait()
+    start.wait()
+    count, end = 0, time.time() + duration_s
+    while time.time() < end:
+        with torch.no_grad():
+            prediction = midas(transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)).to(device))
+        depth_to_colormap(prediction.squeeze().cpu().numpy())
+        count += 1
+    results.put(count)
+
+def client_worker(port, frame, duration_s, ready, start, results):
+    """One drone process using the depth service"""
+    client = DepthClient(port, timeout=30)
+    ready.wait()
+    start.wait()
+    count, end = 0, time.time() + duration_s
+    while time.time() < end:
+        client.generate_color_depth_map(frame)
+        count += 1
+    client.close()
+    results.put(count)
+
+def service_worker(port, window_s, max_batch):
+    DepthService(port, batch_window_s=window_s, max_batch=max_batch).serve_forever()
+
+def run(n: int, target, args_for, duration_s: float) -> float:
+    """Starts n worker processes, releases them together, returns aggregate frames per second"""
+    ready = multiprocessing.Barrier(n + 1)
+    start = multiprocessing.Barrier(n + 1)
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=target, args=args_for(ready, start, results)) for _ in range(n)]
+    for proc in procs:
+        proc.start()
+    ready.wait()    # all models loaded / connected
+    start.wait()
+    counts = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    return sum(counts) / duration_s
+
+def wait_for_service(port: int, timeout_s: float = 120):
+    end = time.time() + timeout_s
+    while time.time() < end:
+        try:
+            DepthClient(port).close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"Depth service on port {port} did not start within {timeout_s}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-process MiDaS vs shared batched depth service")
+    parser.add_argument("--clients", type=int, default=4, help="benchmark 1..clients processes")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per measurement")
+    parser.add_argument("--video", help="take the test frame from this video (default: random 480P frame)")
+    parser.add_argument("--port", type=int, default=6099)
+    parser.add_argument("--window-ms", type=float, default=10)
+    parser.add_argument("--max-batch", type=int, default=4)
+    args = parser.parse_args()
+    frame = load_frame(args.video)
+
+    service = multiprocessing.Process(target=service_worker, args=(args.port, args.window_ms / 1000, args.max_batch), daemon=True)
+    service.start()
+    wait_for_service(args.port)
+
+    print(f"{'clients':>8} {'own model (fps)':>16} {'depth service (fps)':>20} {'speedup':>8}")
+    for n in range(1, args.clients + 1):
+        local_fps = run(n, local_worker, lambda ready, start, results: (frame, args.duration, ready, start, results), args.duration)
+        service_fps = run(n, client_worker, lambda ready, start, results: (args.port, frame, args.duration, ready, start, results), args.duration)
+        print(f"{n:>8} {local_fps:>16.1f} {service_fps:>20.1f} {service_fps / local_fps:>7.2f}x")
+
+    service.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmarks N drones as N processes (one UnknownArea_v2.main per drone, as flown so far) against ONE process
+(UnknownArea_v2.fleet: shared MiDaS model + shared perception pool). Uses the offline replay, so no drones needed.
+
+Run from main workspace:
+    python 0Diagnostics/bench_fleet.py shared_params.params recordings/flight_12_20250317_101500 --drones 4
+    python 0Diagnostics/bench_fleet.py shared_params.params some_video.mp4 --video --drones 4
+    python 0Diagnostics/bench_fleet.py shared_params.params some_video.mp4 --video --drones 4 --stand-in-midas
+
+Both modes replay in realtime (recorded speed), so they get the same frames per second and any difference is
+overhead: an interpreter + torch + MiDaS per process, and N torch thread pools competing for the same cores.
+Reports total CPU seconds, peak total RSS and navigation rate per drone for each mode.
+--stand-in-midas: without access to torch hub, a random-weight network of MiDaS_small's size and cost runs the depth
+stage instead (depthservice.load_stand_in_model), so the shared model and perception pool are still exercised.
+Uses psutil if installed, otherwise /proc (Linux only).
+"""
+
+import argparse, json, os, subprocess, sys, tempfile, threading, time
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+WORKSPACE = Path(__file__).resolve().parent.parent
+sys.path.append(str(WORKSPACE))    # workspace root, same as PPFLY2
+
+def process_usage(pid: int):
+    """Returns (rss bytes, cpu seconds) of pid, or None once it has exited"""
+    try:
+        if psutil:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                cpu = proc.cpu_times()
+                return proc.memory_info().rss, cpu.user + cpu.system
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return rss, (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return None
+
+def run_and_measure(commands: list, sample_s: float = 0.2) -> dict:
+    """Starts every command as a child process, samples memory / CPU until all have exited"""
+    children_start = os.times()
+    wall_start = time.time()
+    procs = [subprocess.Popen(cmd, cwd=WORKSPACE, stdout=subprocess.DEVNULL) for cmd in commands]
+    last_cpu = {p.pid: 0.0 for p in procs}
+    peak_rss = 0
+    while any(p.poll() is None for p in procs):
+        total_rss = 0
+        for p in procs:
+            usage = process_usage(p.pid)
+            if usage:
+                total_rss += usage[0]
+                last_cpu[p.pid] = usage[1]
+        peak_rss = max(peak_rss, total_rss)
+        time.sleep(sample_s)
+    wall = time.time() - wall_start
+
+    children_end = os.times()   # exact for exited children on Linux / macOS, zero on Windows
+    cpu = (children_end.children_user - children_start.children_user
+           + children_end.children_system - children_start.children_system)
+    return {
+        "processes": len(procs),
+        "wall_s": round(wall, 1),
+        "cpu_s": round(max(cpu, sum(last_cpu.values())), 1),
+        "cpu_percent": round(max(cpu, sum(last_cpu.values())) / wall * 100, 1),
+        "peak_rss_mb": round(peak_rss / 1e6, 1),
+        "exit_codes": [p.returncode for p in procs],
+    }
+
+def nav_rate(report: dict) -> float:
+    """navigation_thread iterations per second in one replay report"""
+    count = report["stage_timings_ms"].get("detect_or_track_markers", {}).get("count", 0)
+    return round(count / report["wall_time_s"], 2) if report["wall_time_s"] else 0.0
+
+def fleet_worker(args):
+    """Child process for the fleet mode: N replays in one process, sharing MiDaS and a perception pool"""
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+    import UnknownArea_v2.replay as replay
+    from shared_utils.depthservice import load_midas_model, load_stand_in_model
+
+    logging.basicConfig(level=logging.WARNING)
+    replay.params.NO_FLY = False
+    midas = None if args.no_midas else load_stand_in_model() if args.stand_in_midas else load_midas_model()
+    pool = ThreadPoolExecutor(max_workers=args.perception_workers, thread_name_prefix="perception")
+    reports = [None] * args.drones
+
+    def run(i):
+        frame_source, sensor_source = make_sources(args)
+        reports[i] = replay.run_replay(frame_source, sensor_source, drone_id=i + 1, realtime=True,
+                                       load_midas=not args.no_midas, midas=midas, perception_pool=pool)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(args.drones)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with open(args.fleet_worker, "w") as f:
+        json.dump(reports, f)
+
+def make_sources(args):
+    from shared_utils.flightrecorder import FlightRecording
+    from shared_utils.replay import RecordedFrameSource, RecordedSensorSource, VideoFileFrameSource, SensorSource
+    if args.video:
+        return VideoFileFrameSource(args.recording), SensorSource()
+    recording = FlightRecording(args.recording)
+    return RecordedFrameSource(recording), RecordedSensorSource(recording)
+
+def main():
+    parser = argparse.ArgumentParser(description="N processes vs one fleet process, on replayed video")
+    parser.add_argument("params_module", help="e.g. shared_params.params (also read by load_params)")
+    parser.add_argument("recording", help="FlightRecorder prefix, or a video file with --video")
+    parser.add_argument("--video", action="store_true", help="recording is a plain video file")
+    parser.add_argument("--drones", type=int, default=4)
+    parser.add_argument("--perception-workers", type=int, default=2, help="fleet mode only")
+    parser.add_argument("--no-midas", action="store_true", help="skip MiDaS in both modes")
+    parser.add_argument("--stand-in-midas", action="store_true", help="stand-in network instead of MiDaS in both modes")
+    parser.add_argument("--fleet-worker", help=argparse.SUPPRESS)   # internal: run as the fleet process, write reports here
+    args = parser.parse_args()
+
+    if args.fleet_worker:
+        fleet_worker(args)
+        return
+
+    extra = ((["--video"] if args.video else []) + (["--no-midas"] if args.no_midas else [])
+             + (["--stand-in-midas"] if args.stand_in_midas else []))
+    with tempfile.TemporaryDirectory() as tmp:
+        # Mode 1: one process per drone
+        outs = [os.path.join(tmp, f"replay_{i}.json") for i in range(args.drones)]
+        separate = run_and_measure([[sys.executable, "-m", "UnknownArea_v2.replay", args.params_module, args.recording,
+                                     "--realtime", "--out", out] + extra for out in outs])
+        separate["nav_hz_per_drone"] = [nav_rate(json.load(open(out))) for out in outs if os.path.exists(out)]
+
+        # Mode 2: one process for all drones
+        fleet_out = os.path.join(tmp, "fleet.json")
+        fleet = run_and_measure([[sys.executable, str(Path(__file__).resolve()), args.params_module, args.recording,
+                                  "--drones", str(args.drones), "--perception-workers", str(args.perception_workers),
+                                  "--fleet-worker", fleet_out] + extra])
+        fleet["nav_hz_per_drone"] = [nav_rate(r) for r in json.load(open(fleet_out))] if os.path.exists(fleet_out) else []
+
+    depth = "no MiDaS" if args.no_midas else "stand-in MiDaS" if args.stand_in_midas else "MiDaS"
+    print(f"{args.drones} drones, {depth}, {os.cpu_count()} cores")
+    for name, result in (("separate processes", separate), ("one fleet process", fleet)):
+        print(f"{name:>20}: " + ", ".join(f"{k} {v}" for k, v in result.items()))
+    if separate["cpu_s"] and separate["peak_rss_mb"]:
+        print(f"{'fleet / separate':>20}: cpu {fleet['cpu_s'] / separate['cpu_s']:.2f}x, "
+              f"memory {fleet['peak_rss_mb'] / separate['peak_rss_mb']:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Swarm load and convergence benchmark: N simulated MarkerClients against a headless swarm server, on localhost.
+
+Run from main workspace:
+    python 0Diagnostics/bench_swarm.py
+    python 0Diagnostics/bench_swarm.py --drones 2 10 50 100 --rate 10 --duration 10 --json swarm_bench.json
+
+Per N, the server (swarmserver/swarmcore.py) runs in its own process, and the N clients (real MarkerClients, with
+their sender / receiver threads) are spread over --workers processes, so no single Python process hosts hundreds of
+threads (on a drone there is one client per process). Then:
+1. takeoff: every drone calls client_takeoff_simul with all N drone ids, and waits for the server's release;
+2. traffic for --duration: each drone sends --rate updates/s, as a searching drone does (marker detections, some
+   marked lost, some landings, waypoint occupancy, status strings);
+3. probes: every --probe-s a drone claims a fresh marker id; convergence latency is the time from its send_update()
+   call until the claim is in every client's marker_status (time.monotonic, the same clock in every process).
+
+Reported per N: server throughput (messages processed/s), convergence p50 / p99 / max and probes that never
+converged, messages expired (never acked) and retransmits by the clients, retransmits the server dropped as
+duplicates, takeoff release time and spread, and CPU per process (% of one core; clients: the busiest worker).
+--json writes the same as a list of records, to compare runs for regressions.
+"""
+
+import argparse, json, logging, multiprocessing, random, sys, threading, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))    # workspace root, same as PPFLY2
+
+from swarmserver.swarmcore import SwarmCore
+from swarmserver.swarmserverclient import MarkerClient
+
+PROBE_BASE = 10000      # probe marker ids, never sent by the traffic
+PROBES_PER_WORKER = 100000
+
+def serve(port, conn):
+    """Server process: runs until told to stop, then reports its CPU time and metrics"""
+    logging.basicConfig(level=logging.ERROR)
+    core = SwarmCore(host="127.0.0.1", port=port).start_thread()
+    conn.send("started")
+    conn.recv()     # traffic starts
+    cpu_start = time.process_time()
+    conn.recv()     # traffic done
+    conn.send({"cpu_s": time.process_time() - cpu_start, "metrics": dict(core.metrics), "clients": len(core.clients)})
+    core.stop()
+
+class ProbeClient(MarkerClient):
+    """MarkerClient that records when each probe marker first shows up in its state"""
+    def __init__(self, *args, **kwargs):
+        self.probe_seen = {}    # probe marker id -> time.monotonic() when applied
+        super().__init__(*args, **kwargs)
+
+    def _apply_state(self, message, replace=False):
+        super()._apply_state(message, replace)
+        now = time.monotonic()
+        for marker_id, entry in message.get("marker_status", {}).items():
+            if int(marker_id) >= PROBE_BASE and entry.get("detected") and marker_id not in self.probe_seen:
+                self.probe_seen[marker_id] = now
+
+def traffic(client, rate, duration, markers):
+    """What a searching drone sends: mostly marker detections, some lost / landed markers, waypoints and status"""
+    rng = random.Random(client.drone_id)
+    interval = 1 / rate
+    start = next_send = time.monotonic()
+    n = 0
+    while next_send - start < duration:
+        now = time.monotonic()
+        if now < next_send:
+            time.sleep(next_send - now)
+        kind = rng.random()
+        marker_id = rng.randint(1, markers)
+        if kind < 0.6:
+            client.send_update("marker", marker_id, detected=True)
+        elif kind < 0.7:
+            client.send_update("marker", marker_id, detected=False)
+        elif kind < 0.75:
+            client.send_update("marker", marker_id, landed=True)
+        elif kind < 0.9:
+            client.send_update("waypoint", rng.randint(1, markers), detected=rng.random() < 0.5)
+        else:
+            client.send_update("status", status_message=f"Searching, frame {n}")
+        n += 1
+        next_send += interval
+
+def worker(index, drone_ids, all_drone_ids, port, args, conn):
+    """Client process: hosts drone_ids, runs the phases when told, then reports"""
+    logging.basicConfig(level=logging.ERROR)
+    clients = [ProbeClient(drone_id=drone_id, server_port=port, broadcast_ip="127.0.0.1") for drone_id in drone_ids]
+
+    conn.recv()     # takeoff
+    released = {}
+    def wait_takeoff(client):
+        client.client_takeoff_simul(all_drone_ids, status_message="bench")
+        released[client.drone_id] = time.monotonic()
+    threads = [threading.Thread(target=wait_takeoff, args=(client,), daemon=True) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(args.takeoff_timeout)
+    conn.send(released)
+
+    conn.recv()     # traffic
+    cpu_start = time.process_time()
+    threads = [threading.Thread(target=traffic, args=(client, args.rate, args.duration, args.markers), daemon=True)
+               for client in clients]
+    for thread in threads:
+        thread.start()
+    probes = {}     # probe marker id -> time.monotonic() of send_update
+    rng = random.Random(index)
+    probe_id = PROBE_BASE + index * PROBES_PER_WORKER
+    start = time.monotonic()
+    while time.monotonic() - start < args.duration:
+        time.sleep(args.probe_s * args.workers)     # one probe per probe_s over all workers
+        probe_id += 1
+        probes[str(probe_id)] = time.monotonic()
+        rng.choice(clients).send_update("marker", probe_id, detected=True)
+    for thread in threads:
+        thread.join()
+    for client in clients:
+        client.flush(2.0)
+    conn.send("sent")
+
+    conn.recv()     # report
+    conn.send({"cpu_s": time.process_time() - cpu_start, "probes": probes,
+               "seen": [client.probe_seen for client in clients],
+               "send_metrics": [client.send_metrics for client in clients]})
+    for client in clients:
+        client.cleanup(flush_timeout=0)
+
+def run(n, args, port):
+    server_conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(port, child_conn), daemon=True)
+    server.start()
+    server_conn.recv()
+
+    drone_ids = list(range(1, n + 1))
+    workers = []
+    for index in range(min(args.workers, n)):
+        conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=worker, args=(index, drone_ids[index::args.workers], drone_ids, port,
+                                                               args, child_conn), daemon=True)
+        process.start()
+        workers.append((process, conn))
+    def broadcast(command):
+        for _, conn in workers:
+            conn.send(command)
+    def gather():
+        return [conn.recv() for _, conn in workers]
+
+    # 1. takeoff barrier
+    takeoff_start = time.monotonic()
+    broadcast("takeoff")
+    released = {drone_id: t for report in gather() for drone_id, t in report.items()}
+
+    # 2. traffic and 3. probes
+    server_conn.send("measure")
+    start = time.monotonic()
+    broadcast("traffic")
+    gather()
+    time.sleep(args.probe_timeout)      # last probes and deltas
+    elapsed = time.monotonic() - start
+    server_conn.send("stop")
+    server_report = server_conn.recv()
+    broadcast("report")
+    reports = gather()
+    for process, _ in workers:
+        process.join(2.0)
+    server.join(2.0)
+
+    seen = [client_seen for report in reports for client_seen in report["seen"]]
+    convergence, not_converged, probes = [], 0, 0
+    for report in reports:
+        for marker_id, sent in report["probes"].items():
+            probes += 1
+            times = [client_seen.get(marker_id) for client_seen in seen]
+            if None in times or max(times) - sent > args.probe_timeout:
+                not_converged += 1
+            else:
+                convergence.append((max(times) - sent) * 1000)
+    send_metrics = [metrics for report in reports for metrics in report["send_metrics"]]
+    send_totals = {key: sum(metrics[key] for metrics in send_metrics) for key in send_metrics[0]}
+    release_times = sorted(released.values())
+    return {
+        "drones": n,
+        "rate_per_drone": args.rate,
+        "workers": len(workers),
+        "duration_s": round(elapsed, 2),
+        "server_msgs_per_s": round(server_report["metrics"]["messages_received"] / elapsed, 1),
+        "convergence_p50_ms": round(float(np.percentile(convergence, 50)), 2) if convergence else None,
+        "convergence_p99_ms": round(float(np.percentile(convergence, 99)), 2) if convergence else None,
+        "convergence_max_ms": round(max(convergence), 2) if convergence else None,
+        "probes": probes,
+        "probes_not_converged": not_converged,
+        "client_expired": send_totals["expired"],
+        "client_retransmits": send_totals["retransmits"],
+        "client_superseded": send_totals["superseded"],
+        "server_duplicates": server_report["metrics"]["duplicates"],
+        "server_deltas_sent": server_report["metrics"]["deltas_sent"],
+        "takeoff_released": len(released),
+        "takeoff_time_ms": round((release_times[-1] - takeoff_start) * 1000, 1) if release_times else None,
+        "takeoff_spread_ms": round((release_times[-1] - release_times[0]) * 1000, 1) if release_times else None,
+        "server_cpu_pct": round(100 * server_report["cpu_s"] / elapsed, 1),
+        "clients_cpu_pct": round(100 * max(report["cpu_s"] for report in reports) / elapsed, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Swarm server load and convergence benchmark")
+    parser.add_argument("--drones", type=int, nargs="+", default=[2, 5, 10, 25, 50, 100])
+    parser.add_argument("--rate", type=float, default=10, help="updates/s per drone")
+    parser.add_argument("--markers", type=int, default=30, help="marker / waypoint ids the traffic uses")
+    parser.add_argument("--duration", type=float, default=5.0, help="s of traffic per N")
+    parser.add_argument("--probe-s", type=float, default=0.2, help="s between convergence probes")
+    parser.add_argument("--probe-timeout", type=float, default=2.0, help="s after which a probe has not converged")
+    parser.add_argument("--takeoff-timeout", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=min(8, multiprocessing.cpu_count()), help="client processes")
+    parser.add_argument("--port", type=int, default=5085)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    columns = [("drones", "N"), ("server_msgs_per_s", "msgs/s"), ("convergence_p50_ms", "conv p50"),
+               ("convergence_p99_ms", "conv p99"), ("probes_not_converged", "lost"), ("client_expired", "expired"),
+               ("client_retransmits", "retx"), ("server_duplicates", "dups"), ("takeoff_spread_ms", "takeoff spread"),
+               ("server_cpu_pct", "srv cpu%"), ("clients_cpu_pct", "cli cpu%")]
+    print(" ".join(f"{title:>{max(len(title), 8)}}" for _, title in columns))
+    results = []
+    for index, n in enumerate(args.drones):
+        result = run(n, args, args.port + index)
+        results.append(result)
+        print(" ".join(f"{str(result[key]):>{max(len(title), 8)}}" for key, title in columns), flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
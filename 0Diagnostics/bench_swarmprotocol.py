@@ -0,0 +1,76 @@
+"""
+Swarm message encodings (swarmserver/swarmprotocol.py) vs the old one JSON datagram per message.
+
+Run from main workspace:
+    python 0Diagnostics/bench_swarmprotocol.py
+    python 0Diagnostics/bench_swarmprotocol.py --markers 8 64 512 --repeat 2000
+
+For a small client update, an ack, a delta and snapshots of N markers / waypoints: bytes on the wire, datagrams,
+and encode / decode time per message (mean, p95). JSON datagrams above 1024 bytes were truncated by the old
+recvfrom(1024) (marked TRUNCATED).
+"""
+
+import argparse, sys, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))    # workspace root, same as PPFLY2
+
+from swarmserver import swarmprotocol
+
+def snapshot(n):
+    now = time.time()
+    return {"type": "snapshot", "version": 12345,
+            "marker_status": {str(i): {"detected": i % 3 == 0, "landed": i % 5 == 0, "drone_id": i % 8 + 1}
+                              for i in range(1, n + 1)},
+            "waypoint_status": {str(i): {"occupied": i % 2 == 0, "drone_id": i % 8 + 1, "last_occupied_time": now + i}
+                                for i in range(1, n + 1)}}
+
+def messages(marker_counts):
+    yield "marker update", {"type": "marker", "marker_id": 3, "detected": True, "drone_id": 2, "v": 120, "id": 57}
+    yield "ack", {"type": "ack", "drone_id": 2, "v": 121}
+    yield "delta (3 entries)", {"type": "delta", "base": 118, "version": 121,
+                                "marker_status": {"3": {"detected": True, "landed": False, "drone_id": 2}},
+                                "waypoint_status": {"7": {"occupied": True, "drone_id": 2}, "8": {"occupied": False, "drone_id": 4}}}
+    for n in marker_counts:
+        yield f"snapshot ({n} markers)", snapshot(n)
+
+def time_us(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return float(np.mean(samples)), float(np.percentile(samples, 95))
+
+def main():
+    parser = argparse.ArgumentParser(description="swarmprotocol frames vs JSON datagrams")
+    parser.add_argument("--markers", type=int, nargs="+", default=[8, 64, 512], help="snapshot sizes")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'message':>22} | {'json bytes':>10} {'encode us':>14} {'decode us':>14} | "
+          f"{'framed bytes':>12} {'dgrams':>6} {'encode us':>14} {'decode us':>14}")
+    for name, message in messages(args.markers):
+        legacy = swarmprotocol.encode_json(message)
+        legacy_encode = time_us(lambda: swarmprotocol.encode_json(message), args.repeat)
+        legacy_decode = time_us(lambda: swarmprotocol.decode(legacy), args.repeat)
+
+        datagrams = swarmprotocol.encode(message)
+        framed_encode = time_us(lambda: swarmprotocol.encode(message), args.repeat)
+        reassembler = swarmprotocol.Reassembler()
+        def decode():
+            for datagram in datagrams:
+                reassembler.feed(datagram, "bench")
+        framed_decode = time_us(decode, args.repeat)
+        assert reassembler.feed(datagrams[0], "check") == message if len(datagrams) == 1 else True
+
+        truncated = " TRUNCATED" if len(legacy) > 1024 else ""
+        print(f"{name:>22} | {len(legacy):>10} {legacy_encode[0]:>6.1f} p95 {legacy_encode[1]:>5.1f} "
+              f"{legacy_decode[0]:>6.1f} p95 {legacy_decode[1]:>5.1f} | "
+              f"{sum(map(len, datagrams)):>12} {len(datagrams):>6} {framed_encode[0]:>6.1f} p95 {framed_encode[1]:>5.1f} "
+              f"{framed_decode[0]:>6.1f} p95 {framed_decode[1]:>5.1f}{truncated}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Load test of the headless swarm server (swarmserver/swarmcore.py): how many client updates per second it processes.
+
+Run from main workspace:
+    python 0Diagnostics/bench_swarmserver.py
+    python 0Diagnostics/bench_swarmserver.py --rate 2000 5000 10000 --senders 16 --duration 5
+
+The server runs in its own process (as in the field). Each sender is one UDP socket, like a MarkerClient, sending
+framed marker / waypoint / status updates with message ids at its share of --rate. The server acks every message it
+processes, so per offered rate this reports the acked rate, ack latency (send -> "received", p50 / p99) and the
+messages never acked (dropped by the socket buffers when the server falls behind).
+"""
+
+import argparse, multiprocessing, socket, sys, threading, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))    # workspace root, same as PPFLY2
+
+from swarmserver import swarmprotocol
+from swarmserver.swarmcore import SwarmCore
+
+def serve(port, markers):
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+    SwarmCore(host="127.0.0.1", port=port, valid_ids=range(1, markers + 1)).run()
+
+def update(drone_id, n, markers):
+    """The n-th update of a drone: mostly marker detections, some waypoints and status strings"""
+    kind = n % 10
+    if kind < 7:
+        return {"type": "marker", "marker_id": n % markers + 1, "detected": n % 3 != 0, "drone_id": drone_id}
+    if kind < 9:
+        return {"type": "waypoint", "marker_id": n % markers + 1, "detected": n % 2 == 0, "drone_id": drone_id}
+    return {"type": "status", "drone_id": drone_id, "status": f"Searching, frame {n}"}
+
+class Sender:
+    def __init__(self, drone_id, port, markers):
+        self.drone_id = drone_id
+        self.addr = ("127.0.0.1", port)
+        self.markers = markers
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.sent_at = {}       # message id -> send time
+        self.latencies = []
+        self.running = True
+        threading.Thread(target=self.receive, daemon=True).start()
+
+    def receive(self):
+        reassembler = swarmprotocol.Reassembler()
+        while self.running:
+            try:
+                data, addr = self.sock.recvfrom(swarmprotocol.MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            message = reassembler.feed(data, addr)
+            if message and message.get("type") == "received":
+                sent = self.sent_at.pop(message["id"], None)
+                if sent is not None:
+                    self.latencies.append(time.perf_counter() - sent)
+
+    def send(self, rate, duration, first_id):
+        interval = 1 / rate
+        start = next_send = time.perf_counter()
+        n = first_id
+        while next_send - start < duration:
+            now = time.perf_counter()
+            if now < next_send:
+                time.sleep(next_send - now)
+            message = update(self.drone_id, n, self.markers)
+            message["id"] = n
+            self.sent_at[n] = time.perf_counter()
+            self.sock.sendto(swarmprotocol.encode(message)[0], self.addr)
+            n += 1
+            next_send += interval
+        return n
+
+def main():
+    parser = argparse.ArgumentParser(description="Swarm server throughput under load")
+    parser.add_argument("--rate", type=int, nargs="+", default=[1000, 3000, 6000], help="offered updates/s (total)")
+    parser.add_argument("--senders", type=int, default=8, help="simulated drones (sockets)")
+    parser.add_argument("--markers", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=3.0, help="s per rate")
+    parser.add_argument("--port", type=int, default=5075)
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve, args=(args.port, args.markers), daemon=True)
+    server.start()
+    time.sleep(1.0)
+    senders = [Sender(drone_id, args.port, args.markers) for drone_id in range(1, args.senders + 1)]
+    next_id = 1
+    try:
+        print(f"{args.senders} senders, {args.markers} markers, {args.duration:g}s per rate")
+        print(f"{'offered/s':>10} {'sent/s':>8} {'acked/s':>8} {'unacked':>8} {'ack p50 ms':>11} {'ack p99 ms':>11}")
+        for rate in args.rate:
+            for sender in senders:
+                sender.sent_at.clear()
+                sender.latencies = []
+            threads, results = [], {}
+            start = time.perf_counter()
+            for sender in senders:
+                def run(sender=sender, first_id=next_id):
+                    results[sender.drone_id] = sender.send(rate / len(senders), args.duration, first_id) - first_id
+                threads.append(threading.Thread(target=run))
+                threads[-1].start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            time.sleep(0.5)     # late acks
+            next_id += max(results.values()) + 1
+            sent = sum(results.values())
+            latencies = [ms * 1000 for sender in senders for ms in sender.latencies]
+            unacked = sum(len(sender.sent_at) for sender in senders)
+            p50, p99 = (np.percentile(latencies, 50), np.percentile(latencies, 99)) if latencies else (0, 0)
+            print(f"{rate:>10} {sent / elapsed:>8.0f} {len(latencies) / elapsed:>8.0f} {unacked:>8} {p50:>11.2f} {p99:>11.2f}")
+    finally:
+        for sender in senders:
+            sender.running = False
+        server.terminate()
+
+if __name__ == "__main__":
+    main()
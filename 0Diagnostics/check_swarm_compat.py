@@ -0,0 +1,106 @@
+"""
+Mixed-version check of the swarm server / MarkerClient, as during a rollout: the current ones against the old,
+JSON-only swarmserverclient.py.
+
+Run from main workspace:
+    python 0Diagnostics/check_swarm_compat.py
+    python 0Diagnostics/check_swarm_compat.py --legacy-rev c4d4270
+
+The old swarmserverclient.py is read from git (--legacy-rev: a commit before the framed protocol), so it needs
+tkinter, as it always did. Checks, on localhost:
+1. current server (swarmcore.py), an old and a current client: a marker / waypoint claimed by one client is
+   unavailable to the other.
+2. old server (its message and timeout threads, without its Tk window), an old and a current client: the current
+   client falls back to JSON, then the same.
+Prints one line per check; exits with 1 if any failed.
+"""
+
+import argparse, importlib.util, logging, socket, subprocess, sys, tempfile, threading, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))    # workspace root, same as PPFLY2
+
+from swarmserver.swarmcore import SwarmCore
+from swarmserver.swarmserverclient import MarkerClient
+
+def load_legacy(rev):
+    """swarmserverclient.py as of git revision rev, as a module"""
+    source = subprocess.run(["git", "show", f"{rev}:swarmserver/swarmserverclient.py"], cwd=ROOT, check=True,
+                            capture_output=True).stdout
+    path = Path(tempfile.mkdtemp()) / "legacy_swarmserverclient.py"
+    path.write_bytes(source)
+    spec = importlib.util.spec_from_file_location("legacy_swarmserverclient", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def legacy_server(legacy, port):
+    """The old MarkerServer's message and timeout threads, without its Tk window (set up as its __init__ does)"""
+    server = legacy.MarkerServer.__new__(legacy.MarkerServer)
+    server.host, server.port = "127.0.0.1", port
+    server.marker_timeout, server.waypoint_timeout = 5, 10
+    server.marker_status, server.drone_status, server.waypoints_status = {}, {}, {}
+    server.takeoff_waitlist, server.clients = set(), set()
+    server.lock = threading.Lock()
+    server.last_updates = {}
+    server.takeoff_triggered = False
+    server.show_waypoints_window = False
+    server.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.sock.bind((server.host, server.port))
+    server.broadcast_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.valid_ids = set(range(1, 9))
+    for target in (server.handle_messages, server.check_timeouts):
+        threading.Thread(target=target, daemon=True).start()
+    return server
+
+def wait_for(condition, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+def check_claims(name, claimer, observer, marker_id, timeout):
+    """claimer detects marker_id and occupies waypoint marker_id; both must become unavailable to observer"""
+    claimer.send_update("marker", marker_id, detected=True)
+    claimer.send_update("waypoint", marker_id, detected=True)
+    ok = wait_for(lambda: not observer.is_marker_available(marker_id) and not observer.is_waypoint_available(marker_id),
+                  timeout)
+    print(f"{'OK  ' if ok else 'FAIL'} {name}: marker / waypoint {marker_id} claimed by {type(claimer).__module__} "
+          f"client is {'' if ok else 'still '}{'un' if ok else ''}available to {type(observer).__module__} client")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Current swarm server / client against the old JSON-only ones")
+    parser.add_argument("--legacy-rev", default="c4d4270", help="git revision of the old swarmserverclient.py")
+    parser.add_argument("--port", type=int, default=5095)
+    parser.add_argument("--timeout", type=float, default=3.0, help="s for a claim to reach the other client")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    legacy = load_legacy(args.legacy_rev)
+
+    results = []
+    core = SwarmCore(host="127.0.0.1", port=args.port).start_thread()
+    old = legacy.MarkerClient(drone_id=1, server_port=args.port, broadcast_ip="127.0.0.1")
+    new = MarkerClient(drone_id=2, server_port=args.port, broadcast_ip="127.0.0.1")
+    results.append(check_claims("current server", new, old, 3, args.timeout))
+    results.append(check_claims("current server", old, new, 5, args.timeout))
+    new.cleanup()
+    core.stop()
+
+    legacy_server(legacy, args.port + 1)
+    old = legacy.MarkerClient(drone_id=1, server_port=args.port + 1, broadcast_ip="127.0.0.1")
+    new = MarkerClient(drone_id=2, server_port=args.port + 1, broadcast_ip="127.0.0.1")
+    ok = wait_for(lambda: new.legacy_server, args.timeout)
+    print(f"{'OK  ' if ok else 'FAIL'} old server: current client {'fell back' if ok else 'did not fall back'} to JSON")
+    results.append(ok)
+    results.append(check_claims("old server", new, old, 3, args.timeout))
+    results.append(check_claims("old server", old, new, 5, args.timeout))
+    new.cleanup()
+
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    main()
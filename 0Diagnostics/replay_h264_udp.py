@@ -0,0 +1,72 @@
+"""
+Tests shared_utils/videodecoder.py without a drone: sends a recorded raw .h264 file over loopback UDP
+in Tello-sized datagrams, decodes it with H264DecoderThread and prints the decoder metrics.
+
+Run from main workspace:
+    python 0Diagnostics/replay_h264_udp.py recording.h264 --fps 15 --threads 2 --budget 0.25
+
+Use --slow-decode to simulate a decoder that falls behind (checks the drop / skip-to-keyframe logic).
+"""
+
+import argparse, socket, sys, time, logging
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))    # workspace root, same as PPFLY2
+
+from shared_utils.videodecoder import H264DecoderThread
+
+DATAGRAM_SIZE = 1460    # Tello's video datagram size
+
+def split_access_units(data: bytes) -> list:
+    """Splits an Annex-B stream before every slice NAL unit (types 1 and 5), so each chunk is roughly one frame"""
+    starts = []
+    i = data.find(b'\x00\x00\x01')
+    while i != -1:
+        nal_type = data[i+3] & 0x1F if i + 3 < len(data) else 0
+        if nal_type in (1, 5, 7):   # 7 = SPS, which precedes a keyframe
+            start = i - 1 if i > 0 and data[i-1] == 0 else i
+            if not starts or nal_type != 5 or data[starts[-1]:start].find(b'\x00\x00\x01\x67') == -1:
+                starts.append(start)
+        i = data.find(b'\x00\x00\x01', i + 3)
+    starts.append(len(data))
+    return [data[a:b] for a, b in zip(starts, starts[1:]) if b > a]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a .h264 file over loopback UDP into H264DecoderThread")
+    parser.add_argument("filename", help="raw H.264 (Annex-B) file, e.g. from FlightRecorder")
+    parser.add_argument("--port", type=int, default=11111)
+    parser.add_argument("--fps", type=float, default=15)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--budget", type=float, default=0.25, help="latency budget in seconds")
+    parser.add_argument("--slow-decode", type=float, default=0, help="extra seconds of work per frame in the frame callback")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(asctime)s - %(message)s")
+
+    def on_frame(frame, capture_time):
+        if args.slow_decode:
+            time.sleep(args.slow_decode)
+
+    decoder = H264DecoderThread(args.port, host='127.0.0.1', decoder_threads=args.threads,
+                                latency_budget_s=args.budget, frame_callback=on_frame).start()
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    chunks = split_access_units(Path(args.filename).read_bytes())
+    logging.info(f"Sending {len(chunks)} access units at {args.fps} fps to 127.0.0.1:{args.port}")
+
+    start_time = time.time()
+    for n, chunk in enumerate(chunks):
+        for i in range(0, len(chunk), DATAGRAM_SIZE):
+            sender.sendto(chunk[i:i+DATAGRAM_SIZE], ('127.0.0.1', args.port))
+        time.sleep(max(0, start_time + (n + 1) / args.fps - time.time()))
+
+    time.sleep(1)   # let the decoder drain
+    metrics = decoder.get_metrics()
+    decoder.stop()
+    sender.close()
+
+    for key, value in metrics.items():
+        print(f"{key:>24}: {value:.1f}" if isinstance(value, float) else f"{key:>24}: {value}")
+
+if __name__ == "__main__":
+    main()
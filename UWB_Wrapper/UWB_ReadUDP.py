@@ -17,6 +17,7 @@ This code binds to the port and retrieves the necessary data.
 """
 
 import socket
+import threading
 import time
 import pandas as pd
 import numpy as np
@@ -172,6 +173,63 @@ def get_all_positions(max_retries=3, timeout=0.2):
     sock.close()
     return pd.DataFrame()  # Return empty DataFrame if failed
 
+class UWBListener:
+    """
+    Keeps ONE socket bound to the UWB port and caches the latest position of every tag, 
+    so frequent readers (e.g. FlightRecorder) don't need to bind a new socket per query like get_target_position().
+    
+    e.g.
+        listener = UWBListener().start()
+        pos, timestamp = listener.get_position(target_id=12)
+    """
+    def __init__(self, port: int = 5000, timeout: float = 0.5):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow socket reuse (get_target_position binds the same port)
+        self.sock.bind(('0.0.0.0', port))
+        self.sock.settimeout(timeout)
+        self.positions = {}     # tag id -> ((x, y, z), time.time() when received)
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = threading.Thread(target=self._listen, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        self.sock.close()
+
+    def get_position(self, target_id):
+        """
+        :return: ((x, y, z), timestamp) of the latest position received for target_id, or (None, None) if never seen.
+        """
+        with self.lock:
+            return self.positions.get(target_id, (None, None))
+
+    def _listen(self):
+        while self.running:
+            try:
+                data, _ = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            now = time.time()
+            for line in data.decode(errors="ignore").splitlines():
+                parts = line.split(',')
+                if len(parts) < 5:
+                    continue
+                try:
+                    pos = (float(parts[2])+UWB_OFFSET[0], float(parts[3])+UWB_OFFSET[1], float(parts[4]))
+                    with self.lock:
+                        self.positions[int(parts[0])] = (pos, now)
+                except ValueError:
+                    continue
+
 # For verification, this code can also be run by itself.
 if __name__ == "__main__":
 
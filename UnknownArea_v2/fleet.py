@@ -0,0 +1,132 @@
+"""
+Runs several drones from ONE process, instead of one `python -m UnknownArea_v2.main` per drone. Run from main workspace:
+
+    python -m UnknownArea_v2.fleet shared_params.params11ap shared_params.params12ap shared_params.params13ap
+
+The first params module also sets up logging (it is the one load_params() picks up).
+
+- One MiDaS model for all drones. Heavy perception (depth map, ArUco) runs in one shared pool of
+  --perception-workers threads, instead of N processes (each with its own torch threads) competing for the CPU.
+- Command / telemetry I/O of every drone (state + response ports, ToF polling) is multiplexed on one asyncio loop,
+  see shared_utils/fleetio.py.
+- Each drone still runs its own run_mission / navigation_thread (blocking flight logic) with its own controller
+  and controller.params; nothing per-drone is kept in module globals.
+- No cv2 window (imshow only works from the main thread); set MJPEG_PORT in each drone's params for a preview.
+- Set PYAV_DECODER = True in every params: libav's log-based HoverOnErrorHandler cannot tell which drone
+  a decode error came from, the PyAV decoder's error_callback can.
+
+Compare CPU / memory against separate processes with 0Diagnostics/bench_fleet.py.
+"""
+
+import argparse, asyncio, importlib, logging, time
+from concurrent.futures import ThreadPoolExecutor
+
+import UnknownArea_v2.main as usa
+from shared_utils.dronecontroller2 import DroneController
+from shared_utils.depthservice import load_midas_model
+from shared_utils.fleetio import FleetIO
+from shared_utils.shared_utils import load_params, setup_logging
+
+params = load_params()
+
+
+class FleetRunner:
+    """
+    Args:
+        drone_params: one params module per drone
+        perception_workers: threads in the shared perception pool
+        status_period_s: how often fleet status (CPU, fps, ToF, nav state per drone) is logged
+    """
+    def __init__(self, drone_params: list, perception_workers: int = 2, status_period_s: float = 10):
+        self.drone_params = drone_params
+        self.perception_pool = ThreadPoolExecutor(max_workers=perception_workers, thread_name_prefix="perception")
+        self.status_period_s = status_period_s
+        self.controllers: list = []
+        self.io = FleetIO()
+        self.loop: asyncio.AbstractEventLoop = None
+        self.midas = None
+
+    def _create_controller(self, drone_params) -> DroneController:
+        controller = DroneController(drone_params.NETWORK_CONFIG, drone_params.PI_ID,
+                                     laptop_only=drone_params.LAPTOP_ONLY, imshow=False,
+                                     drone_params=drone_params, midas=self.midas)
+        controller.perception_pool = self.perception_pool
+        controller.tof_scheduler = self._schedule_tof
+        return controller
+
+    def _schedule_tof(self, controller:DroneController):
+        """tof_scheduler for every controller: called from its mission thread, polls on the fleet's loop"""
+        asyncio.run_coroutine_threadsafe(self.io.poll_tof(controller), self.loop)
+
+    def stop(self):
+        """Ends every drone's navigation; run_mission then lands it"""
+        for controller in self.controllers:
+            controller.is_running = False
+            controller.stop_event.set()
+            with controller.frame_cond:
+                controller.frame_cond.notify_all()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        # Mission threads (blocking flight logic) + one spare for creating controllers
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=len(self.drone_params) + 1, thread_name_prefix="mission"))
+
+        self.midas = await asyncio.to_thread(load_midas_model)
+        for i, drone_params in enumerate(self.drone_params):
+            # The first CustomTello binds djitellopy's receivers to its own ports; FleetIO covers everyone else's
+            if i > 0 and not drone_params.LAPTOP_ONLY:
+                await self.io.listen(drone_params.NETWORK_CONFIG)
+            self.controllers.append(await asyncio.to_thread(self._create_controller, drone_params))
+        logging.info(f"Fleet of {len(self.controllers)} drones ready: {[c.drone_id for c in self.controllers]}")
+
+        status_task = asyncio.create_task(self._log_status())
+        missions = [asyncio.ensure_future(asyncio.to_thread(usa.run_mission, controller, False))
+                    for controller in self.controllers]
+        try:
+            await asyncio.gather(*missions)
+        except asyncio.CancelledError:     # Ctrl+C
+            logging.info("Fleet interrupted. Stopping navigation and landing all drones.")
+            self.stop()
+            await asyncio.gather(*missions, return_exceptions=True)
+            raise
+        finally:
+            status_task.cancel()
+            self.io.close()
+            self.perception_pool.shutdown(wait=False)
+
+    async def _log_status(self):
+        last_cpu, last_wall = time.process_time(), time.time()
+        last_seqs = {c.drone_id: c.frame_seq for c in self.controllers}
+        while True:
+            await asyncio.sleep(self.status_period_s)
+            cpu, wall = time.process_time(), time.time()
+            drones = []
+            for controller in self.controllers:
+                fps = (controller.frame_seq - last_seqs[controller.drone_id]) / (wall - last_wall)
+                last_seqs[controller.drone_id] = controller.frame_seq
+                drones.append(f"{controller.drone_id}: {fps:.1f}fps ToF {controller.forward_tof_dist} {controller.nav_state or '-'}")
+            logging.info(f"Fleet CPU {(cpu - last_cpu) / (wall - last_wall) * 100:.0f}% | " + " | ".join(drones)
+                         + f" | {self.io.metrics}")
+            last_cpu, last_wall = cpu, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several drones in one process")
+    parser.add_argument("params_modules", nargs="+", help="one params module per drone, e.g. shared_params.params12ap")
+    parser.add_argument("--perception-workers", type=int, default=2, help="threads shared by all drones for MiDaS / ArUco")
+    args = parser.parse_args()
+
+    usa.logger = setup_logging(params, "UnknownArea.fleet")     # navigation_thread / run_mission log through usa.logger
+    drone_params = [importlib.import_module(name) for name in args.params_modules]
+    drone_ids = [p.PI_ID for p in drone_params]
+    if len(set(drone_ids)) != len(drone_ids):
+        parser.error(f"Drone ids must be unique, got {drone_ids}")
+
+    runner = FleetRunner(drone_params, perception_workers=args.perception_workers)
+    try:
+        asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        logging.info("Fleet stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -16,12 +16,16 @@ import logging  # in decreasing log level: debug > info > warning > error > crit
 from PPFLY2.main import execute_waypoints
 
 from shared_utils.dronecontroller2 import DroneController
+from shared_utils.mjpegserver import MJPEGServer
+from shared_utils.profiler import profiler, span
+from shared_utils.controlloop import ControlLoop
 from shared_utils.shared_utils import *
 
 import cv2
 import numpy as np
 import time
 import threading 
+import functools
 
 params = load_params()
 
@@ -67,6 +71,7 @@ def nav_with_depthmap_tof(controller:DroneController, tof_dist:int, display_fram
     First checks depth map, then ToF
     If no flags, move forward via rc control
     """
+    params = controller.params      # this drone's params (several drones may share the process)
     
     def recovery():
         """
@@ -180,20 +185,89 @@ def draw_pose_axes_danger(controller:DroneController, display_frame):
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
         # Draw coordinate axes for the danger marker
-        cv2.drawFrameAxes(display_frame, CAMERA_MATRIX, DIST_COEFF, 
+        calibration = controller.calibration(display_frame)
+        cv2.drawFrameAxes(display_frame, calibration.camera_matrix, calibration.dist_coeff, 
                         controller.nearest_danger_data["rvecs"], 
                         controller.nearest_danger_data["tvecs"], 
                         10)
         
-# Global variables (or add them to your controller if preferred)
-hover_mode = False
-approach_complete = False
-last_error_time = 0
+# hover_mode, last_error_time and approach_complete live on the controller (one set per drone)
 error_timeout = 0.2  # seconds without an error to exit hover mode
 
+def update_depth_map(controller:DroneController, frame):
+    """MiDaS depth colormap of frame + grid analysis into controller.depth_map_colors. Returns the colormap."""
+    scheduler = controller.perception_scheduler
+    depth_colormap = controller.run_perception(scheduler.timed("depth", controller.generate_color_depth_map), frame)
+    controller.process_depth_color_map(depth_colormap)
+    return depth_colormap
+
+def compose_display(controller:DroneController, display_frame, depth_colormap):
+    """Live feed + depth map side by side, as published to the display window / MJPEG stream"""
+    with span("nav.display_compose"):
+        depth_colormap_resized = cv2.resize(depth_colormap, (display_frame.shape[1]//2, display_frame.shape[0]))
+        if not controller.params.LAPTOP_ONLY:
+            display_frame = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
+        combined_view = np.hstack((display_frame, depth_colormap_resized))
+        
+        # Add labels and display combined view
+        cv2.putText(combined_view, "Live Feed", (10, combined_view.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        cv2.putText(combined_view, "Depth Map", (display_frame.shape[1] + 10, combined_view.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        controller.set_display_frame(combined_view)
+
+def center_on_marker(controller:DroneController, marker_id:int, frame_seq:int, x_error:float, threshold_px:float,
+                     depth_colormap, timeout_s:float = 10.0):
+    """
+    params.CENTERING_LOOP: yaws onto the locked-on marker in a fixed-rate control loop (params.CENTERING_RATE_HZ, see
+    controlloop.py) instead of once per navigation_thread pass. Each new frame goes through perception as in
+    navigation_thread (scheduled depth map, marker tracking, display) and gets one yaw rc; iterations without a new
+    frame send nothing. Gives up when the marker is not seen for params.CENTERING_LOST_S, after timeout_s, or when
+    hover mode is set (navigation_thread then holds the hover).
+    Returns:
+        (centered, seq of the last frame processed, last depth colormap)
+    """
+    params = controller.params
+    scheduler = controller.perception_scheduler
+    # x_error comes from frame_seq, which navigation_thread processed but sent no rc for: the first iteration acts on it
+    state = {"frame_seq": frame_seq, "x_error": x_error, "last_seen": time.time(), "depth_colormap": depth_colormap,
+             "unanswered": True}
+
+    def step(dt:float) -> bool:
+        if not controller.is_running or controller.hover_mode:
+            return True
+        frame, seq, frame_time = controller.wait_for_frame(state["frame_seq"], timeout=0)    # newest frame, if there is one
+        if frame is not None:
+            state["frame_seq"] = seq
+            display_frame = frame.copy()
+            scheduler.begin_frame(controller.nav_state, frame_time)
+            if scheduler.due("depth"):
+                state["depth_colormap"] = update_depth_map(controller, frame)
+            marker_found, corners, found_id, _, _ = controller.run_perception(controller.detect_or_track_markers, frame, display_frame)
+            if marker_found and found_id == marker_id:
+                state["x_error"] = np.mean(corners[0], axis=0)[0] - frame.shape[1] / 2
+                state["last_seen"] = time.time()
+            cv2.putText(display_frame, f"Centering: error = {state['x_error']:.0f}px", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            compose_display(controller, display_frame, state["depth_colormap"])
+        elif not state["unanswered"]:
+            return False    # no new error to act on
+        state["unanswered"] = False
+        if time.time() - state["last_seen"] > params.CENTERING_LOST_S or abs(state["x_error"]) <= threshold_px:
+            return True
+        yaw_speed = int(np.clip(state["x_error"] / 4, -20, 20))  # OG: / 10
+        controller.drone.send_rc_control(0, 0, 0, yaw_speed)
+        logger.debug(f"Centering: error = {state['x_error']:.1f}, yaw_speed = {yaw_speed}, dt = {dt*1000:.0f}ms")
+        return False
+
+    loop = ControlLoop(params.CENTERING_RATE_HZ, name="nav.centering")
+    loop.run(step, timeout_s=timeout_s)
+    controller.drone.send_rc_control(0, 0, 0, 0)  # Stop rotation
+    loop.log_report()
+    centered = (not controller.hover_mode and abs(state["x_error"]) <= threshold_px
+                and time.time() - state["last_seen"] <= params.CENTERING_LOST_S)
+    return centered, state["frame_seq"], state["depth_colormap"]
+
 def navigation_thread(controller:DroneController):
     """Main navigation thread combining depth mapping and marker detection"""
-    global hover_mode, last_error_time, approach_complete
+    params = controller.params      # this drone's params (several drones may share the process)
     logger.info("Starting navigation with depth mapping...")
     
     # Create single window for combined view (COMMENTED OUT 25 FEB - video thread implemented in dronecontroller)
@@ -216,38 +290,54 @@ def navigation_thread(controller:DroneController):
     centering_complete = False
     centering_threshold = 15    # in px
     start_time = 0      # to calculate refresh rate
+    frame_seq = 0       # seq of the last frame processed; wait_for_frame only returns newer frames
     time_eyes_opened = time.time()    # NEW 15 MAR - to move down 50 cm after
+    scheduler = controller.perception_scheduler
+    depth_colormap = None
     
     while controller.is_running:  # Main loop continues until marker found or battery low
         #run the stream here
         #try the hover here
         current_time = time.time()
         # Check if we're in hover mode
-        if hover_mode:
+        if controller.hover_mode:
             # Continue sending hover command until error_timeout expires.
-            if current_time - last_error_time < error_timeout:
+            if current_time - controller.last_error_time < error_timeout:
+                controller.set_nav_state("hover")
                 controller.drone.send_rc_control(0, 0, 0, 0)
                 logger.debug("Hover mode active: sustaining hover command.")
                 time.sleep(0.1)  # short sleep before next check
                 continue
             else:
                 # Clear hover mode after no new error for error_timeout seconds.
-                hover_mode = False
+                controller.hover_mode = False
                 logger.info("Error condition cleared. Resuming normal navigation.")
   
         try:
+            # Blocks until the video thread publishes a frame we have not processed yet
+            frame, new_seq, frame_time = controller.wait_for_frame(frame_seq, timeout=1.0)
+            if frame is None:
+                logger.debug("navigation_thread: no new frame within 1s.")
+                continue
+            if new_seq > frame_seq + 1:
+                logger.debug(f"navigation_thread skipped {new_seq - frame_seq - 1} frames")
+            frame_seq = new_seq
+            iteration_start_ns = time.perf_counter_ns()
+
             next_time = time.time()
             if start_time != 0:
                 refresh_rate = 1/(next_time-start_time)
-                logger.debug(f"navigation_thread refresh rate (Hz): {refresh_rate:.1f}")     # 25 Feb improvement from 1-2 Hz / 4 Hz, to 2.5 Hz / 4 Hz
+                logger.debug(f"navigation_thread refresh rate (Hz): {refresh_rate:.1f}. Frame {frame_seq} age: {(next_time - frame_time)*1000:.0f}ms")     # 25 Feb improvement from 1-2 Hz / 4 Hz, to 2.5 Hz / 4 Hz
             start_time = next_time
             
-            frame = controller.get_current_frame()
             display_frame = frame.copy()
             
-            # Get depth color map
-            depth_colormap = controller.generate_color_depth_map(frame) # TBC 6 Feb can shift under "else" since no need to generate when markers found (10 Feb Ans: Not if you want to visualize)
-            controller.process_depth_color_map(depth_colormap)
+            # Get depth color map - only as often as the last iteration's nav_state needs it (see perceptionscheduler.py)
+            # TBC 6 Feb can shift under "else" since no need to generate when markers found (10 Feb Ans: Not if you want to visualize)
+            scheduler.begin_frame(controller.nav_state, frame_time)
+            depth_fresh = scheduler.due("depth") or depth_colormap is None
+            if depth_fresh:
+                depth_colormap = update_depth_map(controller, frame)
             
             # Get ToF distance
             # tof_dist = controller.forward_tof_dist        # TESTING TBC 12 MAR
@@ -259,10 +349,10 @@ def navigation_thread(controller:DroneController):
             controller.nearest_danger_id = None
             
             # Check for markers
-            marker_found, corners, marker_id, rvecs, tvecs = controller.detect_markers(frame, display_frame)   # detects all markers; returns details of ONE valid (and land-able) marker, approved by the server
+            marker_found, corners, marker_id, rvecs, tvecs = controller.run_perception(controller.detect_or_track_markers, frame, display_frame)   # detects all markers (or tracks the locked-on one); returns details of ONE valid (and land-able) marker, approved by the server
             if marker_found:  
                 # Draw marker detection and pose information on the ONE detected valid marker
-                display_frame = draw_pose_axes(display_frame, corners, [marker_id], rvecs, tvecs)
+                display_frame = draw_pose_axes(display_frame, corners, [marker_id], rvecs, tvecs, controller.calibration(frame))
                 logger.info(f"Obtained Marker Status from Server: {controller.marker_client.marker_status}")
                 logger.debug(f"Marker detected: {marker_id}. Available: {controller.marker_client.is_marker_available(marker_id)}. Currently locked on: {controller.markernum_lockedon}")
 
@@ -305,21 +395,29 @@ def navigation_thread(controller:DroneController):
                         x_error = marker_center[0] - frame_center
                         
                         if not centering_complete:
-                            if abs(x_error) > centering_threshold:
+                            controller.set_nav_state("centering")
+                            centered = abs(x_error) <= centering_threshold
+                            if not centered and params.CENTERING_LOOP:
+                                # Yaw onto the marker at a steady rate, tracking it on every frame meanwhile
+                                logger.info(f"Centering: error = {x_error:.1f}px")
+                                centered, frame_seq, depth_colormap = center_on_marker(controller, marker_id, frame_seq, x_error,
+                                                                                       centering_threshold, depth_colormap)
+                            elif not centered:
                                 # Calculate yaw speed based on error
                                     yaw_speed = int(np.clip(x_error / 4, -20, 20))  # OG: / 10
                                     controller.drone.send_rc_control(0, 0, 0, yaw_speed)
                                     logger.info(f"Centering: error = {x_error:.1f}, yaw_speed = {yaw_speed}")
                                 # if abs(x_error) < 25:
                                 #   logger.info(f"CENTERED MOVE BOX")  
-                            else:
+                            if centered:
                                 logger.info(f"Marker centered, x error = {x_error:.0f}px! Starting approach...")
                                 controller.drone.send_rc_control(0, 0, 0, 0)  # Stop rotation
                                 time.sleep(0.5)  # Stabilize
                                 centering_complete = True
 
                         # PART 2B: APPROACH (I.E. CENTERING COMPLETE)
-                        elif not approach_complete:
+                        elif not controller.approach_complete:
+                            controller.set_nav_state("approaching")
                             current_distance_3D = controller.get_distance()
                             if current_distance_3D is None:
                                 logger.info("Lost marker during approach...")  # should not reach here! caa 13 Feb
@@ -341,6 +439,7 @@ def navigation_thread(controller:DroneController):
                                 continue        # re-enter the loop; need to re-detect marker and re-measure distance. 
 
                             elif current_distance_2D > 0 and current_distance_2D < 500:
+                                controller.set_nav_state("landing")
                                 logger.info(f"Final Approach: Moving forward {int(current_distance_2D)-20}cm to marker.")       # hard coded offset caa 14 Mar
                                 controller.drone.move_forward(int(current_distance_2D)-20)
                                 logger.info("Approach complete!")
@@ -371,7 +470,7 @@ def navigation_thread(controller:DroneController):
                                     controller.drone.go_xyz_speed(int(tello_offset_x), int(tello_offset_y), 0, 20)  # y=0 since we're on the floor
                                     time.sleep(2)  # Wait for the movement to complete
 
-                                approach_complete = True
+                                controller.approach_complete = True
                                 controller.marker_client.send_update('marker', marker_id=marker_id, landed=True)
                                 time.sleep(1)
                                 controller.is_running = False #added this in cause it wouldn't land! --> ask gabriel
@@ -381,9 +480,11 @@ def navigation_thread(controller:DroneController):
                         logger.info("Marker found, but not landing since not flying. Program continues.")
 
                     else:   #goto_approach_sequence is False
+                        controller.set_nav_state("marker_found")
                         logger.debug("Marker found, but not approaching yet.")
                 
             elif controller.exit_detected: # This condition is placed after marker_detected but before depth mapping 
+                controller.set_nav_state("exit_avoidance")
                 exit_text:str = f"Exit detected {controller.exit_distance_3D:.0f}cm away."
                 logger.info("No valid markers detected. " + exit_text)
                 cv2.putText(display_frame, exit_text, (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
@@ -394,28 +495,36 @@ def navigation_thread(controller:DroneController):
 
                 elif not params.NO_FLY:
                     logger.info(f"Exit more than 5m away, no action taken.")    # hardcoded ish (see above 14 Mar)
+                    if not depth_fresh:     # do not steer on a skipped depth map
+                        scheduler.force("depth")
+                        depth_colormap = update_depth_map(controller, frame)
                     display_frame = nav_with_depthmap_tof(controller, tof_dist, display_frame)      # logic for depth map and ToF
 
             else: # Navigation logic using depth map if neither victim nor exit detected. Simulates well without drone
                 # NOTE 4 Feb: Check ToF after depth map should enable it to enter tighter spaces. To be more conservative, can consider checking ToF before depth map.)
                 
                 logger.debug(f"Nothing detected.")
+                controller.set_nav_state("searching")
                 
                 if not controller.markernum_lockedon is None:        # Publish that its lost track of target. Then resets its locked_on number.
                     logger.debug(f"Resetting markernum_lockedon from {controller.markernum_lockedon} to None")
                     controller.marker_client.send_update('marker', marker_id=controller.markernum_lockedon, detected=False)
                     controller.markernum_lockedon = None
                 
+                if not depth_fresh:     # just lost the marker: do not steer on a skipped depth map
+                    scheduler.force("depth")
+                    depth_colormap = update_depth_map(controller, frame)
+
                 with controller.forward_tof_lock:
                     logger.debug(f"Executing nav_with_depthmap_tof.") 
                     display_frame = nav_with_depthmap_tof(controller, tof_dist, display_frame)      # logic for depth map and ToF
 
                     # NEW 15 MAR (tested ok) - execute down_50 after 180s; Only do so if no marker found, and current flight height is more than 100
-                    current_height = controller.drone.get_height()
+                    current_height = controller.get_telemetry('h', max_age=1.0, default=0)     # stale state stream: never lower blind
                     logging.debug(f"Time left before lowering: {(time.time() - time_eyes_opened):.2f}")
 
                     if time.time() - time_eyes_opened > 120 and current_height >= 60 and controller.drone_id != 11:
-                        logger.info(f"Current search height: {controller.drone.get_height()}. Lowering search height by 20cm.") 
+                        logger.info(f"Current search height: {current_height}. Lowering search height by 20cm.") 
                         controller.drone.move_down(20)
                         time_eyes_opened = time.time() + 60     # Resets timer such that it triggers every 60s after initial 120s timer
                         logger.info(f"New search height: {controller.drone.get_height()}. Resetting timer to 60s.") 
@@ -424,15 +533,9 @@ def navigation_thread(controller:DroneController):
                 draw_pose_axes_danger(controller, display_frame)
 
             # Resize depth_colormap to match frame dimensions, create combined view side-by-side
-            depth_colormap_resized = cv2.resize(depth_colormap, (display_frame.shape[1]//2, display_frame.shape[0]))
-            if not params.LAPTOP_ONLY:
-                display_frame = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            combined_view = np.hstack((display_frame, depth_colormap_resized))
-            
-            # Add labels and display combined view
-            cv2.putText(combined_view, "Live Feed", (10, combined_view.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(combined_view, "Depth Map", (display_frame.shape[1] + 10, combined_view.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            controller.set_display_frame(combined_view)
+            compose_display(controller, display_frame, depth_colormap)
+            if profiler.enabled:    # frame received -> display frame set, i.e. excluding the wait for the frame
+                profiler.record("nav.iteration", iteration_start_ns, time.perf_counter_ns())
 
             #cv2.imshow(f"Drone {controller.drone_id} Navigation", combined_view)      # 26 FEB DO NOT SHOW - already displaying in dronecontroller
                 
@@ -442,9 +545,10 @@ def navigation_thread(controller:DroneController):
             continue           
 
 class HoverOnErrorHandler(logging.Handler):
-    def __init__(self, drone, error_keywords, *args, **kwargs):
+    def __init__(self, controller:DroneController, error_keywords, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.drone = drone
+        self.controller = controller
+        self.drone = controller.drone
         self.error_keywords = error_keywords
         self.last_hover_time = 0  # to throttle hover commands if needed
 
@@ -461,32 +565,42 @@ class HoverOnErrorHandler(logging.Handler):
     #             self.last_hover_time = current_time
                 
     def emit(self, record):
-        global hover_mode, last_error_time
         message = record.getMessage()
         if any(keyword in message for keyword in self.error_keywords):
             current_time = time.time()
-            last_error_time = current_time  # update on error
-            if not hover_mode:
+            self.controller.last_error_time = current_time  # update on error
+            if not self.controller.hover_mode:
                 print("HAHAHAver mode activated")
-            hover_mode = True
+            self.controller.hover_mode = True
             # # Optionally send an immediate hover command:     # TBC 12 MAR  - TO VERIFY
             # self.drone.send_rc_control(0, 0, 0, 0)          
 
+def hover_on_video_error(controller:DroneController, reason:str):
+    """
+    error_callback for the PyAV decoder (params.PYAV_DECODER), bound to one controller. Same effect as HoverOnErrorHandler, 
+    but triggered by the decoder's corrupt-slice count instead of string-matching libav logs.
+    """
+    controller.last_error_time = time.time()
+    if not controller.hover_mode:
+        logger.info(f"Drone {controller.drone_id}: video decode error ({reason}). Hover mode activated.")
+    controller.hover_mode = True
+
 def display_loop(controller:DroneController):
+    """
+    Redraws only when navigation_thread publishes a new display frame; otherwise just pumps GUI events.
+    """
     window_name = f"Drone View {controller.drone_id}"
     # Explicitly create a named window on the main thread
     cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    display_seq = 0
     while controller.is_running:
-        combined_view = controller.get_display_frame()
+        # Waits up to 30ms for a new frame (replaces the old fixed 30ms sleep + copy + imshow of an unchanged frame)
+        combined_view, display_seq = controller.wait_for_display_frame(display_seq, timeout=0.03)
         if combined_view is not None:
             cv2.imshow(window_name, combined_view)
-        else:
-            # Debug message if no frame is available
-            logging.debug("Display loop: No frame available yet.")
         if cv2.waitKey(1) & 0xFF == ord('q'):
             controller.is_running = False
             break
-        time.sleep(0.03)  # Delay to reduce CPU usage
     cv2.destroyAllWindows()
 
 def custom_tof_navigation_gab(controller: DroneController) -> None:
@@ -499,7 +613,7 @@ def custom_tof_navigation_gab(controller: DroneController) -> None:
     """
     # Constants for movement and rotation
     MOVE_INCREMENT = 50  # Distance to move in cm
-    LIST_LENGTH = 3
+    LIST_LENGTH = 3     # readings per check; a check after a move waits ~LIST_LENGTH * params.TOF_PERIOD_S for them
     MAX_MOVEMENT_COUNT = 6
 
     logging.debug(f"Step 0/4: Initial ToF readings (North): {controller.get_tof_distances_list(list_length=LIST_LENGTH)}")
@@ -511,7 +625,7 @@ def custom_tof_navigation_gab(controller: DroneController) -> None:
         time.sleep(1)  # Allow time for rotation to complete
 
     # Step 2: Check ToF readings and move right until path is clear
-    tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+    tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
     logging.debug(f"Step 2a/4: Initial ToF readings (West): {tof_dist_list}")
 
     clear_count = 0
@@ -521,12 +635,12 @@ def custom_tof_navigation_gab(controller: DroneController) -> None:
             with controller.forward_tof_lock:
                 controller.drone.move_right(MOVE_INCREMENT)
             movement_count += 1
-            tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+            tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
             logging.debug(f"Step 2b/4: Moving right while facing West; Count: {movement_count}/{MAX_MOVEMENT_COUNT}, ToF readings: {tof_dist_list}")
 
         with controller.forward_tof_lock:
             controller.drone.move_forward(30)
-        tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+        tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
         if controller.tof_check_clear(tof_dist_list):
             clear_count += 1
         else:
@@ -539,7 +653,7 @@ def custom_tof_navigation_gab(controller: DroneController) -> None:
         controller.drone.move_right(300)
     logging.debug("Drone now facing south.")
 
-    tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+    tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
     logging.debug(f"Step 3a/4: Initial ToF readings (South): {tof_dist_list}")
 
     clear_count = 0
@@ -549,14 +663,14 @@ def custom_tof_navigation_gab(controller: DroneController) -> None:
             with controller.forward_tof_lock:
                 controller.drone.move_right(MOVE_INCREMENT)
             movement_count += 1
-            tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+            tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
             logging.debug(f"Step 3b/4: Moving right while facing South; Count: {movement_count}/{MAX_MOVEMENT_COUNT}, ToF readings: {tof_dist_list}")
 
         with controller.forward_tof_lock:
             controller.drone.move_forward(40)       # 15 MAR NEW (OG: 30)
             controller.drone.move_right(30)         # 15 MAR NEW (OG: 20)
             # controller.drone.go_xyz_speed()
-        tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+        tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
         if controller.tof_check_clear(tof_dist_list):
             clear_count += 1
         else:
@@ -579,16 +693,17 @@ def custom_tof_navigation_yz(controller: DroneController) -> None:
     """
     # Constants for movement and rotation
     MOVE_INCREMENT = 50  # Distance to move in cm
-    LIST_LENGTH = 3
+    LIST_LENGTH = 3     # readings per check; a check after a move waits ~LIST_LENGTH * params.TOF_PERIOD_S for them
     MAX_MOVEMENT_COUNT = 3
 
     # Step 1: Rotate to face West
     with controller.forward_tof_lock:
         controller.drone.rotate_counter_clockwise(90)
+    rotated = time.time()
     time.sleep(1)  # Allow time for rotation to complete
 
     # Step 2: Check ToF readings and move right until path is clear
-    tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+    tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=rotated)     # readings polled during the sleep count
     logging.debug(f"Initial ToF readings (West): {tof_dist_list}")
 
     clear_count = 0
@@ -598,12 +713,12 @@ def custom_tof_navigation_yz(controller: DroneController) -> None:
             with controller.forward_tof_lock:
                 controller.drone.move_right(MOVE_INCREMENT)
             movement_count += 1
-            tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+            tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
             logging.debug(f"Moving right while facing West; Count: {movement_count}/{MAX_MOVEMENT_COUNT}, ToF readings: {tof_dist_list}")
 
         with controller.forward_tof_lock:
             controller.drone.move_forward(30)
-        tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH)
+        tof_dist_list = controller.get_tof_distances_list(list_length=LIST_LENGTH, since=time.time())     # readings after the move only
         if controller.tof_check_clear(tof_dist_list):
             clear_count += 1
         else:
@@ -646,17 +761,28 @@ def main():
     
     # Add custom error handler for video errors
     error_keywords = ["libav.h264", "no frame!", "non-existing PPS", "decode_slice_header error", "left block unavailable", "error while decoding"]
-    hover_handler = HoverOnErrorHandler(controller.drone, error_keywords)
+    hover_handler = HoverOnErrorHandler(controller, error_keywords)
     logger.addHandler(hover_handler)
     # Get the libav.h264 logger and attach the hover handler so it captures errors from that source ---> 8 march try and stop the libhav errors
     libav_logger = logging.getLogger("libav.h264")
     libav_logger.setLevel(logging.DEBUG)   # adjust as needed ---> change from error to debug??? idk need to check
     libav_logger.propagate = True
     libav_logger.addHandler(hover_handler)
-    
+
+    run_mission(controller, display=params.IMSHOW)
+
+def run_mission(controller:DroneController, display:bool = True):
+    """
+    Takeoff, waypoints, search and landing for one drone; returns once it has landed.
+    Also run once per drone by UnknownArea_v2.fleet, so only uses this drone's controller.params.
+    Args:
+        display: show the cv2 window (main thread only, so False when several drones share the process)
+    """
+    params = controller.params
+    mjpeg_server = None
     try:
         with controller.forward_tof_lock:    
-            controller.marker_client.client_takeoff_simul([99], status_message=f'Waiting for takeoff. {controller.drone.get_battery()}%')    # just holds the drone until released. still needs takeoff() in the next line 
+            controller.marker_client.client_takeoff_simul([99], status_message=f'Waiting for takeoff. {controller.get_telemetry("bat", max_age=5, default="?")}%')    # just holds the drone until released. still needs takeoff() in the next line 
             init_yaw = controller.drone.get_yaw()
 
             # After takeoff triggered, chill on the ground for a specified delay (for 2nd takeoff)
@@ -672,7 +798,7 @@ def main():
             else:
                 logging.info("Simulating taking off for real...")
 
-            controller.marker_client.send_update('status', status_message=f'Taking off. {controller.drone.get_battery()}%')
+            controller.marker_client.send_update('status', status_message=f'Taking off. {controller.get_telemetry("bat", max_age=5, default="?")}%')
             controller.drone.send_rc_control(0, 0, 0, 0)
             time.sleep(1)
             post_yaw = controller.drone.get_yaw()
@@ -713,16 +839,23 @@ def main():
                 controller.drone.move_forward(30)   # to ensure drone is inside Unknown Area, past the Reverse marker
         
         # Setup video stream (this starts the _stream_video thread which only updates frames)
-        controller.setup_stream()
+        controller.setup_stream(video_error_callback=functools.partial(hover_on_video_error, controller))
         
         # Start the navigation logic in a separate thread
-        nav_thread = threading.Thread(target=navigation_thread, args=(controller,))
+        nav_thread = threading.Thread(target=navigation_thread, args=(controller,), name=f"nav_{controller.drone_id}")
         nav_thread.start()
         
+        # Optional browser preview, e.g. for headless runs (IMSHOW = False)
+        if params.MJPEG_PORT:
+            mjpeg_server = MJPEGServer(controller.wait_for_display_frame, port=params.MJPEG_PORT,
+                                       max_fps=params.MJPEG_MAX_FPS, title=f"Drone {controller.drone_id}").start()
+
         # Start the display loop in the main thread
-        display_loop(controller)
+        if display:
+            display_loop(controller)
         
-        nav_thread.join()
+        while nav_thread.is_alive():    # join with timeout so Ctrl+C still works when headless
+            nav_thread.join(timeout=0.5)
         
     except KeyboardInterrupt:
         logging.info("Keyboard interrupt received.")
@@ -732,19 +865,21 @@ def main():
 
     finally:
         # NEW 17 MAR
-        if not approach_complete:
+        if not controller.approach_complete:
             logging.info("Entering custom_danger_avoidance")
             with controller.forward_tof_lock:
                 custom_danger_avoidance(controller)
                 
         controller.marker_client.send_update('status', status_message='Landing')
-        end_batt = controller.drone.get_battery()
+        end_batt = controller.get_telemetry('bat', max_age=5, default='?')
         logger.info(f"Finally: Actually landing for real. End Battery Level: {end_batt}%")
         with controller.forward_tof_lock:
             controller.drone.end()
         controller.marker_client.send_update('status', status_message=f'Landed. {end_batt}%')
         controller.is_running = False
         controller.stop_event.set()
+        if mjpeg_server:
+            mjpeg_server.stop()
         # controller.shutdown()
         cv2.destroyAllWindows()
         cv2.waitKey(1)
@@ -0,0 +1,156 @@
+"""
+Offline replay of navigation_thread on a recording - no drone, no swarm server. Run from main workspace:
+
+    python -m UnknownArea_v2.replay shared_params.params recordings/flight_12_20250317_101500
+    python -m UnknownArea_v2.replay shared_params.params recordings/flight_12_20250317_101500 --realtime
+    python -m UnknownArea_v2.replay shared_params.params some_video.mp4 --video --no-midas
+    python -m UnknownArea_v2.replay shared_params.params some_video.mp4 --video --stand-in-midas
+
+Default is lockstep, as fast as the CPU allows: every frame is published only once navigation_thread has finished
+the previous one, so the command stream is the same on every run (regression-testable).
+--realtime publishes frames at recorded speed instead; navigation_thread then skips frames like it does in flight.
+
+Writes per-stage timings (ms) and the command stream to <recording>_replay.json (or --out).
+NOTE: navigation_thread's own time.sleep() calls (e.g. 0.5s stabilize after centering) still apply in lockstep.
+"""
+
+import argparse, json, logging, threading, time
+
+import numpy as np
+
+import UnknownArea_v2.main as usa
+from shared_utils.dronecontroller2 import DroneController
+from shared_utils.flightrecorder import FlightRecording
+from shared_utils.replay import (RecordedFrameSource, RecordedSensorSource, VideoFileFrameSource, SensorSource,
+                                 ReplayTello, ReplayMarkerClient)
+from shared_utils.shared_utils import load_params
+from shared_utils.depthservice import load_stand_in_model
+
+params = load_params()
+
+STAGES = ["generate_color_depth_map", "process_depth_color_map", "detect_or_track_markers", "detect_markers"]
+
+def time_stage(timings: dict, name: str, fn):
+    """Wraps fn so every call appends its duration (ms) to timings[name]"""
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timings.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+    return timed
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 2)
+    return {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 2),
+            "p50": pick(0.50), "p95": pick(0.95), "max": round(ordered[-1], 2)}
+
+def blank_depth_map(frame):
+    """Used with --no-midas: an all-blue (far away) depth map, i.e. no obstacles"""
+    depth_colormap = np.zeros_like(frame)
+    depth_colormap[:, :, 0] = 255
+    return depth_colormap
+
+def run_replay(frame_source, sensor_source: SensorSource, drone_id: int = 0, realtime: bool = False,
+               load_midas: bool = True, midas=None, perception_pool=None) -> dict:
+    """
+    Runs navigation_thread on frame_source / sensor_source with a ReplayTello.
+    Returns a report dict with per-stage timings and the command stream.
+    midas / perception_pool: shared model and pool, as in UnknownArea_v2.fleet (see 0Diagnostics/bench_fleet.py)
+    """
+    tello = ReplayTello(sensor_source, frame_source, height=params.FLIGHT_HEIGHT_SEARCH)
+    controller = DroneController(params.NETWORK_CONFIG, drone_id, load_midas=load_midas, imshow=False,
+                                 drone=tello, marker_client=ReplayMarkerClient(drone_id, tello), midas=midas)
+    controller.frame_reader = frame_source      # frames are published by this harness, not _stream_video
+    controller.perception_pool = perception_pool
+
+    timings = {}
+    if not load_midas:
+        controller.generate_color_depth_map = blank_depth_map
+    for stage in STAGES:
+        setattr(controller, stage, time_stage(timings, stage, getattr(controller, stage)))
+
+    usa.logger = logging.getLogger("UnknownArea.replay")    # normally set in usa.main()
+    nav_thread = threading.Thread(target=usa.navigation_thread, args=(controller,), daemon=True)
+    nav_thread.start()
+
+    wall_start = time.time()
+    first_timestamp = None
+    frames = 0
+    for seq, (timestamp, frame) in enumerate(frame_source, start=1):
+        if not nav_thread.is_alive():
+            logging.info("navigation_thread ended before the recording did.")
+            break
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        if realtime:
+            time.sleep(max(0, wall_start + (timestamp - first_timestamp) - time.time()))
+
+        tello.set_time(timestamp, seq)
+        controller.tof_buffer.publish(sensor_source.tof_at(timestamp))
+        publish_time = time.perf_counter()
+        controller._publish_frame(frame, timestamp)
+        frames += 1
+
+        if not realtime:    # lockstep: wait until navigation_thread asks for the next frame
+            with controller.frame_cond:
+                while controller.frame_request_seq < seq and nav_thread.is_alive():
+                    controller.frame_cond.wait(0.5)
+            timings.setdefault("nav_iteration", []).append((time.perf_counter() - publish_time) * 1000)
+
+    controller.is_running = False
+    controller.stop_event.set()
+    with controller.frame_cond:
+        controller.frame_cond.notify_all()
+    nav_thread.join(timeout=5)
+    wall_time = time.time() - wall_start
+
+    return {
+        "frames": frames,
+        "mode": "realtime" if realtime else "lockstep",
+        "wall_time_s": round(wall_time, 2),
+        "replay_fps": round(frames / wall_time, 1) if wall_time else None,
+        "stage_timings_ms": {stage: summarize(samples) for stage, samples in timings.items() if samples},
+        "perception_scheduler": controller.perception_scheduler.report(),
+        "marker_tracker": controller.marker_tracker.metrics,
+        "commands": tello.commands,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recording through navigation_thread")
+    parser.add_argument("params_module", help="e.g. shared_params.params (also read by load_params)")
+    parser.add_argument("recording", help="FlightRecorder prefix, or a video file with --video")
+    parser.add_argument("--video", action="store_true", help="recording is a plain video file (no ToF/UWB)")
+    parser.add_argument("--realtime", action="store_true", help="publish frames at recorded speed instead of lockstep")
+    parser.add_argument("--no-midas", action="store_true", help="skip MiDaS; depth map is treated as all clear")
+    parser.add_argument("--stand-in-midas", action="store_true",
+                        help="random-weight network of MiDaS_small's size instead of MiDaS (timing only, no hub download)")
+    parser.add_argument("--no-fly", action="store_true", help="keep params.NO_FLY (default: replay the flying logic)")
+    parser.add_argument("--out", help="report path (default: <recording>_replay.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=params.LOGGING_CONFIG['format'])
+    if not args.no_fly:
+        params.NO_FLY = False   # ReplayTello never flies; exercise the full approach logic
+
+    if args.video:
+        frame_source, sensor_source = VideoFileFrameSource(args.recording), SensorSource()
+    else:
+        recording = FlightRecording(args.recording)
+        frame_source, sensor_source = RecordedFrameSource(recording), RecordedSensorSource(recording)
+
+    report = run_replay(frame_source, sensor_source, drone_id=params.PI_ID, realtime=args.realtime,
+                        load_midas=not args.no_midas, midas=load_stand_in_model() if args.stand_in_midas else None)
+
+    out = args.out or f"{args.recording}_replay.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{report['frames']} frames in {report['wall_time_s']}s ({report['mode']}), {len(report['commands'])} commands")
+    for stage, stats in report["stage_timings_ms"].items():
+        print(f"{stage:>26}: " + ", ".join(f"{k} {v}" for k, v in stats.items()))
+    print(f"Report written to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -40,6 +40,55 @@ LOGGING_CONFIG = {
 
 EXTRA_HEIGHT = 0   # cm; if victim is higher than ground level (especially if detecting vertical face) 
 
+# VIDEO DECODER: PyAV pipeline in shared_utils/videodecoder.py instead of djitellopy's BackgroundFrameRead (ignored if LAPTOP_ONLY)
+PYAV_DECODER:bool = False
+DECODER_THREADS:int = 2                 # libav decoder thread_count
+DECODE_LATENCY_BUDGET_S:float = 0.25    # drop late frames and skip to next keyframe beyond this lag
+
+# FLIGHT RECORDING: raw H.264 + per-frame sidecar (shared_utils/flightrecorder.py). Needs PYAV_DECODER = True
+RECORD_FLIGHT:bool = False
+RECORD_DIR:str = "recordings"
+
+# HEADLESS PREVIEW: MJPEG over HTTP (shared_utils/mjpegserver.py), view at http://<this pc>:MJPEG_PORT/. 0 to disable. Works with IMSHOW = False
+MJPEG_PORT:int = 0
+MJPEG_MAX_FPS:float = 10
+
+# DEPTH SERVICE: port of a local shared_utils/depthservice.py (one batched MiDaS for all drone processes). 0 = load MiDaS in this process
+DEPTH_SERVICE_PORT:int = 0
+
+# PROFILER: per-stage span timings (shared_utils/profiler.py), summary + Chrome trace written to PROFILE_DIR at exit
+PROFILE:bool = False
+PROFILE_DIR:str = "profiles"
+
+# PERCEPTION SCHEDULER: run MiDaS only as often as the nav state needs (shared_utils/perceptionscheduler.py). False = every frame. Off until a replay shows the 2 Hz pillar check during centering / approach steers like per-frame MiDaS
+PERCEPTION_SCHEDULER:bool = False
+
+# ARUCO: search a downscaled frame while markers are large (>= ARUCO_MIN_SIDE_PX), refine corners at full resolution (shared_utils/arucodetector.py). Off until bench_aruco.py on the drone's recordings finds the same markers / poses as full-resolution detection
+ARUCO_TWO_SCALE:bool = False
+ARUCO_SEARCH_SCALE:float = 0.5
+ARUCO_MIN_SIDE_PX:float = 60
+
+# MARKER TRACKING: while locked on, track the marker with optical flow and only detect every TRACK_REDETECT_EVERY frames (shared_utils/markertracker.py). Off until replayed approaches show the tracked corners stay on the marker while yawing / closing in
+MARKER_TRACKING:bool = False
+TRACK_REDETECT_EVERY:int = 5
+
+# CALIBRATION: Tello id of calib_camera/camera_matrix_tello<ID>_<RES>.npy (shared_utils/calibration.py), e.g. "E920EB". "" = query the Tello's serial number. Falls back to CAMERA_MATRIX / DIST_COEFF above
+CALIBRATION_ID:str = ""
+
+# TOF: forward ToF polling period (s). Readings go to a timestamped buffer (shared_utils/tofbuffer.py). Checks after a move wait for ~3 polls; lower (e.g. 0.2) for faster checks, at the cost of more EXT tof? exchanges on the command path
+TOF_PERIOD_S:float = 0.5
+
+# COMMAND SCHEDULER: CustomTello exchanges every command through one prioritized I/O thread, replies matched to their command (shared_utils/commandscheduler.py). Off until a test flight on the drone's firmware logs no command timeouts or dropped replies with ToF polling running
+COMMAND_SCHEDULER:bool = False
+
+# TELEMETRY: CustomTello timestamps every state packet (shared_utils/telemetry.py) by wrapping its entry in djitellopy's module-global drones dict; get_telemetry(max_age=...) then rejects stale values. Off until a flight (and FleetIO) shows replies and state still arrive through the wrapped entry
+TELEMETRY_CACHE:bool = False
+
+# CENTERING: True = yaw onto a locked-on marker in a CENTERING_RATE_HZ control loop (shared_utils/controlloop.py), one rc per new frame; gives up if the marker is not seen for CENTERING_LOST_S. False = one yaw rc per navigation_thread pass. Off until a flight shows the loop settles without overshooting the 15px threshold
+CENTERING_LOOP:bool = False
+CENTERING_RATE_HZ:float = 20
+CENTERING_LOST_S:float = 1.0
+
 def get_network_config(pi_id: int):
     """
     Returns network configuration based on pi_id.
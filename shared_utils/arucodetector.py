@@ -0,0 +1,78 @@
+"""
+ArUco detection for detect_markers, with an optional two-scale mode:
+
+- Search: detectMarkers on a downscaled grayscale frame (search_scale, e.g. 0.5 = a quarter of the pixels).
+- Refine: the candidate corners are scaled back up and refined on the full resolution frame with cornerSubPix,
+  so pose estimation still gets full resolution corners.
+
+A marker has to be large enough in the image to be found at the lower scale, so the downscaled search is only used
+while the markers of the previous frame were at least min_side_px (full resolution) on their shortest side.
+If the downscaled search finds nothing, the same frame is searched again at full resolution (a far away marker
+is never missed for a frame because of the downscaling), and full resolution search continues until markers are
+large again.
+
+Compare speed / accuracy with plain full resolution detection: 0Diagnostics/bench_aruco.py
+"""
+
+from typing import List, Optional, Tuple
+
+import cv2
+from cv2 import aruco
+import numpy as np
+
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+
+
+def min_side_px(corners: List[np.ndarray]) -> float:
+    """Shortest side of the smallest marker, in px"""
+    return min(np.linalg.norm(c.reshape(4, 2) - np.roll(c.reshape(4, 2), 1, axis=0), axis=1).min() for c in corners)
+
+
+class ArucoDetector:
+    """
+    Args:
+        two_scale: use the downscaled search when markers are large, else always full resolution (as before)
+        search_scale: downscale factor of the search image
+        min_side_px: markers need at least this side (full resolution px) for the next frame to be searched downscaled
+    """
+    def __init__(self, dictionary: int = aruco.DICT_5X5_250, two_scale: bool = True, search_scale: float = 0.5,
+                 min_side_px: float = 60):
+        self.dictionary = aruco.getPredefinedDictionary(dictionary)
+        self.parameters = aruco.DetectorParameters()
+        self.two_scale = two_scale
+        self.search_scale = search_scale
+        self.min_side_px = min_side_px
+        self.expect_large = False   # markers of the last frame were large enough to search downscaled
+        self.metrics = {"frames": 0, "downscaled": 0, "downscaled_misses": 0, "full": 0}
+
+    def detect(self, frame: np.ndarray) -> Tuple[Optional[List[np.ndarray]], Optional[np.ndarray]]:
+        """Same corners / ids as aruco.detectMarkers (ids None if nothing found)"""
+        self.metrics["frames"] += 1
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.two_scale and self.expect_large:
+            self.metrics["downscaled"] += 1
+            corners, ids = self._detect_downscaled(gray)
+            if ids is not None:
+                self.expect_large = min_side_px(corners) >= self.min_side_px
+                return corners, ids
+            self.metrics["downscaled_misses"] += 1
+
+        self.metrics["full"] += 1
+        corners, ids, _ = aruco.detectMarkers(gray, self.dictionary, parameters=self.parameters)
+        self.expect_large = ids is not None and min_side_px(corners) >= self.min_side_px
+        return corners, ids
+
+    def _detect_downscaled(self, gray: np.ndarray):
+        small = cv2.resize(gray, None, fx=self.search_scale, fy=self.search_scale, interpolation=cv2.INTER_AREA)
+        corners, ids, _ = aruco.detectMarkers(small, self.dictionary, parameters=self.parameters)
+        if ids is None:
+            return corners, None
+        # Corner (x, y) at scale s is at (x + 0.5) / s - 0.5 in full resolution (pixel centres)
+        window = max(2, int(round(1 / self.search_scale)) + 1)
+        refined = []
+        for c in corners:
+            points = ((c.reshape(4, 1, 2) + 0.5) / self.search_scale - 0.5).astype(np.float32)
+            cv2.cornerSubPix(gray, points, (window, window), (-1, -1), SUBPIX_CRITERIA)
+            refined.append(points.reshape(1, 4, 2))
+        return tuple(refined), ids
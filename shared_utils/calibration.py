@@ -0,0 +1,172 @@
+"""
+Camera calibration registry: one place for camera intrinsics, per Tello and video resolution.
+
+    calibration = calibration_registry.get("E920EB", (640, 480), fallback=(params.CAMERA_MATRIX, params.DIST_COEFF))
+    calibration.camera_matrix, calibration.dist_coeff      # for estimatePoseSingleMarkers, drawFrameAxes
+    rectified = calibration.undistort(frame)                # cv2.remap with precomputed maps
+
+- Files: calib_camera/camera_matrix_tello<ID>_<RES>.npy + dist_coeffs_tello<ID>_<RES>.npy (RES e.g. 480P, from
+  calib_camera/calib1.py). Loaded on first use and memoized, never at import time.
+- No file for this Tello / resolution: the fallback (params' 480P matrix) is used, scaled to the frame size
+  (Tello 480P and 720P are the same 4:3 sensor area).
+- undistort_maps() builds the initUndistortRectifyMap tables (fixed point, for a fast remap) once and caches them in
+  calib_camera/cache/*.npz (stored uncompressed, so later runs memory-map them instead of recomputing). The cache
+  file name includes a hash of the intrinsics, so a new calibration never picks up stale maps.
+"""
+
+import os
+import struct
+import zipfile
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+CALIB_DIR = "calib_camera"
+RESOLUTIONS = {"480P": (640, 480), "720P": (960, 720)}     # name -> (width, height), as in the calibration file names
+FALLBACK_SIZE = RESOLUTIONS["480P"]                          # params.CAMERA_MATRIX / DIST_COEFF are for 480P
+
+
+def resolution_name(size: Tuple[int, int]) -> str:
+    """(width, height) -> e.g. "480P" """
+    for name, known in RESOLUTIONS.items():
+        if tuple(size) == known:
+            return name
+    return f"{size[0]}x{size[1]}"
+
+
+def load_npz_mmap(path: str) -> Dict[str, np.ndarray]:
+    """Memory-maps every array of an uncompressed .npz (np.savez); compressed members are read normally"""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            f.seek(info.header_offset + 26)     # local file header: name / extra field lengths at byte 26
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                     order="F" if fortran_order else "C")
+    return arrays
+
+
+class Calibration:
+    """Intrinsics of one camera at one resolution (size = (width, height)), with lazily built undistortion maps"""
+    def __init__(self, name: str, camera_matrix: np.ndarray, dist_coeff: np.ndarray, size: Tuple[int, int],
+                 cache_dir: Optional[str] = None):
+        self.name = name
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+        self.dist_coeff = np.asarray(dist_coeff, dtype=np.float64)
+        self.size = tuple(size)
+        self.cache_dir = cache_dir
+        self._maps = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Calibration({self.name}, {self.size[0]}x{self.size[1]})"
+
+    def undistort_maps(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(map1, map2) for cv2.remap; from memory, the disk cache, or computed (and cached) on first use"""
+        with self._lock:
+            if self._maps is None:
+                self._maps = self._load_or_build_maps()
+            return self._maps
+
+    def undistort(self, frame: np.ndarray) -> np.ndarray:
+        """Rectified frame (same camera matrix, no distortion)"""
+        map1, map2 = self.undistort_maps()
+        return cv2.remap(frame, map1, map2, cv2.INTER_LINEAR)
+
+    def _cache_path(self) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha1(self.camera_matrix.tobytes() + self.dist_coeff.tobytes()).hexdigest()[:10]
+        return os.path.join(self.cache_dir, f"undistort_{self.name}_{self.size[0]}x{self.size[1]}_{digest}.npz")
+
+    def _load_or_build_maps(self):
+        path = self._cache_path()
+        if path and os.path.exists(path):
+            try:
+                arrays = load_npz_mmap(path)
+                return arrays["map1"], arrays["map2"]
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+                logging.warning(f"Ignoring unreadable undistortion cache {path}: {e}")
+
+        map1, map2 = cv2.initUndistortRectifyMap(self.camera_matrix, self.dist_coeff, None, self.camera_matrix,
+                                                 self.size, cv2.CV_16SC2)
+        if path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.savez(path, map1=map1, map2=map2)
+                logging.info(f"Undistortion maps for {self} cached to {path}")
+            except OSError as e:
+                logging.warning(f"Could not cache undistortion maps to {path}: {e}")
+        return map1, map2
+
+
+class CalibrationRegistry:
+    """
+    Memoized calibrations per (camera id, frame size). Thread safe.
+    Args:
+        calib_dir: where the camera_matrix_tello*.npy / dist_coeffs_tello*.npy files are
+        cache_dir: undistortion map cache (default calib_dir/cache), None to not cache to disk
+    """
+    def __init__(self, calib_dir: str = CALIB_DIR, cache_dir: Optional[str] = ""):
+        self.calib_dir = calib_dir
+        self.cache_dir = os.path.join(calib_dir, "cache") if cache_dir == "" else cache_dir
+        self._calibrations: Dict[tuple, Calibration] = {}
+        self._files: Dict[str, Optional[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def load_files(self, name: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(camera_matrix, dist_coeff) from camera_matrix_tello<name>.npy / dist_coeffs_tello<name>.npy, or None"""
+        with self._lock:
+            if name not in self._files:
+                camera_matrix_path = os.path.join(self.calib_dir, f"camera_matrix_tello{name}.npy")
+                dist_coeffs_path = os.path.join(self.calib_dir, f"dist_coeffs_tello{name}.npy")
+                if os.path.exists(camera_matrix_path) and os.path.exists(dist_coeffs_path):
+                    self._files[name] = (np.load(camera_matrix_path), np.load(dist_coeffs_path))
+                    logging.info(f"Calibration parameters obtained for {name} from {self.calib_dir}")
+                else:
+                    self._files[name] = None
+            return self._files[name]
+
+    def get(self, camera_id: str, size: Tuple[int, int], fallback: Optional[tuple] = None) -> Calibration:
+        """
+        Calibration of camera_id for frames of size (width, height).
+        fallback: (camera_matrix, dist_coeff) at FALLBACK_SIZE, used (scaled) when there is no file for this camera
+        """
+        key = (camera_id, tuple(size))
+        calibration = self._calibrations.get(key)
+        if calibration is not None:
+            return calibration
+
+        name = f"{camera_id}_{resolution_name(size)}"
+        files = self.load_files(name) if camera_id else None
+        if files is not None:
+            calibration = Calibration(name, *files, size, self.cache_dir)
+        elif fallback is not None:
+            camera_matrix = np.array(fallback[0], dtype=np.float64)
+            scale_x, scale_y = size[0] / FALLBACK_SIZE[0], size[1] / FALLBACK_SIZE[1]
+            camera_matrix[0] *= scale_x
+            camera_matrix[1] *= scale_y
+            logging.info(f"No calibration file for Tello '{camera_id}' at {resolution_name(size)}; "
+                         f"using params' 480P calibration{' scaled' if (scale_x, scale_y) != (1, 1) else ''}.")
+            calibration = Calibration(f"params_{resolution_name(size)}", camera_matrix, fallback[1], size, self.cache_dir)
+        else:
+            raise FileNotFoundError(f"Calibration files for Tello {name} not found.")
+
+        with self._lock:
+            return self._calibrations.setdefault(key, calibration)
+
+
+calibration_registry = CalibrationRegistry()    # one per process
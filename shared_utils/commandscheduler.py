@@ -0,0 +1,219 @@
+"""
+Prioritized command scheduler for one Tello's control socket, used by CustomTello.
+
+Motion commands, reads (battery?, EXT tof?) and rc all share the control socket, from several threads (navigation,
+_tof_thread / FleetIO.poll_tof, PID loops). The Tello answers in order but with no request id, so two exchanges at
+once can take each other's reply (the IndexError in get_ext_tof). Here ONE I/O thread owns the socket:
+
+- submit() queues a request and returns a Future. The queue is ordered by priority, then by submission:
+  EMERGENCY (land, stop) > MOTION (takeoff, moves, settings) > RC > TELEMETRY (reads, e.g. EXT tof?).
+- One exchange is in flight at a time, so a motion command waits for at most the exchange already in flight,
+  never for queued telemetry.
+- Every request has its own timeout. Replies are matched to the request: replies still pending from a timed out
+  exchange are dropped before the next send, and a reply that cannot answer the command in flight (e.g. "tof 512"
+  while waiting for "ok") is discarded instead of returned.
+- "emergency" is sent at once from the calling thread (no reply to wait for, must not wait for an exchange).
+  A queued rc is replaced by a newer one, only the latest stick values matter.
+- metrics(): queue depth per priority, timeouts / dropped replies and queue wait / round trip histograms.
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+from .profiler import StageStats
+
+EMERGENCY, MOTION, RC, TELEMETRY = range(4)
+PRIORITY_NAMES = ("emergency", "motion", "rc", "telemetry")
+EMERGENCY_COMMANDS = {"emergency", "land", "stop"}
+
+
+def command_priority(command: str) -> int:
+    verb = command.split(" ")[0]
+    if verb in EMERGENCY_COMMANDS:
+        return EMERGENCY
+    if verb == "rc":
+        return RC
+    if command.endswith("?"):
+        return TELEMETRY
+    return MOTION
+
+
+def response_matches(command: str, response: str) -> bool:
+    """Could response be the Tello's reply to command? (late replies of timed out exchanges can still arrive)"""
+    reply = response.lower()
+    if command == "EXT tof?":
+        return reply.startswith("tof")
+    if reply.startswith("tof"):     # only ever the answer to EXT tof?
+        return False
+    if command.endswith("?"):
+        return reply != "ok"    # an ok belongs to an earlier control command
+    return not reply.lstrip("-").replace(".", "", 1).isdigit()     # a number answers a read
+
+
+class _Request:
+    __slots__ = ("command", "priority", "timeout", "expects_reply", "future", "submitted_ns")
+
+    def __init__(self, command: str, priority: int, timeout: float, expects_reply: bool):
+        self.command = command
+        self.priority = priority
+        self.timeout = timeout
+        self.expects_reply = expects_reply
+        self.future: Future = Future()
+        self.submitted_ns = time.perf_counter_ns()
+
+
+class CommandScheduler:
+    """
+    Args:
+        send: callable(bytes) that sends one datagram to the drone
+        responses: the drone's reply list (djitellopy's drones[host]['responses']), appended by the UDP receiver
+        min_interval_s: least time between a reply and the next command (Tello.TIME_BTW_COMMANDS)
+        poll_s: how often the exchange in flight checks for its reply
+    """
+    def __init__(self, send: Callable[[bytes], None], responses: List[bytes], min_interval_s: float = 0.1,
+                 poll_s: float = 0.005, name: str = "tello"):
+        self.send = send
+        self.responses = responses
+        self.min_interval_s = min_interval_s
+        self.poll_s = poll_s
+        self.name = name
+        self.in_flight: Optional[str] = None
+        self.last_reply_time = 0.0
+        self._queue: list = []      # heap of (priority, seq, _Request)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._queued_rc: Optional[_Request] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self.depth = [0] * len(PRIORITY_NAMES)
+        self.max_depth = [0] * len(PRIORITY_NAMES)
+        self.queue_wait = [StageStats() for _ in PRIORITY_NAMES]    # submit -> sent
+        self.round_trip = [StageStats() for _ in PRIORITY_NAMES]    # sent -> matching reply
+        self.counts: Dict[str, int] = {"sent": 0, "timeouts": 0, "stale_replies": 0, "mismatched_replies": 0,
+                                       "rc_coalesced": 0, "failed": 0}
+
+    def start(self) -> "CommandScheduler":
+        with self._cond:
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-io", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        """Stops the I/O thread after the exchange in flight; requests still queued fail"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        with self._cond:
+            pending, self._queue = self._queue, []
+            self.depth = [0] * len(PRIORITY_NAMES)
+            self._queued_rc = None
+        for _, _, request in pending:
+            request.future.set_exception(RuntimeError(f"Command scheduler {self.name} stopped before '{request.command}' was sent"))
+
+    def submit(self, command: str, timeout: float = 1.0, expects_reply: bool = True,
+               priority: Optional[int] = None) -> Future:
+        """Queues command; the Future's result is the reply, or None on timeout / when no reply is expected"""
+        request = _Request(command, command_priority(command) if priority is None else priority, timeout, expects_reply)
+        if request.priority == EMERGENCY and not expects_reply:
+            self.send(command.encode("utf-8"))
+            request.future.set_result(None)
+            return request.future
+        with self._cond:
+            if not self._running:
+                raise RuntimeError(f"Command scheduler {self.name} is not running")
+            if request.priority == RC and self._queued_rc is not None:
+                self._queued_rc.command = command   # not sent yet: send the latest values instead
+                self.counts["rc_coalesced"] += 1
+                return self._queued_rc.future
+            if request.priority == RC:
+                self._queued_rc = request
+            heapq.heappush(self._queue, (request.priority, next(self._seq), request))
+            self.depth[request.priority] += 1
+            self.max_depth[request.priority] = max(self.max_depth[request.priority], self.depth[request.priority])
+            self._cond.notify()
+        return request.future
+
+    def request(self, command: str, timeout: float = 1.0) -> Optional[str]:
+        """submit() and wait: the reply, or None on timeout"""
+        return self.submit(command, timeout=timeout).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._running and not self._queue:
+                        self._cond.wait()
+                    if not self._running:
+                        return
+                    # Keep min_interval_s after the last reply, but pick the request only when it is over: a motion
+                    # command submitted meanwhile still goes first
+                    wait = self.min_interval_s - (time.time() - self.last_reply_time)
+                    if wait <= 0 or not self._queue[0][2].expects_reply:
+                        break
+                    self._cond.wait(wait)
+                _, _, request = heapq.heappop(self._queue)
+                self.depth[request.priority] -= 1
+                if request is self._queued_rc:
+                    self._queued_rc = None
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                request.future.set_result(self._exchange(request))
+            except Exception as e:
+                self.counts["failed"] += 1
+                logging.error(f"Command scheduler {self.name}: '{request.command}' failed: {e}")
+                request.future.set_exception(e)
+
+    def _exchange(self, request: _Request) -> Optional[str]:
+        stale = len(self.responses) if request.expects_reply else 0
+        if stale:   # late replies of timed out exchanges
+            del self.responses[:stale]
+            self.counts["stale_replies"] += stale
+
+        sent_ns = time.perf_counter_ns()
+        self.queue_wait[request.priority].add(sent_ns - request.submitted_ns)
+        self.in_flight = request.command
+        try:
+            self.send(request.command.encode("utf-8"))
+            self.counts["sent"] += 1
+            if not request.expects_reply:
+                return None
+            deadline = time.time() + request.timeout
+            while time.time() < deadline:
+                while self.responses:
+                    reply = self.responses.pop(0).decode("utf-8", errors="ignore").rstrip("\r\n")
+                    if response_matches(request.command, reply):
+                        self.last_reply_time = time.time()
+                        self.round_trip[request.priority].add(time.perf_counter_ns() - sent_ns)
+                        return reply
+                    self.counts["mismatched_replies"] += 1
+                    logging.debug(f"Command scheduler {self.name}: dropped reply '{reply}' while waiting for '{request.command}'")
+                time.sleep(self.poll_s)
+            self.counts["timeouts"] += 1
+            return None
+        finally:
+            self.in_flight = None
+
+    def metrics(self) -> dict:
+        with self._cond:
+            depth, max_depth = list(self.depth), list(self.max_depth)
+        return {
+            "queue_depth": dict(zip(PRIORITY_NAMES, depth)),
+            "max_queue_depth": dict(zip(PRIORITY_NAMES, max_depth)),
+            "in_flight": self.in_flight,
+            **self.counts,
+            "queue_wait": {name: stats.summary() for name, stats in zip(PRIORITY_NAMES, self.queue_wait) if stats.count},
+            "round_trip": {name: stats.summary() for name, stats in zip(PRIORITY_NAMES, self.round_trip) if stats.count},
+        }
+
+    def log_report(self):
+        logging.info(f"Command scheduler {self.name}: {self.metrics()}")
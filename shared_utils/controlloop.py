@@ -0,0 +1,87 @@
+"""
+Fixed-rate control loop: iterations are scheduled against absolute deadlines (start + n * period), so the time spent
+reading sensors and sending commands does not stretch the period, and the controller gets the measured dt instead
+of assuming it.
+
+    loop = ControlLoop(20, name="tello.height_pid")
+    for dt in loop.ticks(timeout_s=10):
+        error = target - read_sensor()
+        if abs(error) < tolerance:
+            break                       # converged: early exit
+        integral += error * dt          # dt = measured time since the previous iteration
+        ...
+    else:
+        ...                             # timed out
+    loop.log_report()
+
+- An iteration that overruns its period is followed at once by the next one. Whole periods that were missed are
+  skipped, not run in a burst (counted as skipped_ticks).
+- Per loop: dt and jitter (how late each iteration started vs its deadline) histograms, overruns. Every iteration is
+  also a profiler span (<name>.step) when profiling is on.
+"""
+
+import time
+import logging
+from typing import Callable, Iterator, Optional
+
+from .profiler import StageStats, profiler
+
+
+class ControlLoop:
+    """
+    Args:
+        rate_hz: iterations per second
+        name: for the report and the profiler span
+    """
+    def __init__(self, rate_hz: float, name: str = "control_loop"):
+        self.rate_hz = rate_hz
+        self.period_s = 1.0 / rate_hz
+        self.name = name
+        self.dt_stats = StageStats()
+        self.jitter_stats = StageStats()
+        self.metrics = {"iterations": 0, "overruns": 0, "skipped_ticks": 0}
+
+    def ticks(self, timeout_s: Optional[float] = None) -> Iterator[float]:
+        """Yields the measured dt (s) once per period, the first one at once (dt = period), until timeout_s"""
+        start = time.perf_counter()
+        deadline = previous = start
+        dt = self.period_s
+        while timeout_s is None or time.perf_counter() - start <= timeout_s:
+            now = time.perf_counter()
+            self.jitter_stats.add(int(max(0.0, now - deadline) * 1e9))
+            if self.metrics["iterations"]:
+                dt = now - previous
+                self.dt_stats.add(int(dt * 1e9))
+            previous = now
+            self.metrics["iterations"] += 1
+            step_start_ns = time.perf_counter_ns()
+            yield dt
+            if profiler.enabled:
+                profiler.record(f"{self.name}.step", step_start_ns, time.perf_counter_ns())
+
+            deadline += self.period_s
+            now = time.perf_counter()
+            if now >= deadline:     # the step took longer than its period: next iteration at once
+                self.metrics["overruns"] += 1
+                missed = int((now - deadline) // self.period_s)
+                self.metrics["skipped_ticks"] += missed
+                deadline += missed * self.period_s
+            else:
+                time.sleep(deadline - now)
+
+    def run(self, step: Callable[[float], bool], timeout_s: Optional[float] = None) -> bool:
+        """Calls step(dt) every period until it returns True (returns True) or timeout_s passes (returns False)"""
+        for dt in self.ticks(timeout_s):
+            if step(dt):
+                return True
+        return False
+
+    def summary(self) -> dict:
+        return {"rate_hz": self.rate_hz, **self.metrics, "dt": self.dt_stats.summary(),
+                "jitter": self.jitter_stats.summary()}
+
+    def log_report(self):
+        dt, jitter = self.dt_stats.summary(), self.jitter_stats.summary()
+        logging.info(f"{self.name}: {self.metrics['iterations']} iterations at {self.rate_hz:g}Hz, "
+                     f"dt mean {dt['mean_ms']:.1f}ms (max {dt['max_ms']:.1f}ms), jitter p95 {jitter['p95_ms']:.1f}ms, "
+                     f"{self.metrics['overruns']} overruns ({self.metrics['skipped_ticks']} ticks skipped)")
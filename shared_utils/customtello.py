@@ -9,15 +9,28 @@ import time
 import logging  # in decreasing log level: debug > info > warning > error > critical
 import threading
 import random
+from typing import Optional
+
+import djitellopy.tello as djitellopy_tello
 
 from UWB_Wrapper.UWB_SendUDP import UWBPublisher
+from .videodecoder import H264DecoderThread
+from .profiler import span, profiled
+from .commandscheduler import CommandScheduler
+from .controlloop import ControlLoop
+from .telemetry import TelemetryCache, StateStreamDict
 
 class CustomTello(Tello):
     
     RESPONSE_TIMEOUT = 7    # Alternative: override globally here (default: 7s)
     TAKEOFF_TIMEOUT = 10    # (default: 20s)
+    STATE_STALL_S = 0.5     # no state packet for this long = state stream stalled (packets normally every ~0.1s)
     
-    def __init__(self, network_config):
+    def __init__(self, network_config, command_scheduler: bool = False, telemetry_cache: bool = False):
+        """
+        command_scheduler: exchange every command through one prioritized I/O thread (see commandscheduler.py)
+        telemetry_cache: timestamp every state packet in self.telemetry (see telemetry.py), else self.telemetry is None
+        """
         # Store custom configuration
         self.TELLO_IP = network_config['host']
         self.CONTROL_UDP_PORT = network_config['control_port']
@@ -36,9 +49,82 @@ class CustomTello(Tello):
         # Override video port
         self.vs_udp_port = self.VS_UDP_PORT
 
+        # Timestamp every state packet (see telemetry.py); the state getters below read this cache
+        self.telemetry: Optional[TelemetryCache] = None
+        if telemetry_cache:
+            self.telemetry = TelemetryCache(stall_after_s=self.STATE_STALL_S, name=self.TELLO_IP)
+            djitellopy_tello.drones[self.TELLO_IP] = StateStreamDict(self.telemetry, djitellopy_tello.drones[self.TELLO_IP])
+        self._stall_warned = False
+
+        self.command_scheduler: Optional[CommandScheduler] = None
+        if command_scheduler:
+            self.command_scheduler = CommandScheduler(self._send_datagram, self.get_own_udp_object()['responses'],
+                                                      min_interval_s=self.TIME_BTW_COMMANDS, name=self.TELLO_IP).start()
+
+    def _send_datagram(self, data: bytes):
+        djitellopy_tello.client_socket.sendto(data, self.address)
+
+    def get_state_field(self, key: str, max_age: Optional[float] = None):
+        """
+        Same as parent (get_height, get_battery, get_yaw, get_distance_tof... all go through here): the last state
+        packet's value, never a round trip. max_age (s): raise StaleTelemetryError if older. Warns once per stall.
+        Without the telemetry cache: the parent's, max_age is ignored.
+        """
+        if self.telemetry is None:
+            return super().get_state_field(key)
+        if self.telemetry.stalled() and self.telemetry.last_packet_time is not None:
+            if not self._stall_warned:
+                logging.warning(f"Tello {self.TELLO_IP} state stream stalled for {self.telemetry.age():.1f}s; "
+                                f"'{key}' and other state fields are stale.")
+                self._stall_warned = True
+        else:
+            self._stall_warned = False
+        return self.telemetry.get(key, max_age=max_age)
+
+    def get_frame_read_pyav(self, decoder_threads: int = 2, latency_budget_s: float = 0.25,
+                            frame_callback=None, packet_callback=None, error_callback=None) -> H264DecoderThread:
+        """
+        Alternative to get_frame_read(): decodes vs_udp_port with our own PyAV pipeline (see videodecoder.py).
+        Registered as background_frame_read, so the parent's streamoff() also stops it.
+        """
+        if self.background_frame_read is None:
+            self.background_frame_read = H264DecoderThread(
+                self.vs_udp_port, decoder_threads=decoder_threads, latency_budget_s=latency_budget_s,
+                frame_callback=frame_callback, packet_callback=packet_callback, error_callback=error_callback).start()
+        return self.background_frame_read
+
     def send_command_with_return(self, command: str, timeout: int = 1) -> str:      # send_read_command for EXT Tof should then use this timeout. OG: 7
-            """Override the default parent function to change only the timeout value."""
-            return super().send_command_with_return(command, timeout=timeout)
+            """Override the default parent function to change the timeout value, and to go through the command scheduler."""
+            with span(f"tello.cmd.{command.split(' ')[0]}"):    # e.g. tello.cmd.forward, tello.cmd.EXT
+                if self.command_scheduler is None:
+                    return super().send_command_with_return(command, timeout=timeout)
+                self.LOGGER.info(f"Send command: '{command}'")
+                response = self.command_scheduler.request(command, timeout=timeout)
+                if response is None:    # same message as the parent, so send_control_command retries / raises as before
+                    message = f"Aborting command '{command}'. Did not receive a response after {timeout} seconds"
+                    self.LOGGER.warning(message)
+                    return message
+                self.last_received_command_timestamp = time.time()
+                self.LOGGER.info(f"Response {command}: '{response}'")
+                return response
+
+    @profiled("tello.cmd_no_reply")
+    def send_command_without_return(self, command: str):
+        """Same as parent (e.g. rc commands), profiled. Queued without waiting when the command scheduler is on."""
+        if self.command_scheduler is None:
+            super().send_command_without_return(command)
+            return
+        self.LOGGER.info(f"Send command (no response expected): '{command}'")
+        self.command_scheduler.submit(command, expects_reply=False)
+
+    def end(self):
+        """Same as parent (lands if flying), then stops the command scheduler"""
+        super().end()
+        if self.telemetry is not None:
+            logging.info(f"Telemetry {self.TELLO_IP}: {self.telemetry.summary()}")
+        if self.command_scheduler is not None:
+            self.command_scheduler.log_report()
+            self.command_scheduler.stop()
     
     def go_to_height(self, height: int) -> None:
         """
@@ -63,13 +149,15 @@ class CustomTello(Tello):
         final_height_tof = self.get_distance_tof()
         print(f"go_to_height {height}cm complete. Final height {final_height_tof}cm.")
             
-    def go_to_height_PID(self, target_height: int, timeout: float = 10.0) -> bool:      # TESTING 5 FEB
+    @profiled("tello.go_to_height_PID")
+    def go_to_height_PID(self, target_height: int, timeout: float = 10.0, rate_hz: float = 20) -> bool:      # TESTING 5 FEB
         """
         Control drone height using PID control until target height is reached within tolerance
         
         Args:
             target_height: Desired height in cm
             timeout: Maximum time to attempt height control in seconds
+            rate_hz: control rate; iterations run on fixed deadlines with the measured dt (see controlloop.py)
         Returns:
             bool: True if target height was achieved, False if timeout occurred
         """
@@ -82,19 +170,13 @@ class CustomTello(Tello):
         tolerance = 5  # Acceptable error in cm
         min_speed = 20  # Minimum speed for drone movement
         max_speed = 100  # Maximum speed for drone movement
-        dt = 0.1  # Time step in seconds
         
         # Initialize PID variables
         integral = 0
         prev_error = 0
-        start_time = time.time()
+        loop = ControlLoop(rate_hz, name="tello.height_pid")
         
-        while True:
-            # Check timeout
-            if time.time() - start_time > timeout:
-                logging.warning(f"Height control timeout after {timeout} seconds")
-                return False
-                
+        for dt in loop.ticks(timeout_s=timeout):    # dt: measured time since the last iteration (was assumed 0.1s)
             # Get current height
             current_height = self.get_distance_tof()
             error = target_height - current_height
@@ -103,6 +185,7 @@ class CustomTello(Tello):
             if abs(error) < tolerance:
                 logging.info(f"Target height achieved. Current: {current_height}cm, Target: {target_height}cm")
                 self.send_rc_control(0,0,0,0)
+                loop.log_report()
                 return True
                 
             # Calculate PID terms
@@ -132,12 +215,14 @@ class CustomTello(Tello):
             # Update previous error
             prev_error = error
             
-            # Small delay to prevent overwhelming the drone
-            time.sleep(dt)
-            
             # Log progress
-            logging.info(f"Current height: {current_height}cm, Error: {error}cm, Speed: {speed}")
+            logging.debug(f"Current height: {current_height}cm, Error: {error}cm, Speed: {speed}, dt: {dt*1000:.0f}ms")
+
+        logging.warning(f"Height control timeout after {timeout} seconds")
+        loop.log_report()
+        return False
     
+    @profiled("tello.get_ext_tof")
     def get_ext_tof(self) -> int:  
         """Get ToF sensor reading"""
         start_time = time.time()
@@ -147,11 +232,11 @@ class CustomTello(Tello):
         try:
             logging.debug(f"get_ext_tof response time: {duration:.2f}s")    # normally under 0.5-1s, default timeout is 7s
             return int(response.split()[1])
-        except ValueError or IndexError as e:    # IndexError if using threading and the response is not as intended
+        except (ValueError, IndexError) as e:    # IndexError if using threading and the response is not as intended (not with the command scheduler)
             logging.debug(f"EXT ToF response time: {duration:.2f}s")
             logging.debug(f"get_ext_tof raises error: {e}. Returning 8888.")    # 13 Feb seldom actually reaches here without threading?
             return 8888
-        except:
+        except Exception as e:
             logging.debug(f"EXT ToF response time: {duration:.2f}s")
             logging.debug(f"get_ext_tof raises other error: {e}. Returning 8888.")    # 13 Feb seldom actually reaches here without threading?
             return 8888
@@ -0,0 +1,296 @@
+"""
+Local depth service: ONE MiDaS model for every drone process on this ground station, with micro-batching.
+
+Before, every `UnknownArea_v2.main` process loaded its own MiDaS and ran batch-size-1 inference, all competing for
+the same cores. Now:
+- Each client (DroneController, params.DEPTH_SERVICE_PORT) gets a shared-memory slot from the service: it writes
+  the frame there and sends a small request over a local socket (multiprocessing.connection).
+- The service waits up to batch_window_s after the first pending request for others to arrive, runs them as one
+  batch, writes each depth colormap back into that client's slot and replies.
+Frames and results never go through the socket, only shapes and sequence numbers.
+
+Start once per ground station, BEFORE the drone processes (run from main workspace):
+    python -m shared_utils.depthservice --port 6000 --window-ms 10 --max-batch 4
+
+Benchmark against per-process models: 0Diagnostics/bench_depthservice.py
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client, wait
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+AUTHKEY = b"depthservice"
+MAX_FRAME_SHAPE = (720, 960, 3)     # largest frame a slot accepts (Tello 720P is 720x960)
+
+
+def load_midas_model(model_type:str = "MiDaS_small"):
+    """
+    Loads MiDaS and its transform. Returns (model, transform, device).
+    Pass the result to several DroneControllers (midas=...) to load the model only once per process.
+    """
+    import torch
+    midas = torch.hub.load("intel-isl/MiDaS", model_type)
+    device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+    midas.to(device)
+    midas.eval()
+
+    # Load MiDaS transform
+    midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
+    transform = midas_transforms.small_transform if model_type == "MiDaS_small" else midas_transforms.dpt_transform
+    return midas, transform, device
+
+
+def load_stand_in_model(input_height:int = 256, seed:int = 0):
+    """
+    Same returns as load_midas_model, for benchmarks where torch hub cannot download MiDaS: a random-weight conv net
+    with MiDaS_small's input size (input_height, width a multiple of 32) and a comparable cost (~1.8 GMAC at 256x352).
+    The depth maps are meaningless; only the compute and the model / pool sharing are realistic.
+    """
+    import torch
+    from torch import nn
+    torch.manual_seed(seed)
+    layers = [nn.Conv2d(3, 32, 3, stride=2, padding=1), nn.ReLU(),
+              nn.Conv2d(32, 64, 3, stride=2, padding=1), nn.ReLU(),
+              nn.Conv2d(64, 128, 3, stride=2, padding=1), nn.ReLU()]
+    for _ in range(8):
+        layers += [nn.Conv2d(128, 128, 3, padding=1), nn.ReLU()]
+    layers += [nn.Conv2d(128, 1, 1), nn.Upsample(scale_factor=8, mode="bilinear", align_corners=False)]
+    model = nn.Sequential(*layers).eval()
+    device = torch.device("cpu")
+
+    def transform(frame_rgb: np.ndarray):
+        height, width = frame_rgb.shape[:2]
+        size = (max(32, round(input_height * width / height / 32) * 32), input_height)
+        resized = cv2.resize(frame_rgb, size, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+        return torch.from_numpy(resized).permute(2, 0, 1).unsqueeze(0)
+
+    class _Squeezed(nn.Module):     # (1, 1, H, W) -> (1, H, W), as MiDaS returns
+        def forward(self, x):
+            return model(x).squeeze(1)
+    return _Squeezed().eval(), transform, device
+
+
+def depth_to_colormap(depth_map: np.ndarray) -> np.ndarray:
+    """MiDaS output (relative inverse depth) -> normalized JET colormap, as used by process_depth_color_map"""
+    depth_map = cv2.normalize(depth_map, None, 0, 1, norm_type=cv2.NORM_MINMAX)
+    return cv2.applyColorMap((depth_map * 255).astype(np.uint8), cv2.COLORMAP_JET)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Opens a segment created by the other side, without this process' resource tracker unlinking it on exit"""
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and sys.version_info < (3, 13):
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class _Slot:
+    """One client's shared memory: frame in, colormap out (same max size)"""
+    def __init__(self):
+        size = int(np.prod(MAX_FRAME_SHAPE))
+        self.input = shared_memory.SharedMemory(create=True, size=size)
+        self.output = shared_memory.SharedMemory(create=True, size=size)
+
+    def close(self):
+        for shm in (self.input, self.output):
+            shm.close()
+            shm.unlink()
+
+
+class DepthService:
+    """
+    Args:
+        port: localhost port clients connect to
+        batch_window_s: max time the first pending request waits for others to join its batch
+        max_batch: run a batch as soon as this many requests are pending
+        midas: optional (model, transform, device), default load_midas_model()
+    """
+    def __init__(self, port: int = 6000, batch_window_s: float = 0.01, max_batch: int = 4, midas=None):
+        self.midas, self.transform, self.device = midas or load_midas_model()
+        self.batch_window_s = batch_window_s
+        self.max_batch = max_batch
+        self.listener = Listener(("localhost", port), authkey=AUTHKEY)
+        self.clients: Dict[object, _Slot] = {}     # connection -> slot
+        self.clients_lock = threading.Lock()
+        self.running = False
+        self.metrics = {"requests": 0, "batches": 0, "inference_ms": 0.0}
+
+    def serve_forever(self):
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        logging.info(f"DepthService listening on {self.listener.address}, "
+                     f"{self.batch_window_s*1000:.0f}ms batch window, max batch {self.max_batch}")
+        last_report = time.time()
+        try:
+            while self.running:
+                pending = self._collect_batch()
+                if pending:
+                    self._run_batch(pending)
+                if time.time() - last_report > 10 and self.metrics["batches"]:
+                    self._log_metrics()
+                    last_report = time.time()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self.running = False
+        with self.clients_lock:
+            for conn, slot in self.clients.items():
+                conn.close()
+                slot.close()
+            self.clients.clear()
+        self.listener.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break   # listener closed in stop()
+            slot = _Slot()
+            conn.send({"input": slot.input.name, "output": slot.output.name, "max_shape": MAX_FRAME_SHAPE})
+            with self.clients_lock:
+                self.clients[conn] = slot
+            logging.info(f"DepthService: client connected ({len(self.clients)} total)")
+
+    def _drop_client(self, conn):
+        with self.clients_lock:
+            slot = self.clients.pop(conn, None)
+        conn.close()
+        if slot:
+            slot.close()
+        logging.info(f"DepthService: client disconnected ({len(self.clients)} left)")
+
+    def _collect_batch(self) -> List[tuple]:
+        """Waits for a first request, then up to batch_window_s for the other clients. Returns [(conn, request), ...]"""
+        pending = []
+        with self.clients_lock:
+            conns = list(self.clients)
+        if not conns:
+            time.sleep(0.05)
+            return pending
+        ready = wait(conns, 0.1)
+        deadline = time.perf_counter() + self.batch_window_s
+        while ready:
+            for conn in ready:
+                try:
+                    pending.append((conn, conn.recv()))
+                except (EOFError, OSError):
+                    self._drop_client(conn)
+            waiting = [conn for conn in conns if conn in self.clients and all(conn is not p[0] for p in pending)]
+            remaining = deadline - time.perf_counter()
+            if len(pending) >= self.max_batch or not waiting or remaining <= 0:
+                break   # full, everyone is in, or out of time
+            ready = wait(waiting, remaining)
+        return pending
+
+    def _run_batch(self, pending: List[tuple]):
+        import torch
+        start = time.perf_counter()
+        inputs = []
+        for conn, request in pending:
+            frame = np.ndarray(request["shape"], dtype=np.uint8, buffer=self.clients[conn].input.buf)
+            inputs.append(self.transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+
+        # Frames of different sizes give differently sized inputs; batch each size separately
+        predictions = [None] * len(inputs)
+        by_shape: Dict[tuple, List[int]] = {}
+        for i, tensor in enumerate(inputs):
+            by_shape.setdefault(tuple(tensor.shape), []).append(i)
+        with torch.no_grad():
+            for indices in by_shape.values():
+                output = self.midas(torch.cat([inputs[i] for i in indices]).to(self.device)).cpu().numpy()
+                for i, prediction in zip(indices, output):
+                    predictions[i] = prediction
+
+        for (conn, request), prediction in zip(pending, predictions):
+            colormap = depth_to_colormap(prediction)
+            out = np.ndarray(colormap.shape, dtype=np.uint8, buffer=self.clients[conn].output.buf)
+            out[:] = colormap
+            try:
+                conn.send({"seq": request["seq"], "shape": colormap.shape})
+            except OSError:
+                self._drop_client(conn)
+
+        self.metrics["requests"] += len(pending)
+        self.metrics["batches"] += 1
+        self.metrics["inference_ms"] += (time.perf_counter() - start) * 1000
+
+    def _log_metrics(self):
+        batches = self.metrics["batches"]
+        logging.info(f"DepthService: {len(self.clients)} clients, {self.metrics['requests']} frames in {batches} batches "
+                     f"(mean batch {self.metrics['requests']/batches:.2f}, {self.metrics['inference_ms']/batches:.0f}ms per batch)")
+
+
+class DepthClient:
+    """
+    Client side, a drop-in for DroneController.generate_color_depth_map. One request in flight at a time.
+    A reply that comes after its request timed out is discarded (its seq is not the current one). The service
+    answers one client's requests in order and writes a colormap just before its reply, so once the reply to the
+    current seq is in, the output slot holds that frame and is not written again until the next request.
+
+    e.g.
+        client = DepthClient(6000)
+        depth_colormap = client.generate_color_depth_map(frame)
+    """
+    def __init__(self, port: int = 6000, timeout: float = 2.0):
+        self.conn = Client(("localhost", port), authkey=AUTHKEY)
+        self.timeout = timeout
+        slot = self.conn.recv()
+        self.input = _attach(slot["input"])
+        self.output = _attach(slot["output"])
+        self.max_shape = tuple(slot["max_shape"])
+        self.seq = 0
+        self.lock = threading.Lock()
+        logging.info(f"DepthClient connected to depth service on port {port}")
+
+    def generate_color_depth_map(self, frame: np.ndarray) -> np.ndarray:
+        if frame.size > int(np.prod(self.max_shape)):
+            raise ValueError(f"DepthClient: frame {frame.shape} larger than slot {self.max_shape}")
+        with self.lock:
+            self.seq += 1
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=self.input.buf)[:] = frame
+            self.conn.send({"seq": self.seq, "shape": frame.shape})
+            deadline = time.perf_counter() + self.timeout
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or not self.conn.poll(remaining):
+                    raise TimeoutError(f"DepthClient: no depth map within {self.timeout}s")
+                reply = self.conn.recv()
+                if reply["seq"] == self.seq:
+                    return np.ndarray(reply["shape"], dtype=np.uint8, buffer=self.output.buf).copy()
+                logging.debug(f"DepthClient: discarded late reply {reply['seq']} (waiting for {self.seq})")
+
+    def close(self):
+        for shm in (self.input, self.output):
+            shm.close()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared, micro-batched MiDaS depth service for local drone processes")
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--window-ms", type=float, default=10, help="max wait for more requests to batch")
+    parser.add_argument("--max-batch", type=int, default=4)
+    parser.add_argument("--model", default="MiDaS_small")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(name)s - %(asctime)s - %(message)s")
+    service = DepthService(args.port, batch_window_s=args.window_ms / 1000, max_batch=args.max_batch,
+                           midas=load_midas_model(args.model))
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("DepthService stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,24 @@ import time
 from cv2 import aruco
 import numpy as np
 import math
+import os
 import threading
-from threading import Lock, Event
+from threading import Lock, Event, Condition
+from contextlib import nullcontext
 import logging  # in decreasing log level: debug > info > warning > error > critical
 from typing import List, Dict
+from djitellopy.tello import TelloException
 
 
 from .customtello import CustomTello, MockTello
+from .flightrecorder import FlightRecorder
+from .depthservice import DepthClient, load_midas_model, depth_to_colormap
+from .profiler import profiler, span, profiled
+from .perceptionscheduler import PerceptionScheduler, PERCEPTION_RATES
+from .arucodetector import ArucoDetector
+from .markertracker import MarkerTracker
+from .calibration import Calibration, calibration_registry
+from .tofbuffer import ToFBuffer
 from swarmserver.swarmserverclient import MarkerClient
 from .shared_utils import *
 
@@ -23,46 +34,82 @@ class DroneController:
     """
     No takeoff / flying / landing commands takes place here. (caa 17 Feb)
     """
-    def __init__(self, network_config, drone_id, laptop_only = False, load_midas = True, imshow = True):
+    def __init__(self, network_config, drone_id, laptop_only = False, load_midas = True, imshow = True,
+                 drone = None, marker_client = None, drone_params = None, midas = None):
+        """
+        Args:
+            drone: optional drone object to use instead of CustomTello/MockTello (e.g. replay.ReplayTello); treated as laptop_only
+            marker_client: optional client to use instead of a new MarkerClient (e.g. replay.ReplayMarkerClient)
+            drone_params: params module of THIS drone (default: the one from load_params). Needed when several drones share a process
+            midas: optional (model, transform, device) from load_midas_model(), to share one MiDaS model between controllers
+        """
+        self.params = drone_params or params
+        if self.params.PROFILE:   # per-stage timings, dumped at exit (see profiler.py)
+            profiler.enable(os.path.join(self.params.PROFILE_DIR, f"profile_{drone_id}_{time.strftime('%Y%m%d_%H%M%S')}"))
+
         # Initialize Tello
         logging.debug(f"laptop_only = {laptop_only}")
-        self.drone = MockTello() if laptop_only else CustomTello(network_config)
+        if drone is not None:
+            self.drone = drone
+            laptop_only = True      # no video settings to send
+        else:
+            self.drone = MockTello() if laptop_only else CustomTello(network_config, command_scheduler=self.params.COMMAND_SCHEDULER,
+                                                                     telemetry_cache=self.params.TELEMETRY_CACHE)
         
         self.imshow = imshow
         self.laptop_only = laptop_only
         
-        if load_midas:
-            # Initialize MiDaS model
+        self.depth_client:DepthClient = None
+        if load_midas and self.params.DEPTH_SERVICE_PORT and midas is None:
+            try:
+                self.depth_client = DepthClient(self.params.DEPTH_SERVICE_PORT)   # model lives in the shared depth service
+            except (ConnectionRefusedError, OSError) as e:
+                logging.warning(f"Depth service on port {self.params.DEPTH_SERVICE_PORT} not reachable ({e}). Loading MiDaS locally.")
+        if load_midas and self.depth_client is None:
+            # Initialize MiDaS model (or reuse a shared one)
             self.model_type = "MiDaS_small"
-            self.midas = torch.hub.load("intel-isl/MiDaS", self.model_type)
-            self.device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
-            self.midas.to(self.device)
-            self.midas.eval()
-            
-            # Load MiDaS transform
-            midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
-            self.transform = midas_transforms.small_transform
+            self.midas, self.transform, self.device = midas or load_midas_model(self.model_type)
+        self.perception_pool = None     # optional shared executor for heavy perception, see run_perception()
+        self.perception_scheduler = PerceptionScheduler(PERCEPTION_RATES if self.params.PERCEPTION_SCHEDULER else {})
 
         # Initialize Swarm Client
-        self.marker_client = MarkerClient(drone_id = drone_id, land_callback=self.handle_land_signal)
+        self.marker_client = marker_client or MarkerClient(drone_id = drone_id, land_callback=self.handle_land_signal)
+        if marker_client is None:
+            self.marker_client.log_in_server_time()     # log timestamps on the swarm server's clock, as all drones
 
         # Video Stream Properties        
         self.current_frame = None
         self.display_frame = None
         self.frame_lock = Lock()
+        self.frame_cond = Condition(self.frame_lock)   # notifies wait_for_frame() consumers when a new frame is published
+        self.frame_seq:int = 0              # monotonically increasing, +1 per new frame from the reader
+        self.frame_timestamp:float = None   # time.time() at which the current frame was captured
+        self.frame_poll_s:float = 0.005     # how long _stream_video sleeps when the reader has no new frame
+        self.frame_request_seq:int = 0      # after_seq of the latest wait_for_frame() call, i.e. consumer is done with this frame
+        self.display_cond = Condition(self.frame_lock)  # notifies wait_for_display_frame() consumers (display_loop, MJPEGServer)
+        self.display_seq:int = 0            # +1 per set_display_frame()
         self.stream_thread = None
+        self.tof_thread = None
         self.stop_event = Event()
+        self.recorder:FlightRecorder = None     # set in setup_stream if params.RECORD_FLIGHT
 
         ## COMMENT OUT BELOW FOR TESTING MULTIPLE DRONES USING NO_FLY = FALSE ON LAPTOP ONLY (USEFUL FOR TESTING CLIENTS REMOTELY), BUT ALSO NEED TO COMMENT OUT ALL OTHER GET.BATTERY() ETC. ------------------------------------
 
+        self.calibration_id:str = self.params.CALIBRATION_ID     # see calibration(); "" = this Tello's serial number
+
         self.drone.connect()
-        logging.info(f"Start Battery Level: {self.drone.get_battery()}%")
+        logging.info(f"Start Battery Level: {self.get_telemetry('bat', default='?')}%")
 
         if not self.laptop_only:
             start_time = time.time()
             self.drone.set_video_resolution(self.drone.RESOLUTION_480P)     # IMPT: Default 720P - need to use correct calibration params if set to 480P 
             self.drone.set_video_fps(self.drone.FPS_15)
             self.drone.set_video_bitrate(self.drone.BITRATE_3MBPS)
+            if not self.calibration_id:
+                try:
+                    self.calibration_id = self.drone.query_serial_number()
+                except Exception as e:
+                    logging.warning(f"Could not query serial number for calibration ({e}); using params' calibration.")
             duration = time.time() - start_time
             logging.debug(f"Video stream parameters set in {duration:.1f}s")
         
@@ -73,10 +120,10 @@ class DroneController:
         
         # Controller state
         self.frame = None
-        self.frame_lock = Lock()
         self.distance = None        # 29 Jan Gab: This is the 3D distance - decently accurate
         self.distance_lock = Lock()
         self.is_running = True
+        self.nav_state:str = ""     # set by the navigation logic through set_nav_state(), e.g. "searching"
         self.marker_detected = False
         self.markernum_lockedon:int = None
         self.is_centered = False
@@ -89,13 +136,17 @@ class DroneController:
         self.exit_distance_3D = None
         self.marker_positions = {}
         self.valid_marker_info:dict = {}    # stores the data of ONE valid, locked-on marker
+        self.aruco_detector = ArucoDetector(two_scale=self.params.ARUCO_TWO_SCALE, search_scale=self.params.ARUCO_SEARCH_SCALE,
+                                            min_side_px=self.params.ARUCO_MIN_SIDE_PX)   # downscaled search while markers are large
+        self.marker_tracker = MarkerTracker(redetect_every=self.params.TRACK_REDETECT_EVERY)    # locked-on marker between detections
          
         # Navigation parameters
         self.drone_id = drone_id
         self.move_speed = 20    # usually 20
         self.yaw_speed = 50     # usually 50
-        self.forward_tof_dist = 0 # to be updated by subthread
-        self.forward_tof_lock = Lock()
+        self.tof_buffer = ToFBuffer()   # timestamped readings from _tof_thread, read without locking (see forward_tof_dist)
+        self.forward_tof_lock = Lock()  # held while a command is exchanged with the drone, so ToF queries never interleave with motion (not needed by ToF polling with CustomTello's command scheduler)
+        self.tof_scheduler = None   # optional callable(controller) that takes over ToF polling from _tof_thread (e.g. UnknownArea_v2.fleet)
         self.target_yaw = None      # TESTING END-JAN - for exit marker (still testing caa 26 Feb)
 
         # Danger offset parameters
@@ -104,13 +155,37 @@ class DroneController:
         self.nearest_danger_data:dict = None  # stores the data of ONE nearest danger marker closest to valid_marker_info
         self.danger_offset:tuple[int] = (0,0,0)
         self.no_danger_count:int = 0
+
+        # Navigation logic state, kept per controller so several drones can share one process (see UnknownArea_v2.fleet)
+        self.hover_mode:bool = False        # set on video errors; navigation holds position until errors stop
+        self.last_error_time:float = 0
+        self.approach_complete:bool = False
   
-    def setup_stream(self):
+    def setup_stream(self, video_error_callback = None):
+        """
+        Args:
+            video_error_callback: only used with params.PYAV_DECODER; called with a reason string on every corrupt packet (e.g. to hover)
+        """
         start_time = time.time()
         self.drone.streamon()
-        self.frame_reader = self.drone.get_frame_read()
-        self.start_video_stream(imshow=self.imshow)  # IMPT: DO NOT call cv2.imshow in code - Comment out to deactivate, otherwise will cause lag!
-        logging.info(f"Initializing frame reader... imshow = {self.imshow}")
+        params = self.params
+        if params.PYAV_DECODER and not self.laptop_only:
+            if params.RECORD_FLIGHT:
+                from UWB_Wrapper.UWB_ReadUDP import UWBListener
+                self.recorder = FlightRecorder.for_drone(params.RECORD_DIR, self.drone_id,
+                                                         uwb_listener=UWBListener().start(), uwb_tag_id=params.UWBTAG_ID)
+                self.recorder.update_state(nav_state=self.nav_state)
+            # Decoder thread publishes frames itself, so no _stream_video polling thread is needed
+            self.frame_reader = self.drone.get_frame_read_pyav(decoder_threads=params.DECODER_THREADS,
+                                                               latency_budget_s=params.DECODE_LATENCY_BUDGET_S,
+                                                               frame_callback=self._publish_frame,
+                                                               packet_callback=self.recorder.write_packet if self.recorder else None,
+                                                               error_callback=video_error_callback)
+            logging.info(f"Initializing PyAV decoder... imshow = {self.imshow}")
+        else:
+            self.frame_reader = self.drone.get_frame_read()
+            self.start_video_stream(imshow=self.imshow)  # IMPT: DO NOT call cv2.imshow in code - Comment out to deactivate, otherwise will cause lag!
+            logging.info(f"Initializing frame reader... imshow = {self.imshow}")
         time_taken = time.time() - start_time
         logging.info(f"setup_stream completed in {time_taken:.2f}s")
         time.sleep(2)
@@ -134,6 +209,9 @@ class DroneController:
     def stop_video_stream(self):
         """Stop the video streaming thread. Called in class function shutdown()"""
         self.stop_event.set()
+        with self.frame_cond:
+            self.frame_cond.notify_all()    # releases any wait_for_frame() callers
+            self.display_cond.notify_all()
         try:
             if self.stream_thread and self.stream_thread.is_alive():
                 self.stream_thread.join(timeout=2)
@@ -144,6 +222,34 @@ class DroneController:
         """Thread-safe method to get the latest frame. External method."""
         with self.frame_lock:
             return self.current_frame.copy() if self.current_frame is not None else None
+
+    @profiled("frame.wait")
+    def wait_for_frame(self, after_seq:int = 0, timeout:float = 1.0):
+        """
+        Blocks until a frame newer than after_seq has been published. External method.
+
+        e.g.
+        seq = 0
+        while True:
+            frame, seq, frame_time = controller.wait_for_frame(seq)
+            if frame is None:
+                continue    # timed out, or stream stopped
+            ...
+
+        Args:
+            after_seq: sequence number of the last frame the caller has processed (0 for any frame)
+            timeout: max time to wait in seconds
+        Returns:
+            (frame copy, seq, capture timestamp), or (None, after_seq, None) on timeout / stream stopped
+        """
+        with self.frame_cond:
+            self.frame_request_seq = after_seq
+            self.frame_cond.notify_all()    # lets a lockstep publisher (e.g. UnknownArea_v2.replay) know we are ready
+            new_frame = self.frame_cond.wait_for(
+                lambda: self.frame_seq > after_seq or self.stop_event.is_set(), timeout)
+            if not new_frame or self.frame_seq <= after_seq or self.current_frame is None:
+                return None, after_seq, None
+            return self.current_frame.copy(), self.frame_seq, self.frame_timestamp
         
     def get_display_frame(self):
         """Thread-safe method to get the display frame. Internal method."""
@@ -154,22 +260,63 @@ class DroneController:
         """Thread-safe method to set the display frame. External method."""
         with self.frame_lock:
             self.display_frame = frame.copy() if frame is not None else None
+            self.display_seq += 1
+            self.display_cond.notify_all()
+
+    def wait_for_display_frame(self, after_seq:int = 0, timeout:float = 0.03):
+        """
+        Blocks until a display frame newer than after_seq is set. External method.
+        Unlike get_display_frame, the frame is NOT copied: treat it as read-only (e.g. cv2.imshow, cv2.imencode).
+        Returns:
+            (display frame, display_seq), or (None, after_seq) on timeout
+        """
+        with self.display_cond:
+            self.display_cond.wait_for(lambda: self.display_seq > after_seq or self.stop_event.is_set(), timeout)
+            if self.display_seq <= after_seq or self.display_frame is None:
+                return None, after_seq
+            return self.display_frame, self.display_seq
+
+    def _publish_frame(self, frame, timestamp:float = None):
+        """
+        Stores a NEW frame, bumps frame_seq and wakes up wait_for_frame() callers. Internal method.
+        The frame is stored without copying; readers always hand over a fresh array per decoded frame.
+        """
+        with self.frame_cond:
+            self.current_frame = frame
+            self.frame_seq += 1
+            self.frame_timestamp = timestamp if timestamp is not None else time.time()
+            seq, frame_time = self.frame_seq, self.frame_timestamp
+            self.frame_cond.notify_all()
+        if self.recorder:
+            self.recorder.mark_frame(seq, frame_time)
+
+    def set_nav_state(self, nav_state:str):
+        """Records what the navigation logic is currently doing, e.g. "searching", "centering". External method."""
+        if nav_state != self.nav_state:
+            logging.debug(f"nav_state: {self.nav_state} -> {nav_state}")
+            self.nav_state = nav_state
+            if self.recorder:
+                self.recorder.update_state(nav_state=nav_state)
     
     def _stream_video(self, imshow: bool = True):
         """Video streaming thread function.
         This function now only updates the current frame without calling cv2.imshow.
         Display is handled separately in the main thread.
+
+        The frame reader replaces its .frame with a new array for every decoded frame, so an identity
+        check tells us whether anything new arrived. If not, sleep briefly instead of re-copying the same
+        frame (this loop used to spin at 100% of a core).
         """
+        last_frame = None
         while not self.stop_event.is_set():
             try:
-                # Capture new frame
-                frame = capture_frame(self.frame_reader)
-                if frame is None:
+                frame = self.frame_reader.frame
+                if frame is None or frame is last_frame:
+                    time.sleep(self.frame_poll_s)
                     continue
-                        
-                # Store frame thread-safely
-                with self.frame_lock:
-                    self.current_frame = frame.copy()
+
+                last_frame = frame
+                self._publish_frame(frame)
                     
             except Exception as e:
                 logging.error(f"Error in video stream: {e}")
@@ -181,18 +328,31 @@ class DroneController:
         """Handle keyboard commands - can be overridden by subclasses"""
         pass
 
+    def run_perception(self, fn, *args):
+        """
+        Runs fn(*args) in the shared perception pool if one is set (several drones in one process), otherwise inline.
+        Blocks until done either way. External method.
+        """
+        if self.perception_pool is None:
+            return fn(*args)
+        return self.perception_pool.submit(fn, *args).result()
+
     def generate_color_depth_map(self, frame):
         """Process frame through MiDaS to get depth map"""
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        input_batch = self.transform(frame_rgb).to(self.device)
+        if self.depth_client:
+            with span("depth.service"):
+                return self.depth_client.generate_color_depth_map(frame)
+        with span("depth.transform"):
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            input_batch = self.transform(frame_rgb).to(self.device)
         
-        with torch.no_grad():
+        with span("depth.inference"), torch.no_grad():
             prediction = self.midas(input_batch)
             
-        depth_map = prediction.squeeze().cpu().numpy()
-        depth_map = cv2.normalize(depth_map, None, 0, 1, norm_type=cv2.NORM_MINMAX)
-        return cv2.applyColorMap((depth_map * 255).astype(np.uint8), cv2.COLORMAP_JET)
+        with span("depth.colormap"):
+            return depth_to_colormap(prediction.squeeze().cpu().numpy())
         
+    @profiled("depth.grid_analysis")
     def process_depth_color_map(self, depth_colormap):
         """
         :param depth_colormap: the actual frame of the depth color map
@@ -283,32 +443,61 @@ class DroneController:
         with self.distance_lock:
             self.distance = distance
 
+    STATE_GETTERS = {"bat": "get_battery", "h": "get_height", "yaw": "get_yaw", "tof": "get_distance_tof"}
+
+    def get_telemetry(self, field:str, max_age:float = None, default = None):
+        """
+        Tello state field (e.g. "bat", "h", "yaw", "tof") from the state stream cache, never a round trip.
+        default if the field is older than max_age (s) or was never received. Without the cache (params.TELEMETRY_CACHE
+        off, MockTello, replay): the drone's getters, so the last value however old.
+        """
+        if isinstance(self.drone, CustomTello) and self.drone.telemetry is not None:
+            return self.drone.telemetry.get(field, max_age=max_age, default=default)
+        getter = getattr(self.drone, self.STATE_GETTERS.get(field, ""), None)
+        try:
+            return getter() if getter else default
+        except TelloException:  # no state packet yet
+            return default
+
+    @property
+    def forward_tof_dist(self) -> int:
+        """Latest forward ToF reading (0 before the first one). Never blocks, unlike the old forward_tof_lock read."""
+        sample = self.tof_buffer.latest()
+        return sample.distance if sample else 0
+
+    @forward_tof_dist.setter
+    def forward_tof_dist(self, distance: int):
+        self.tof_buffer.publish(distance)
+
     def get_tof_distance(self):
-        with self.forward_tof_lock:
-            return self.forward_tof_dist
+        return self.forward_tof_dist
         
-    def get_tof_distances_list(self, list_length:int, interval_s:int = 0.6) -> List:
+    def get_tof_distances_list(self, list_length:int, interval_s:float = 0.6, since:float = None, timeout_s:float = None) -> List:
         """
         Returns a list of ToF readings; Useful for taking average
         Does not count 8888 readings
+        Reads the ToF sample buffer instead of sleeping between readings: returns at once when it already holds
+        list_length readings from the window, otherwise waits for new ones.
         Args:
-            list_length: length of list to return
-            interval_s: duration between ToF readings. Should exceed _tof_thread period of 0.5s.
+            list_length: length of list to return (fewer if timeout_s runs out)
+            interval_s: window is the last list_length * interval_s seconds
+            since: window starts here instead, e.g. time.time() right after a move, so only readings at the new position count.
+                Such a query waits for list_length new polls: ~list_length * params.TOF_PERIOD_S (1.5s at 0.5s), as
+                before the buffer. Only queries over readings already buffered return at once (no since, or
+                tof_check_clear(window_s=...)).
+            timeout_s: max wait for readings, default 2 * list_length * interval_s
         """
-        tof_dist_list = []
-        i = 0
-        while i < list_length:
-            with self.forward_tof_lock:
-                current_dist = self.forward_tof_dist
-                if current_dist == 8888:
-                    # Repeat the reading if the distance is 8888
-                    continue
-                tof_dist_list.append(current_dist)
-                i += 1  # Only increment the counter if a valid reading is added
-            time.sleep(interval_s)
+        if since is None:
+            since = time.time() - list_length * interval_s
+        if timeout_s is None:
+            timeout_s = 2 * list_length * interval_s
+        tof_dist_list = self.tof_buffer.wait_for_distances(list_length, since, timeout_s)
+        if len(tof_dist_list) < list_length:
+            logging.warning(f"get_tof_distances_list: only {len(tof_dist_list)}/{list_length} valid ToF readings within {timeout_s:.1f}s")
         return tof_dist_list
     
-    def tof_check_clear(self, tof_dist_list: list, clear_threshold_cm: int = 2000, clear_ratio: float = 0.6) -> bool:
+    def tof_check_clear(self, tof_dist_list: list = None, clear_threshold_cm: int = 2000, clear_ratio: float = 0.6,
+                        window_s: float = None) -> bool:
         """
         Checks a list of ToF distances to determine if the path is clear of obstacles.
 
@@ -316,10 +505,13 @@ class DroneController:
             tof_dist_list: List of ToF readings in cm; Assumes no invalid readings (e.g., 8888).
             clear_threshold_cm: Distance threshold in cm below which an obstacle is considered detected. Maximum ToF sensing ~ 1.2m
             clear_ratio: Minimum ratio of readings above the threshold to consider the path clear.
+            window_s: instead of tof_dist_list, use the valid readings of the last window_s seconds (no waiting)
 
         Returns:
             bool: True if the path is clear (ratio of clear readings >= clear_ratio), False otherwise.
         """
+        if window_s is not None:
+            tof_dist_list = self.tof_buffer.distances(since=time.time() - window_s)
         if not tof_dist_list:
             # Handle empty list case
             return False
@@ -334,14 +526,20 @@ class DroneController:
         return calculated_ratio >= clear_ratio
             
 
-    def _tof_thread(self, period_s:float = 0.5):
-        """Video streaming thread function"""
+    def _tof_thread(self, period_s:float = None):
+        """ToF polling thread function: publishes a timestamped reading to tof_buffer every period_s (params.TOF_PERIOD_S)"""
         logging.info("_tof_thread started.")
+        period_s = period_s or self.params.TOF_PERIOD_S
+        # The command scheduler already queues EXT tof? behind motion commands and matches its reply
+        exchange_lock = nullcontext() if isinstance(self.drone, CustomTello) and self.drone.command_scheduler else self.forward_tof_lock
         while not self.stop_event.is_set():
             time.sleep(period_s)
             try:
-                with self.forward_tof_lock:
-                    self.forward_tof_dist = self.drone.get_ext_tof()
+                with exchange_lock:     # only for the exchange itself; readers never take this lock
+                    tof_dist = self.drone.get_ext_tof()
+                self.tof_buffer.publish(tof_dist)
+                if self.recorder:
+                    self.recorder.update_state(tof=tof_dist)
             except Exception as e:
                 logging.error(f"Error in ToF thread: {e}")
                 time.sleep(0.1)
@@ -350,6 +548,9 @@ class DroneController:
     def start_tof_thread(self):
         """Start the forward ToF reading in a separate thread"""
         self.stop_event.clear()
+        if self.tof_scheduler is not None:
+            self.tof_scheduler(self)    # polled elsewhere, e.g. on the fleet's asyncio loop
+            return
         self.tof_thread = threading.Thread(target=self._tof_thread)
         self.tof_thread.daemon = True
         self.tof_thread.start()
@@ -377,9 +578,59 @@ class DroneController:
             for i in range(4):
                 cv2.waitKey(1)
             self.drone.streamoff()
+            if self.recorder:
+                self.recorder.close()
+            if self.depth_client:
+                self.depth_client.close()
+            self.perception_scheduler.log_report()
+            logging.info(f"Marker tracker: {self.marker_tracker.metrics}")
         else:
             logging.warning("Trying to shutdown, but already shut down previously.")
 
+    def calibration(self, frame) -> Calibration:
+        """Intrinsics of this drone's camera at frame's resolution (memoized, see calibration.py)"""
+        return calibration_registry.get(self.calibration_id, (frame.shape[1], frame.shape[0]),
+                                        fallback=(self.params.CAMERA_MATRIX, self.params.DIST_COEFF))
+
+    def detect_or_track_markers(self, frame, display_frame, marker_size=19.0):
+        """
+        Same returns as detect_markers. While locked on, the locked-on marker is tracked with optical flow
+        (markertracker.py) and detect_markers only runs every TRACK_REDETECT_EVERY frames or when the track is lost.
+
+        Tracked frames only see the locked-on marker: exit state (exit_detected, exit_distance_3D, target_yaw) is
+        cleared as if no exit marker were in view, and the danger latch is left as the last detection set it
+        (tracked frames don't count towards its 20-frame reset, so it holds ~20*TRACK_REDETECT_EVERY frames).
+        """
+        if not self.params.MARKER_TRACKING:
+            return self.detect_markers(frame, display_frame, marker_size)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        tracker = self.marker_tracker
+
+        if self.markernum_lockedon is not None and tracker.marker_id == self.markernum_lockedon and not tracker.detection_due():
+            with span("aruco.track"):
+                corners = tracker.track(gray)
+            if corners is not None:
+                self.target_yaw = None
+                self.exit_detected = False
+                self.exit_distance_3D = None
+                self.invalid_ids = self.marker_client.get_invalid_markers(self.valid_ids)
+                calibration = self.calibration(frame)
+                rvecs, tvecs, _ = aruco.estimatePoseSingleMarkers(corners, marker_size, calibration.camera_matrix, calibration.dist_coeff)
+                x, y, z = tvecs[0][0]
+                self.valid_marker_info.update({"position": (x, y, z), "distance": np.sqrt(x*x + y*y + z*z),
+                                               "corners": corners, "rvecs": rvecs[0], "tvecs": tvecs[0]})
+                self.set_distance(self.valid_marker_info["distance"])
+                return True, corners, tracker.marker_id, rvecs[0], tvecs[0]
+            logging.debug(f"Lost track of marker {self.markernum_lockedon}, detecting again.")
+
+        marker_found, corners, marker_id, rvecs, tvecs = self.detect_markers(frame, display_frame, marker_size)
+        if marker_found:
+            tracker.seed(gray, corners, marker_id)  # only tracked once check_marker_server_and_lockon locks onto it
+        else:
+            tracker.reset()
+        return marker_found, corners, marker_id, rvecs, tvecs
+
+    @profiled("aruco.detect_markers")
     def detect_markers(self, frame, display_frame, marker_size=19.0):
         """
         Detect ArUco markers and estimate pose.
@@ -390,10 +641,9 @@ class DroneController:
         :return:
             marker_detected (bool), marker_corners, marker_id (int), rotation_vec, translation_vec
         """
-        # global CAMERA_MATRIX, DIST_COEFF
-        aruco_dict = aruco.getPredefinedDictionary(cv2.aruco.DICT_5X5_250)
-        parameters = aruco.DetectorParameters()
-        corners, ids, rejected = aruco.detectMarkers(frame, aruco_dict, parameters=parameters)
+        calibration = self.calibration(frame)
+        with span("aruco.detect"):
+            corners, ids = self.aruco_detector.detect(frame)
 
         # Reset class attributes, for re-detection
         self.target_yaw = None
@@ -419,7 +669,7 @@ class DroneController:
 
             for i, marker_id in enumerate(detected_ids):
                 rvecs, tvecs, _ = aruco.estimatePoseSingleMarkers(
-                    corners[i].reshape(1, 4, 2), marker_size, params.CAMERA_MATRIX, params.DIST_COEFF
+                    corners[i].reshape(1, 4, 2), marker_size, calibration.camera_matrix, calibration.dist_coeff
                 )
                 x, y, z = tvecs[0][0]
                 euclidean_distance = np.sqrt(x*x + y*y + z*z)
@@ -516,6 +766,7 @@ class DroneController:
         aruco_dict = aruco.getPredefinedDictionary(cv2.aruco.DICT_5X5_250)
         parameters = aruco.DetectorParameters()
         corners, ids, rejected = aruco.detectMarkers(frame, aruco_dict, parameters=parameters)
+        calibration = self.calibration(frame)
         
         # Initialize return values
         nearest_danger_id = None
@@ -528,7 +779,7 @@ class DroneController:
                 # Only process danger markers
                 if marker_id in self.danger_ids:
                     rvecs, tvecs, _ = aruco.estimatePoseSingleMarkers(
-                        corners[i].reshape(1, 4, 2), marker_size, params.CAMERA_MATRIX, params.DIST_COEFF
+                        corners[i].reshape(1, 4, 2), marker_size, calibration.camera_matrix, calibration.dist_coeff
                     )
                     
                     # Calculate distance
@@ -0,0 +1,138 @@
+"""
+Command and telemetry I/O for several Tellos on ONE asyncio event loop. Used by UnknownArea_v2/fleet.py.
+
+djitellopy starts a single response receiver and a single state receiver per process, bound to the ports of the
+FIRST Tello created. That is enough with one process per drone. With several drones in one process, the other
+drones' state packets (and relayed responses) arrive on ports nobody listens on.
+
+FleetIO listens on those ports with asyncio datagram endpoints and files whatever arrives into djitellopy's own
+per-drone dict, so get_height(), get_battery(), send_command_with_return() etc. keep working for every drone.
+It also polls every drone's forward ToF from the same loop (poll_tof), instead of one _tof_thread per drone.
+
+e.g.
+    io = FleetIO()
+    await io.listen(params13.NETWORK_CONFIG)     # before creating the 2nd, 3rd... CustomTello
+    asyncio.run_coroutine_threadsafe(io.poll_tof(controller), loop)
+"""
+
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import djitellopy.tello as djitellopy_tello
+from djitellopy import Tello
+
+from .tofbuffer import INVALID_TOF
+from .customtello import CustomTello
+
+
+class _TelloDatagramProtocol(asyncio.DatagramProtocol):
+    """Files datagrams into djitellopy's drones dict, like Tello.udp_response_receiver / udp_state_receiver do"""
+    def __init__(self, kind: str):
+        self.kind = kind    # "control" or "state"
+
+    def datagram_received(self, data: bytes, addr):
+        drone = djitellopy_tello.drones.get(addr[0])
+        if drone is None:
+            return
+        if self.kind == "state":
+            try:
+                drone['state'] = Tello.parse_state(data.decode('ASCII'))
+            except Exception as e:
+                logging.debug(f"FleetIO: bad state packet from {addr[0]}: {e}")
+        else:
+            drone['responses'].append(data)
+
+    def error_received(self, exc):
+        logging.debug(f"FleetIO {self.kind} endpoint error: {exc}")
+
+
+class FleetIO:
+    """
+    Args:
+        poll_s: how often a pending read_command() checks for its response
+    """
+    def __init__(self, poll_s: float = 0.02):
+        self.poll_s = poll_s
+        self.transports: List[asyncio.DatagramTransport] = []
+        self.metrics: Dict[str, int] = {
+            "tof_reads": 0,
+            "tof_timeouts": 0,
+            "tof_skipped_busy": 0,      # poll skipped because a motion command held forward_tof_lock (no command scheduler)
+        }
+
+    async def listen(self, network_config: dict):
+        """
+        Listens on the control and state ports of one drone. Ports that are already bound
+        (i.e. by djitellopy's receivers for the first drone) are left alone.
+        """
+        loop = asyncio.get_running_loop()
+        for kind in ("control", "state"):
+            port = network_config[f'{kind}_port']
+            try:
+                transport, _ = await loop.create_datagram_endpoint(
+                    lambda kind=kind: _TelloDatagramProtocol(kind), local_addr=('0.0.0.0', port))
+            except OSError:
+                logging.debug(f"FleetIO: {kind} port {port} already bound (djitellopy receiver), not listening")
+                continue
+            self.transports.append(transport)
+            logging.info(f"FleetIO listening for {network_config['host']} {kind} on port {port}")
+
+    async def read_command(self, drone: Tello, command: str, timeout: float = 1.0) -> Optional[str]:
+        """
+        Non-blocking send_read_command: sends through djitellopy's control socket and awaits the response on the loop.
+        Returns the response, or None on timeout.
+        """
+        responses = drone.get_own_udp_object()['responses']
+        djitellopy_tello.client_socket.sendto(command.encode('utf-8'), drone.address)
+        deadline = time.time() + timeout
+        while not responses:
+            if time.time() > deadline:
+                return None
+            await asyncio.sleep(self.poll_s)
+        drone.last_received_command_timestamp = time.time()
+        return responses.pop(0).decode('utf-8', errors='ignore').rstrip("\r\n")
+
+    def _parse_tof(self, response: Optional[str]) -> int:
+        try:
+            return int(response.split()[1])
+        except (AttributeError, ValueError, IndexError):
+            self.metrics["tof_timeouts"] += 1
+            return INVALID_TOF     # same as CustomTello.get_ext_tof on a bad response
+
+    async def poll_tof(self, controller, period_s: float = None):
+        """Same as DroneController._tof_thread, as a coroutine: publishes to controller.tof_buffer every period_s"""
+        logging.info(f"FleetIO polling ToF of drone {controller.drone_id}")
+        period_s = period_s or controller.params.TOF_PERIOD_S
+        while not controller.stop_event.is_set():
+            await asyncio.sleep(period_s)
+            scheduler = controller.drone.command_scheduler if isinstance(controller.drone, CustomTello) else None
+            # Never block the loop: without a command scheduler, if the navigation logic is moving the drone, try again next period
+            if scheduler is None and not controller.forward_tof_lock.acquire(blocking=False):
+                self.metrics["tof_skipped_busy"] += 1
+                continue
+            try:
+                if scheduler is not None:   # queued behind motion commands, awaited without blocking the loop
+                    response = await asyncio.wrap_future(scheduler.submit("EXT tof?", timeout=1.0))
+                    tof_dist = self._parse_tof(response)
+                elif isinstance(controller.drone, Tello):
+                    response = await self.read_command(controller.drone, "EXT tof?")
+                    tof_dist = self._parse_tof(response)
+                else:
+                    tof_dist = controller.drone.get_ext_tof()   # MockTello: no UDP
+                controller.tof_buffer.publish(tof_dist)
+                self.metrics["tof_reads"] += 1
+            except Exception as e:
+                logging.error(f"FleetIO ToF error for drone {controller.drone_id}: {e}")
+            finally:
+                if scheduler is None:
+                    controller.forward_tof_lock.release()
+            if controller.recorder:
+                controller.recorder.update_state(tof=controller.forward_tof_dist)
+        logging.info(f"FleetIO stopped polling ToF of drone {controller.drone_id}")
+
+    def close(self):
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
@@ -0,0 +1,219 @@
+"""
+Flight video recorder: tees the raw H.264 datagrams from the Tello video port straight to disk (no decode / re-encode),
+plus a compact binary sidecar with one record per decoded frame (timestamp, ToF, UWB position, navigation state).
+
+All file I/O happens on one writer thread. The video/frame threads only append to a queue, so recording costs
+them a few microseconds per datagram/frame.
+
+Needs the raw datagrams, so it only works together with the PyAV decoder (params.PYAV_DECODER), through
+H264DecoderThread's packet_callback. See DroneController.setup_stream.
+
+Files written for prefix "recordings/flight_12_20250317_101500":
+    .h264   raw Annex-B stream, playable with ffplay / VLC, or cv2.VideoCapture
+    .idx    sidecar, fixed-size SIDECAR_RECORD structs (seekable by timestamp, see FlightRecording)
+    .json   header: record format, drone id, start time, navigation state names
+"""
+
+import os
+import json
+import time
+import queue
+import struct
+import bisect
+import logging
+import threading
+from typing import List, NamedTuple, Optional
+
+# timestamp, video byte offset at this frame, byte offset of the latest keyframe (SPS) before it,
+# frame seq, forward ToF (mm), UWB x/y/z, navigation state index (into header "nav_states")
+SIDECAR_RECORD = struct.Struct('<dQQIifffB')
+SIDECAR_VERSION = 1
+
+_STOP = object()    # writer thread sentinel
+
+
+class FrameRecord(NamedTuple):
+    timestamp: float
+    video_offset: int
+    keyframe_offset: int
+    seq: int
+    tof: int
+    uwb_x: float
+    uwb_y: float
+    uwb_z: float
+    nav_state: int
+
+
+def find_sps(data: bytes) -> int:
+    """Returns the index of the first SPS NAL unit start code (keyframes start with SPS/PPS on the Tello), or -1.
+    A start code split across two datagrams is missed; the next keyframe (~1s later) is found instead."""
+    i = data.find(b'\x00\x00\x01')
+    while i != -1 and i + 3 < len(data):
+        if data[i+3] & 0x1F == 7:
+            return i - 1 if i > 0 and data[i-1] == 0 else i
+        i = data.find(b'\x00\x00\x01', i + 3)
+    return -1
+
+
+class FlightRecorder:
+    """
+    Args:
+        prefix: path prefix for the .h264 / .idx / .json files (directory is created if needed)
+        drone_id: stored in the header
+        uwb_listener: optional UWB_Wrapper.UWB_ReadUDP.UWBListener, read for uwb_tag_id on every frame
+        uwb_tag_id: UWB tag of this drone
+    """
+    def __init__(self, prefix: str, drone_id: int = 0, uwb_listener=None, uwb_tag_id: Optional[int] = None):
+        self.prefix = prefix
+        self.drone_id = drone_id
+        self.uwb_listener = uwb_listener
+        self.uwb_tag_id = uwb_tag_id
+        self.start_time = time.time()
+
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.video_file = open(prefix + ".h264", "wb")
+        self.sidecar_file = open(prefix + ".idx", "wb")
+
+        self.queue = queue.SimpleQueue()
+        self.state = (8888, "")     # (tof, nav_state); replaced as a whole, so reads need no lock
+        self.nav_states: List[str] = [""]
+        self.video_offset = 0
+        self.keyframe_offset = 0
+        self.records_written = 0
+        self.closed = False
+
+        self._write_header()
+        self.thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self.thread.start()
+        logging.info(f"FlightRecorder recording to {prefix}.h264")
+
+    @classmethod
+    def for_drone(cls, directory: str, drone_id: int, **kwargs) -> "FlightRecorder":
+        """Creates a recorder with a timestamped prefix, e.g. recordings/flight_12_20250317_101500"""
+        prefix = os.path.join(directory, f"flight_{drone_id}_{time.strftime('%Y%m%d_%H%M%S')}")
+        return cls(prefix, drone_id=drone_id, **kwargs)
+
+    ### Called from other threads - enqueue only
+
+    def write_packet(self, data: bytes, arrival_time: float):
+        """packet_callback for H264DecoderThread: raw datagram as received"""
+        if not self.closed:
+            self.queue.put((data, arrival_time))
+
+    def mark_frame(self, seq: int, timestamp: float):
+        """Adds a sidecar record for a decoded frame, using the latest state from update_state()"""
+        if self.closed:
+            return
+        uwb = (float("nan"),) * 3
+        if self.uwb_listener is not None:
+            pos, _ = self.uwb_listener.get_position(self.uwb_tag_id)
+            if pos is not None:
+                uwb = pos
+        self.queue.put((seq, timestamp, self.state, uwb))
+
+    def update_state(self, tof: Optional[int] = None, nav_state: Optional[str] = None):
+        """Updates the metadata stored with subsequent frames"""
+        tof_prev, nav_prev = self.state
+        self.state = (tof_prev if tof is None else int(tof), nav_prev if nav_state is None else nav_state)
+
+    def close(self):
+        """Flushes everything queued so far and closes the files"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join(timeout=5)
+        logging.info(f"FlightRecorder closed {self.prefix}: {self.video_offset/1e6:.1f}MB video, {self.records_written} frames")
+
+    ### Writer thread
+
+    def _writer_loop(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    break
+                if len(item) == 2:
+                    self._write_video(*item)
+                else:
+                    self._write_record(*item)
+        except Exception as e:
+            logging.error(f"FlightRecorder writer error: {e}")
+        finally:
+            self.video_file.close()
+            self.sidecar_file.close()
+            self._write_header()
+
+    def _write_video(self, data: bytes, arrival_time: float):
+        sps_index = find_sps(data)
+        if sps_index != -1:
+            self.keyframe_offset = self.video_offset + sps_index
+        self.video_file.write(data)
+        self.video_offset += len(data)
+
+    def _write_record(self, seq: int, timestamp: float, state: tuple, uwb: tuple):
+        tof, nav_state = state
+        if nav_state not in self.nav_states:
+            self.nav_states.append(nav_state)
+            self._write_header()
+        self.sidecar_file.write(SIDECAR_RECORD.pack(timestamp, self.video_offset, self.keyframe_offset, seq,
+                                                    tof, *uwb, self.nav_states.index(nav_state)))
+        self.records_written += 1
+
+    def _write_header(self):
+        header = {
+            "version": SIDECAR_VERSION,
+            "record_format": SIDECAR_RECORD.format,
+            "record_fields": list(FrameRecord._fields),
+            "drone_id": self.drone_id,
+            "start_time": self.start_time,
+            "nav_states": self.nav_states,
+        }
+        with open(self.prefix + ".json", "w") as f:
+            json.dump(header, f, indent=2)
+
+
+class FlightRecording:
+    """
+    Reads a recording written by FlightRecorder.
+
+    e.g.
+        rec = FlightRecording("recordings/flight_12_20250317_101500")
+        record = rec.record_at(rec.start_time + 42.0)        # sidecar record closest before t
+        stream = rec.read_video_from(rec.start_time + 42.0)  # decodable bytes, starting at the keyframe before t
+    """
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        with open(prefix + ".json") as f:
+            self.header = json.load(f)
+        record = struct.Struct(self.header["record_format"])
+        with open(prefix + ".idx", "rb") as f:
+            data = f.read()
+        data = data[:len(data) - len(data) % record.size]   # ignore a partially written last record
+        self.records: List[FrameRecord] = [FrameRecord(*r) for r in record.iter_unpack(data)]
+        self.timestamps: List[float] = [r.timestamp for r in self.records]
+        self.nav_states: List[str] = self.header["nav_states"]
+        self.start_time: float = self.timestamps[0] if self.timestamps else self.header["start_time"]
+        self.end_time: float = self.timestamps[-1] if self.timestamps else self.start_time
+
+    def __len__(self):
+        return len(self.records)
+
+    def index_at(self, timestamp: float) -> int:
+        """Index of the last record at or before timestamp (0 if timestamp is before the first frame)"""
+        return max(bisect.bisect_right(self.timestamps, timestamp) - 1, 0)
+
+    def record_at(self, timestamp: float) -> FrameRecord:
+        return self.records[self.index_at(timestamp)]
+
+    def nav_state_name(self, record: FrameRecord) -> str:
+        return self.nav_states[record.nav_state]
+
+    def read_video_from(self, timestamp: float) -> bytes:
+        """Raw H.264 from the keyframe preceding timestamp to the end of the file"""
+        offset = self.record_at(timestamp).keyframe_offset if self.records else 0
+        with open(self.prefix + ".h264", "rb") as f:
+            f.seek(offset)
+            return f.read()
@@ -0,0 +1,110 @@
+"""
+Tracks the locked-on marker's 4 corners between ArUco detections with pyramidal Lucas-Kanade optical flow, so
+centering / approaching get a fresh marker position on every frame while detect_markers only runs every few frames.
+
+- seed() with the corners of a detection, then track() each new frame. Flow is only computed on a window around
+  the marker (its bounding box plus search_margin), so a track costs a fraction of a detection.
+- A track is only accepted if every corner passes the forward-backward check (flow forward, then back to the
+  previous frame, must land within max_fb_error_px of where it started) and the quad is still a plausible marker
+  (convex, area within max_area_change of the previous frame). Otherwise track() returns None and the tracker
+  is reset, so the caller detects again.
+- detection_due() after redetect_every tracked frames, to re-anchor on a real detection (also refreshes the
+  server / danger / exit bookkeeping done in detect_markers).
+"""
+
+from typing import Optional
+
+import cv2
+import numpy as np
+
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+
+
+class MarkerTracker:
+    """
+    Args:
+        redetect_every: tracked frames before detection_due()
+        max_fb_error_px: largest accepted forward-backward error of any corner
+        max_area_change: largest accepted area ratio (either way) between consecutive frames
+        search_margin: fraction of the marker's size added around its bounding box as the flow window (at least 48px)
+    """
+    def __init__(self, redetect_every: int = 5, max_fb_error_px: float = 1.0, max_area_change: float = 1.5,
+                 search_margin: float = 0.25):
+        self.redetect_every = redetect_every
+        self.search_margin = search_margin
+        self.max_fb_error_px = max_fb_error_px
+        self.max_area_change = max_area_change
+        self.marker_id: Optional[int] = None
+        self.prev_gray: Optional[np.ndarray] = None
+        self.points: Optional[np.ndarray] = None   # (4, 1, 2) float32, corner order as detectMarkers
+        self.tracked_since_detection = 0
+        self.metrics = {"seeded": 0, "tracked": 0, "lost": 0}
+
+    @property
+    def active(self) -> bool:
+        return self.points is not None
+
+    def seed(self, gray: np.ndarray, corners: np.ndarray, marker_id: int):
+        """Starts (or re-anchors) tracking from a detection's corners ((1, 4, 2) as detectMarkers returns)"""
+        self.marker_id = marker_id
+        self.prev_gray = gray
+        self.points = np.asarray(corners, dtype=np.float32).reshape(4, 1, 2)
+        self.tracked_since_detection = 0
+        self.metrics["seeded"] += 1
+
+    def reset(self):
+        self.marker_id = None
+        self.prev_gray = None
+        self.points = None
+
+    def detection_due(self) -> bool:
+        return not self.active or self.tracked_since_detection >= self.redetect_every
+
+    def track(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """Corners ((1, 4, 2)) of the tracked marker in gray, or None if the track failed (tracker is then reset)"""
+        if not self.active or gray.shape != self.prev_gray.shape:
+            self.reset()
+            return None
+        x0, y0, x1, y1 = self._window(gray.shape)
+        prev_window, window = self.prev_gray[y0:y1, x0:x1], gray[y0:y1, x0:x1]
+        offset = np.array([x0, y0], dtype=np.float32)
+        points = self.points - offset
+
+        forward, status, _ = cv2.calcOpticalFlowPyrLK(prev_window, window, points, None, **LK_PARAMS)
+        if forward is None or not status.all():
+            return self._lost()
+        backward, status_back, _ = cv2.calcOpticalFlowPyrLK(window, prev_window, forward, None, **LK_PARAMS)
+        if backward is None or not status_back.all():
+            return self._lost()
+        fb_error = np.linalg.norm((backward - points).reshape(4, 2), axis=1)
+        forward = forward + offset
+        if fb_error.max() > self.max_fb_error_px or not self._plausible(forward):
+            return self._lost()
+
+        self.prev_gray = gray
+        self.points = forward
+        self.tracked_since_detection += 1
+        self.metrics["tracked"] += 1
+        return forward.reshape(1, 4, 2)
+
+    def _window(self, shape) -> tuple:
+        """(x0, y0, x1, y1) around the marker's last corners, clipped to the frame"""
+        quad = self.points.reshape(4, 2)
+        (x_min, y_min), (x_max, y_max) = quad.min(axis=0), quad.max(axis=0)
+        margin = max(48, self.search_margin * max(x_max - x_min, y_max - y_min))
+        h, w = shape[:2]
+        return (int(max(0, x_min - margin)), int(max(0, y_min - margin)),
+                int(min(w, x_max + margin + 1)), int(min(h, y_max + margin + 1)))
+
+    def _plausible(self, points: np.ndarray) -> bool:
+        quad = points.reshape(4, 2)
+        if not cv2.isContourConvex(quad):
+            return False
+        area, prev_area = cv2.contourArea(quad), cv2.contourArea(self.points.reshape(4, 2))
+        return prev_area > 0 and 1 / self.max_area_change <= area / prev_area <= self.max_area_change
+
+    def _lost(self):
+        self.metrics["lost"] += 1
+        self.reset()
+        return None
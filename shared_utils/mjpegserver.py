@@ -0,0 +1,150 @@
+"""
+Headless preview: serves the annotated display frames as MJPEG over HTTP, so operators can watch any drone
+from a browser (http://<ground station ip>:<port>/) without cv2.imshow in the flight process.
+
+- One encoder thread JPEG-encodes the latest display frame, capped at max_fps, and only while someone is watching.
+- Every connected browser gets the same encoded bytes, so extra viewers cost almost nothing.
+
+e.g.
+    server = MJPEGServer(controller.wait_for_display_frame, port=8012, max_fps=10).start()
+    ...
+    server.stop()
+"""
+
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import cv2
+
+BOUNDARY = "frame"
+
+INDEX_HTML = """<html><head><title>{title}</title></head>
+<body style="margin:0;background:#000"><img src="/stream" style="width:100%"></body></html>"""
+
+
+class MJPEGServer:
+    """
+    Args:
+        wait_for_frame: blocking getter with the signature of DroneController.wait_for_display_frame,
+                        i.e. (after_seq, timeout) -> (frame or None, seq)
+        port: HTTP port
+        max_fps: encode rate cap
+        quality: JPEG quality (0-100)
+        title: browser tab title
+    """
+    def __init__(self, wait_for_frame: Callable, port: int = 8080, host: str = '0.0.0.0',
+                 max_fps: float = 10, quality: int = 70, title: str = "Drone View"):
+        self.wait_for_frame = wait_for_frame
+        self.min_interval = 1.0 / max_fps
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+        self.title = title
+
+        self.jpeg: bytes = None
+        self.jpeg_seq: int = 0
+        self.jpeg_cond = threading.Condition()
+        self.viewers = 0
+        self.running = False
+
+        server = self
+        class Handler(_MJPEGHandler):
+            mjpeg = server
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.http_thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.http_thread.start()
+        self.encoder_thread.start()
+        logging.info(f"MJPEGServer serving on http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}/")
+        return self
+
+    def stop(self):
+        self.running = False
+        with self.jpeg_cond:
+            self.jpeg_cond.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.encoder_thread.join(timeout=2)
+        logging.info("MJPEGServer stopped.")
+
+    def _encode_loop(self):
+        """Encoder thread: encode each new display frame, at most max_fps, only while there are viewers"""
+        seq = 0
+        while self.running:
+            if self.viewers == 0:
+                time.sleep(0.2)
+                continue
+            frame, new_seq = self.wait_for_frame(seq, 0.5)
+            if frame is None:
+                continue
+            seq = new_seq
+            start_time = time.time()
+            try:
+                ok, encoded = cv2.imencode('.jpg', frame, self.encode_params)
+            except Exception as e:
+                logging.error(f"MJPEGServer encode error: {e}")
+                continue
+            if ok:
+                with self.jpeg_cond:
+                    self.jpeg = encoded.tobytes()
+                    self.jpeg_seq += 1
+                    self.jpeg_cond.notify_all()
+            # Rate cap: sleep off the rest of the interval (frames arriving meanwhile are skipped, not queued)
+            elapsed = time.time() - start_time
+            if elapsed < self.min_interval:
+                time.sleep(self.min_interval - elapsed)
+
+    def wait_for_jpeg(self, after_seq: int, timeout: float = 1.0):
+        """Returns (jpeg bytes, seq) newer than after_seq, or (None, after_seq) on timeout"""
+        with self.jpeg_cond:
+            self.jpeg_cond.wait_for(lambda: self.jpeg_seq > after_seq or not self.running, timeout)
+            if self.jpeg_seq <= after_seq:
+                return None, after_seq
+            return self.jpeg, self.jpeg_seq
+
+
+class _MJPEGHandler(BaseHTTPRequestHandler):
+    mjpeg: MJPEGServer = None   # set per server in MJPEGServer.__init__
+
+    def do_GET(self):
+        if self.path == "/":
+            body = INDEX_HTML.format(title=self.mjpeg.title).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/stream":
+            self._stream()
+        else:
+            self.send_error(404)
+
+    def _stream(self):
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.end_headers()
+        with self.mjpeg.jpeg_cond:
+            self.mjpeg.viewers += 1
+        seq = 0
+        try:
+            while self.mjpeg.running:
+                jpeg, seq = self.mjpeg.wait_for_jpeg(seq)
+                if jpeg is None:
+                    continue
+                self.wfile.write(f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # browser closed
+        finally:
+            with self.mjpeg.jpeg_cond:
+                self.mjpeg.viewers -= 1
+
+    def log_message(self, format, *args):
+        logging.debug(f"MJPEGServer {self.address_string()} - {format % args}")
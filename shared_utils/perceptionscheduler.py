@@ -0,0 +1,126 @@
+"""
+State-driven perception scheduling for navigation_thread: run expensive stages only as often as the current
+navigation state needs them.
+
+navigation_thread declares its state through controller.set_nav_state(); at the start of every iteration it asks
+    scheduler.begin_frame(controller.nav_state, frame_time)
+    if scheduler.due("depth"): ...run MiDaS...
+and reuses the last result otherwise. Stages a state does not list run on every frame, as do states not in the
+table (e.g. "" before the first iteration), so the default is the old behaviour.
+
+Why MiDaS can slow down once a marker is found: centering / approaching only use the depth map for the pillar
+check on middle_center_split while yawing in place, and marker_found only displays it. Searching and exit
+avoidance steer on it, so they always get a fresh one (navigation_thread refreshes the depth map when it enters
+those branches with a skipped one).
+ArUco (and the danger bookkeeping inside detect_markers) is not scheduled: every branch depends on this frame's
+detection.
+
+report() gives per state: frames, runs / skips per stage and the time saved (skips x mean measured stage time).
+"""
+
+import time
+import logging
+import functools
+from typing import Callable, Dict, Optional
+
+# state -> {stage: target rate in Hz}; None = every frame, 0 = never (last result is reused)
+PERCEPTION_RATES: Dict[str, Dict[str, Optional[float]]] = {
+    "searching":      {"depth": None},  # nav_with_depthmap_tof steers on it
+    "exit_avoidance": {"depth": None},  # nav_with_depthmap_tof when the exit is far
+    "marker_found":   {"depth": 1.0},   # waiting for lock-on approval, display only
+    "centering":      {"depth": 2.0},   # pillar check, yawing in place
+    "approaching":    {"depth": 2.0},   # pillar check
+    "landing":        {"depth": 0},     # blocking moves, no more frames needed
+}
+
+
+class _StageStats:
+    __slots__ = ("runs", "total_s")
+
+    def __init__(self):
+        self.runs = 0
+        self.total_s = 0.0
+
+    @property
+    def mean_s(self) -> float:
+        return self.total_s / self.runs if self.runs else 0.0
+
+
+class PerceptionScheduler:
+    """
+    One per DroneController (navigation_thread is its only user).
+    Args:
+        rates: state -> {stage: Hz}, see PERCEPTION_RATES. {} runs every stage on every frame.
+    """
+    def __init__(self, rates: Dict[str, Dict[str, Optional[float]]] = PERCEPTION_RATES):
+        self.rates = rates
+        self.state = ""
+        self.frame_time = 0.0
+        self.last_run: Dict[str, float] = {}                # stage -> frame_time of its last run
+        self.stage_stats: Dict[str, _StageStats] = {}       # measured cost per stage, over all states
+        self.state_counts: Dict[str, Dict[str, int]] = {}   # state -> {"frames", "<stage>_runs", "<stage>_skips"}
+
+    def begin_frame(self, state: str, frame_time: float):
+        """
+        Declares the navigation state for this iteration's perception.
+        frame_time: the frame's timestamp; rates follow frame time, so a lockstep replay schedules the same frames every run
+        """
+        self.state = state
+        self.frame_time = frame_time
+        counts = self.state_counts.setdefault(state, {"frames": 0})
+        counts["frames"] += 1
+
+    def due(self, stage: str) -> bool:
+        """True if stage should run on this frame. A False counts as a skip in the report."""
+        rate = self.rates.get(self.state, {}).get(stage)
+        if rate is None:
+            run = True
+        elif rate <= 0:
+            run = False
+        else:
+            run = self.frame_time - self.last_run.get(stage, float("-inf")) >= 1 / rate
+        counts = self.state_counts.setdefault(self.state, {"frames": 0})
+        key = f"{stage}_runs" if run else f"{stage}_skips"
+        counts[key] = counts.get(key, 0) + 1
+        if run:
+            self.last_run[stage] = self.frame_time
+        return run
+
+    def force(self, stage: str):
+        """Counts a run that navigation_thread needed despite due() saying no (e.g. state just changed to searching)"""
+        counts = self.state_counts.setdefault(self.state, {"frames": 0})
+        counts[f"{stage}_skips"] = counts.get(f"{stage}_skips", 0) - 1
+        counts[f"{stage}_runs"] = counts.get(f"{stage}_runs", 0) + 1
+        self.last_run[stage] = self.frame_time
+
+    def timed(self, stage: str, fn: Callable) -> Callable:
+        """Wraps fn so each call is measured as stage, in whichever thread runs it (e.g. the perception pool)"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stats = self.stage_stats.setdefault(stage, _StageStats())
+                stats.runs += 1
+                stats.total_s += time.perf_counter() - start
+        return wrapper
+
+    def report(self) -> Dict[str, dict]:
+        """Per state: frames, <stage>_runs / <stage>_skips and saved_s (skips x mean stage time)"""
+        report = {}
+        for state, counts in self.state_counts.items():
+            entry = dict(counts)
+            entry["saved_s"] = round(sum(counts.get(f"{stage}_skips", 0) * stats.mean_s
+                                         for stage, stats in self.stage_stats.items()), 2)
+            report[state or "(start)"] = entry
+        return report
+
+    def log_report(self):
+        report = self.report()
+        if not report:
+            return
+        total = sum(entry["saved_s"] for entry in report.values())
+        lines = [f"  {state}: {entry}" for state, entry in report.items()]
+        means = ", ".join(f"{stage} {stats.mean_s*1000:.0f}ms" for stage, stats in self.stage_stats.items())
+        logging.info(f"Perception scheduler saved {total:.1f}s of perception (mean {means}):\n" + "\n".join(lines))
@@ -0,0 +1,204 @@
+"""
+Span profiler for the navigation pipeline: where does each navigation_thread iteration spend its time?
+
+    from shared_utils.profiler import profiler, span, profiled
+
+    with span("depth.inference"):
+        prediction = self.midas(input_batch)
+
+    @profiled("swarm.send_update")
+    def send_update(...): ...
+
+- Disabled by default; DroneController enables it when params.PROFILE = True. Disabled spans cost one attribute check.
+- Per span name: count, total, max and a fixed-size log-scale histogram (p50 / p95 / p99 within ~12%).
+- The most recent spans are also kept (bounded) for a Chrome trace: open chrome://tracing or https://ui.perfetto.dev
+  and load the .trace.json to see every thread's spans on a timeline.
+- dump() writes <prefix>_summary.json + <prefix>.trace.json and logs the summary table; runs at exit once enabled.
+"""
+
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import functools
+from collections import deque
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+SUB_BUCKETS = 4         # per power of two, i.e. bucket width <= 25% of its value
+NUM_BUCKETS = 42 * SUB_BUCKETS      # up to 2^42 ns (~73 minutes)
+_NULL_SPAN = nullcontext()
+
+
+def _bucket(duration_ns: int) -> int:
+    if duration_ns < SUB_BUCKETS:
+        return max(duration_ns, 0)
+    exponent = duration_ns.bit_length() - 1
+    sub = (duration_ns >> (exponent - 2)) & (SUB_BUCKETS - 1)  # next 2 bits after the leading one
+    return min((exponent - 1) * SUB_BUCKETS + sub, NUM_BUCKETS - 1)
+
+
+def _bucket_upper_ns(index: int) -> int:
+    """Largest duration that falls in bucket index"""
+    if index < SUB_BUCKETS:
+        return index
+    exponent, sub = index // SUB_BUCKETS + 1, index % SUB_BUCKETS
+    return ((SUB_BUCKETS + sub + 1) << (exponent - 2)) - 1
+
+
+class StageStats:
+    """Aggregates of one span name. Fixed memory, no matter how many spans are recorded."""
+    __slots__ = ("count", "total_ns", "max_ns", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.histogram = [0] * NUM_BUCKETS
+
+    def add(self, duration_ns: int):
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.histogram[_bucket(duration_ns)] += 1
+
+    def percentile_ms(self, q: float) -> float:
+        target = q * self.count
+        seen = 0
+        for index, n in enumerate(self.histogram):
+            seen += n
+            if n and seen >= target:
+                lower = _bucket_upper_ns(index - 1) + 1 if index else 0
+                return min((lower + _bucket_upper_ns(index)) / 2, self.max_ns) / 1e6     # bucket midpoint
+        return self.max_ns / 1e6
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ns / 1e6, 1),
+            "mean_ms": round(self.total_ns / self.count / 1e6, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile_ms(0.50), 3),
+            "p95_ms": round(self.percentile_ms(0.95), 3),
+            "p99_ms": round(self.percentile_ms(0.99), 3),
+            "max_ms": round(self.max_ns / 1e6, 3),
+        }
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start_ns")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start_ns, time.perf_counter_ns())
+        return False
+
+
+class Profiler:
+    """
+    Args:
+        max_trace_events: spans kept for the Chrome trace (oldest dropped first); aggregates cover every span
+    """
+    def __init__(self, max_trace_events: int = 200_000):
+        self.enabled = False
+        self.stats: Dict[str, StageStats] = {}
+        self.trace = deque(maxlen=max_trace_events)    # (name, start_ns, duration_ns, thread id)
+        self.thread_names: Dict[int, str] = {}
+        self.lock = threading.Lock()
+        self.origin_ns = time.perf_counter_ns()
+        self.dump_prefix: Optional[str] = None
+
+    def enable(self, dump_prefix: Optional[str] = None):
+        """Starts recording. With dump_prefix, dump(dump_prefix) runs at exit (only the first prefix is used)."""
+        if dump_prefix and self.dump_prefix is None:
+            self.dump_prefix = dump_prefix
+            atexit.register(self.dump)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name: str):
+        """Context manager timing its block as name"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def profiled(self, name: Optional[str] = None) -> Callable:
+        """Decorator timing every call of the function as name (default: its qualified name)"""
+        def decorator(fn):
+            span_name = name or fn.__qualname__
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start_ns = time.perf_counter_ns()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(span_name, start_ns, time.perf_counter_ns())
+            return wrapper
+        return decorator
+
+    def record(self, name: str, start_ns: int, end_ns: int):
+        thread_id = threading.get_ident()
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = StageStats()
+            stats.add(end_ns - start_ns)
+            self.trace.append((name, start_ns, end_ns - start_ns, thread_id))
+            if thread_id not in self.thread_names:
+                self.thread_names[thread_id] = threading.current_thread().name
+
+    def summary(self) -> Dict[str, dict]:
+        """Per span name aggregates, sorted by total time"""
+        with self.lock:
+            items = [(name, stats.summary()) for name, stats in self.stats.items()]
+        return dict(sorted(items, key=lambda item: -item[1]["total_ms"]))
+
+    def chrome_trace(self) -> dict:
+        """Trace Event Format ('X' complete events, microseconds)"""
+        pid = os.getpid()
+        with self.lock:
+            events = [{"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                       "ts": (start_ns - self.origin_ns) / 1000, "dur": duration_ns / 1000}
+                      for name, start_ns, duration_ns, tid in self.trace]
+            events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+                       for tid, thread_name in self.thread_names.items()]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def format_summary(self) -> str:
+        lines = [f"{'span':<34}{'count':>8}{'total ms':>11}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<34}{s['count']:>8}{s['total_ms']:>11.1f}{s['mean_ms']:>9.2f}"
+                         f"{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+    def dump(self, prefix: Optional[str] = None):
+        """Writes <prefix>_summary.json and <prefix>.trace.json, and logs the summary"""
+        prefix = prefix or self.dump_prefix
+        if not prefix or not self.stats:
+            return
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(prefix + "_summary.json", "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(prefix + ".trace.json", "w") as f:
+            json.dump(self.chrome_trace(), f)
+        logging.info(f"Profiler summary (ms), trace in {prefix}.trace.json:\n{self.format_summary()}")
+
+
+profiler = Profiler()   # one per process
+span = profiler.span
+profiled = profiler.profiled
@@ -0,0 +1,240 @@
+"""
+Offline replay building blocks: feed recorded video, ToF and UWB into DroneController instead of CustomTello / MockTello.
+
+- FrameSource:   yields (timestamp, frame). RecordedFrameSource decodes a FlightRecorder recording,
+                 VideoFileFrameSource reads any file cv2.VideoCapture can open (no sensor data).
+- SensorSource:  ToF / UWB / nav state at a given time. RecordedSensorSource reads the FlightRecorder sidecar.
+- ReplayTello:   stands in for the drone. Sensor getters read from the SensorSource, every other command
+                 is logged (with replay time and frame seq) into .commands instead of being sent.
+- ReplayMarkerClient: offline MarkerClient; every marker is available, send_update() calls are logged too.
+
+The harness that runs navigation_thread on top of these lives in UnknownArea_v2/replay.py.
+"""
+
+import time
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+import av
+import cv2
+
+from .flightrecorder import FlightRecording
+
+
+class FrameSource:
+    """
+    Base class. Iterate to get (timestamp, frame) pairs in recorded order.
+    Also mimics BackgroundFrameRead (.frame / .stop()) so it can be handed to DroneController as a frame reader.
+    """
+    def __init__(self):
+        self._frame = None
+        self.stopped = False
+
+    def __iter__(self) -> Iterator[Tuple[float, object]]:
+        for timestamp, frame in self._frames():
+            if self.stopped:
+                break
+            self._frame = frame
+            yield timestamp, frame
+
+    def _frames(self) -> Iterator[Tuple[float, object]]:
+        raise NotImplementedError
+
+    @property
+    def frame(self):
+        return self._frame
+
+    def stop(self):
+        self.stopped = True
+
+
+class RecordedFrameSource(FrameSource):
+    """
+    Decodes a FlightRecorder .h264 file. Frames are aligned with the sidecar by byte offset: for every record,
+    the stream is decoded up to the offset at which the live decoder published that frame, so frames the live
+    decoder dropped are skipped here too. Frames are RGB, like the live decoder.
+    """
+    def __init__(self, recording: FlightRecording):
+        super().__init__()
+        self.recording = recording
+
+    def _frames(self):
+        codec = av.CodecContext.create('h264', 'r')
+        with open(self.recording.prefix + ".h264", "rb") as f:
+            offset = 0
+            image = None
+            for record in self.recording.records:
+                data = f.read(record.video_offset - offset)
+                offset = record.video_offset
+                try:
+                    for packet in codec.parse(data):
+                        for av_frame in codec.decode(packet):
+                            image = av_frame.to_ndarray(format='rgb24')
+                except av.error.FFmpegError as e:
+                    logging.debug(f"RecordedFrameSource decode error at offset {offset}: {e}")
+                if image is not None:
+                    yield record.timestamp, image
+
+
+class VideoFileFrameSource(FrameSource):
+    """Any video file cv2 can read (BGR frames). Timestamps are synthesized from fps."""
+    def __init__(self, filename: str, fps: Optional[float] = None, start_time: float = 0.0):
+        super().__init__()
+        self.filename = filename
+        self.fps = fps
+        self.start_time = start_time
+
+    def _frames(self):
+        capture = cv2.VideoCapture(self.filename)
+        fps = self.fps or capture.get(cv2.CAP_PROP_FPS) or 15
+        n = 0
+        try:
+            while True:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                yield self.start_time + n / fps, frame
+                n += 1
+        finally:
+            capture.release()
+
+
+class SensorSource:
+    """Base class: sensor readings at a given (recorded) time. Defaults mean 'nothing in range'."""
+    def tof_at(self, timestamp: float) -> int:
+        return 8191     # ToF reading when clear of obstacles
+
+    def uwb_at(self, timestamp: float) -> Optional[Tuple[float, float, float]]:
+        return None
+
+    def nav_state_at(self, timestamp: float) -> str:
+        return ""
+
+
+class RecordedSensorSource(SensorSource):
+    """Reads ToF / UWB / nav state from a FlightRecorder sidecar (value of the last record at or before t)"""
+    def __init__(self, recording: FlightRecording):
+        self.recording = recording
+
+    def tof_at(self, timestamp: float) -> int:
+        return self.recording.record_at(timestamp).tof
+
+    def uwb_at(self, timestamp: float):
+        record = self.recording.record_at(timestamp)
+        if record.uwb_x != record.uwb_x:    # NaN: no UWB position when recorded
+            return None
+        return (record.uwb_x, record.uwb_y, record.uwb_z)
+
+    def nav_state_at(self, timestamp: float) -> str:
+        return self.recording.nav_state_name(self.recording.record_at(timestamp))
+
+
+class ReplayTello:
+    """
+    Replaces CustomTello / MockTello during replay. The harness advances time with set_time().
+    Anything that is not a sensor read is treated as a command: logged into .commands and answered with "ok".
+    """
+    def __init__(self, sensor_source: SensorSource, frame_source: FrameSource, height: int = 100):
+        self.sensor_source = sensor_source
+        self.frame_source = frame_source
+        self.height = height
+        self.yaw = 0
+        self.now: float = 0.0
+        self.start_time: Optional[float] = None
+        self.frame_seq: int = 0
+        self.commands: List[dict] = []
+        self.stream_on = False
+        self.is_flying = True
+
+    def set_time(self, timestamp: float, frame_seq: int):
+        if self.start_time is None:
+            self.start_time = timestamp
+        self.now = timestamp
+        self.frame_seq = frame_seq
+
+    def _log_command(self, command: str, *args):
+        self.commands.append({
+            "t": round(self.now - (self.start_time or self.now), 3),
+            "frame_seq": self.frame_seq,
+            "command": command,
+            "args": [a.item() if hasattr(a, "item") else a for a in args],  # numpy scalars -> JSON-able
+        })
+
+    def __getattr__(self, name):
+        # Only reached for attributes not defined here, i.e. drone commands (move_forward, rotate_clockwise, ...)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        def command(*args, **kwargs):
+            self._log_command(name, *args, *kwargs.values())
+            return "ok"
+        return command
+
+    ### Sensors
+    def get_ext_tof(self) -> int:
+        return self.sensor_source.tof_at(self.now)
+
+    def get_distance_tof(self) -> int:
+        return self.height
+
+    def get_height(self) -> int:
+        return self.height
+
+    def get_yaw(self) -> int:
+        return self.yaw
+
+    def get_battery(self) -> int:
+        return 100
+
+    ### Commands that need to return something specific
+    def send_command_with_return(self, command: str, timeout: int = 1) -> str:
+        self._log_command("send_command_with_return", command)
+        return "ok"
+
+    def send_rc_control(self, x, y, z, yaw):
+        self._log_command("send_rc_control", x, y, z, yaw)
+
+    ### Video
+    def connect(self):
+        pass
+
+    def streamon(self):
+        self.stream_on = True
+
+    def streamoff(self):
+        self.stream_on = False
+        self.frame_source.stop()
+
+    def get_frame_read(self):
+        return self.frame_source
+
+    def end(self):
+        self._log_command("end")
+
+
+class ReplayMarkerClient:
+    """Offline stand-in for MarkerClient: no sockets, every marker and waypoint is available, updates are logged."""
+    def __init__(self, drone_id: int, tello: ReplayTello):
+        self.drone_id = drone_id
+        self.tello = tello
+        self.marker_status = {}
+        self.waypoint_status = {}
+        self.takeoff_signal = True
+        self.land_signal = False
+
+    def send_update(self, update_type, marker_id=None, detected=None, landed=None, status_message='', send_repeat=3):
+        self.tello._log_command("send_update", update_type, marker_id, detected, landed, status_message)
+
+    def is_marker_available(self, marker_id) -> bool:
+        return True
+
+    def is_waypoint_available(self, waypoint_id) -> bool:
+        return True
+
+    def get_invalid_markers(self, markers_list: list) -> list:
+        return []
+
+    def client_takeoff_simul(self, drones_list: list, status_message: str = None):
+        pass
+
+    def cleanup(self):
+        pass
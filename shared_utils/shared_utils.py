@@ -2,6 +2,8 @@ import importlib, sys, logging, os, time, cv2
 import numpy as np
 from typing import Optional
 
+from .calibration import calibration_registry
+
 def load_params():
     """
     Loads a params.py file via the command line. Allows multiple drones to run on the same script.
@@ -77,19 +79,11 @@ def get_calibration_parameters(TELLO_NO: str = 'E920EB_480P'):
     Raises:
         FileNotFoundError: If the calibration files for the specified Tello drone are not found.
     """
-    # Construct file paths
-    camera_matrix_path = os.path.join("calib_camera", f"camera_matrix_tello{TELLO_NO}.npy")
-    dist_coeffs_path = os.path.join("calib_camera", f"dist_coeffs_tello{TELLO_NO}.npy")
-
-    # Ensure files exist before loading
-    if not os.path.exists(camera_matrix_path) or not os.path.exists(dist_coeffs_path):
+    # Loaded once per process (calibration.py), then memoized
+    calibration = calibration_registry.load_files(TELLO_NO)
+    if calibration is None:
         raise FileNotFoundError(f"Calibration files for Tello {TELLO_NO} not found.")
-
-    # Load calibration parameters
-    camera_matrix = np.load(camera_matrix_path)
-    dist_coeffs = np.load(dist_coeffs_path)
-    print(f"Calibration parameters obtained for {TELLO_NO} from shared_utils")
-    return camera_matrix, dist_coeffs
+    return calibration
 
 def normalize_angle(angle: float) -> float:
     """
@@ -120,8 +114,8 @@ def capture_frame(frame_reader, max_retries:int = 3):
 
     return frame
 
-def draw_pose_axes(frame, corners, ids, rvecs, tvecs):
-    """Draw pose estimation axes and information on frame"""
+def draw_pose_axes(frame, corners, ids, rvecs, tvecs, calibration = None):
+    """Draw pose estimation axes and information on frame. calibration: DroneController.calibration(frame), default params'"""
     logging.debug(f"ID {ids} found. Drawing axes.")
     marker_center = np.mean(corners[0], axis=0)
     cv2.circle(frame, 
@@ -135,8 +129,9 @@ def draw_pose_axes(frame, corners, ids, rvecs, tvecs):
                 (int(marker_center[0]), int(marker_center[1] - 20)),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
        
+    camera_matrix, dist_coeff = (calibration.camera_matrix, calibration.dist_coeff) if calibration else (params.CAMERA_MATRIX, params.DIST_COEFF)
     cv2.drawFrameAxes(
-        frame, params.CAMERA_MATRIX, params.DIST_COEFF, rvecs, tvecs, 10
+        frame, camera_matrix, dist_coeff, rvecs, tvecs, 10
     )
     
     x, y, z = tvecs[0]
@@ -165,9 +160,4 @@ def log_refresh_rate(start_time:float, loop_name:str):
 
 # Ensures variables are accessible by all scripts
 params = load_params()
-
-try:
-    CAMERA_MATRIX, DIST_COEFF = get_calibration_parameters()
-
-except:
-    logging.error("Camera Matrix and Dist Coeff not obtained from file.")
\ No newline at end of file
+# Calibration files are no longer loaded at import time: use DroneController.calibration(frame) (calibration.py)
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Timestamped Tello telemetry from the state UDP stream (STATE_UDP_PORT, ~10 packets/s), used by CustomTello.
+
+djitellopy's getters (get_battery, get_height, get_yaw, get_distance_tof...) already read the last state packet
+rather than asking the drone, but nothing says how old that packet is: if the stream stops, they keep returning the
+last values forever. The cache is fed by every state packet (djitellopy's udp_state_receiver, or FleetIO's state
+endpoint, through StateStreamDict) and timestamps them:
+
+    telemetry.get("bat")                    # last value, no matter how old
+    telemetry.get("h", max_age=0.5)         # raises StaleTelemetryError if older than 0.5s
+    telemetry.get("h", max_age=0.5, default=None)
+    telemetry.stalled()                     # no packet for stall_after_s
+    telemetry.history("tof", since=time.time() - 2)
+
+Reads never block and never cost a round trip: a packet is published by swapping in new per field tuples, like
+tofbuffer.ToFBuffer. Gaps in the stream longer than stall_after_s are counted and logged when packets resume.
+"""
+
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from djitellopy.tello import TelloException
+
+_RAISE = object()
+
+
+class StaleTelemetryError(TelloException):
+    """The state field is missing, or older than the max_age asked for"""
+
+
+class TelemetryCache:
+    """
+    Args:
+        history: packets kept per field (at ~10 packets/s, 50 is ~5s)
+        stall_after_s: no packet for this long = stalled
+        name: for the logs
+    """
+    def __init__(self, history: int = 50, stall_after_s: float = 0.5, name: str = "tello"):
+        self.history_length = history
+        self.stall_after_s = stall_after_s
+        self.name = name
+        self.last_packet_time: Optional[float] = None
+        self._history: Dict[str, Tuple[Tuple[float, Any], ...]] = {}    # field -> ((timestamp, value), ...), oldest first
+        self.metrics = {"packets": 0, "stalls": 0, "longest_gap_s": 0.0}
+
+    def update(self, state: dict, timestamp: Optional[float] = None):
+        """One parsed state packet (Tello.parse_state). Single writer only."""
+        if not state:   # 'ok' packets parse to {}
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.last_packet_time is not None:
+            gap = timestamp - self.last_packet_time
+            self.metrics["longest_gap_s"] = max(self.metrics["longest_gap_s"], round(gap, 3))
+            if gap > self.stall_after_s:
+                self.metrics["stalls"] += 1
+                logging.warning(f"Telemetry {self.name}: state stream resumed after {gap:.1f}s without packets")
+        for field, value in state.items():
+            self._history[field] = (self._history.get(field, ()) + ((timestamp, value),))[-self.history_length:]
+        self.last_packet_time = timestamp
+        self.metrics["packets"] += 1
+
+    def get(self, field: str, max_age: Optional[float] = None, default: Any = _RAISE) -> Any:
+        """
+        Last value of field, if at most max_age (s) old (None: any age). Otherwise default, or StaleTelemetryError
+        if no default is given.
+        """
+        samples = self._history.get(field)
+        if samples:
+            timestamp, value = samples[-1]
+            if max_age is None or time.time() - timestamp <= max_age:
+                return value
+            reason = f"{time.time() - timestamp:.2f}s old (max {max_age}s)"
+        else:
+            reason = "never received"
+        if default is not _RAISE:
+            return default
+        raise StaleTelemetryError(f"Telemetry {self.name}: state field '{field}' {reason}")
+
+    def age(self, field: Optional[str] = None) -> float:
+        """Seconds since the last packet (or since field was last received); inf if never"""
+        if field is None:
+            timestamp = self.last_packet_time
+        else:
+            samples = self._history.get(field)
+            timestamp = samples[-1][0] if samples else None
+        return float("inf") if timestamp is None else time.time() - timestamp
+
+    def stalled(self) -> bool:
+        return self.age() > self.stall_after_s
+
+    def history(self, field: str, since: float = 0.0) -> List[Tuple[float, Any]]:
+        """(timestamp, value) of field received at or after since, oldest first"""
+        return [sample for sample in self._history.get(field, ()) if sample[0] >= since]
+
+    def rate_hz(self) -> float:
+        """Packets per second over the kept history"""
+        samples = next(iter(self._history.values()), ())
+        if len(samples) < 2 or samples[-1][0] <= samples[0][0]:
+            return 0.0
+        return (len(samples) - 1) / (samples[-1][0] - samples[0][0])
+
+    def summary(self) -> dict:
+        return {**self.metrics, "rate_hz": round(self.rate_hz(), 1), "age_s": round(self.age(), 3),
+                "stalled": self.stalled()}
+
+
+class StateStreamDict(dict):
+    """
+    Replaces a drone's entry in djitellopy's drones dict ({'responses': [...], 'state': {...}}), so every state
+    packet filed there (by djitellopy or FleetIO) also goes to the telemetry cache
+    """
+    def __init__(self, telemetry: TelemetryCache, entry: dict):
+        super().__init__(entry)     # same responses list object, so pending replies are kept
+        self.telemetry = telemetry
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key == 'state':
+            try:    # never let the cache break djitellopy's receiver thread (it exits on any exception)
+                self.telemetry.update(value)
+            except Exception as e:
+                logging.error(f"Telemetry {self.telemetry.name}: could not cache state packet: {e}")
@@ -0,0 +1,63 @@
+"""
+Timestamped forward ToF samples, written by one poller (DroneController._tof_thread or FleetIO.poll_tof) and read by
+the navigation logic without any lock.
+
+publish() replaces `samples` with a new tuple (one reference assignment), so every read sees a complete, consistent
+snapshot and never waits for the poller, which may be blocked up to a command timeout on the drone's reply.
+Readers query by time instead of sleeping between reads:
+
+    tof.latest_distance()                       # last reading, 8888 if invalid / none yet
+    tof.distances(since=time.time() - 1.5)      # valid readings of the last 1.5s
+    tof.wait_for_distances(3, since=move_end)   # 3 valid readings taken after a move, waits only if needed
+"""
+
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+INVALID_TOF = 8888      # CustomTello.get_ext_tof on a bad / missing response (also the sensor's out of range value)
+
+
+class ToFSample(NamedTuple):
+    timestamp: float    # time.time() the reading was received
+    distance: int       # mm as reported by EXT tof?, INVALID_TOF if invalid
+
+
+class ToFBuffer:
+    """
+    Args:
+        capacity: samples kept (at 0.5s polling, 64 is ~30s of history)
+    """
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.samples: Tuple[ToFSample, ...] = ()
+        self.poll_s = 0.02      # how often wait_for_distances looks for new samples
+
+    def publish(self, distance: int, timestamp: Optional[float] = None):
+        """Single writer only"""
+        sample = ToFSample(time.time() if timestamp is None else timestamp, int(distance))
+        self.samples = (self.samples + (sample,))[-self.capacity:]
+
+    def latest(self) -> Optional[ToFSample]:
+        samples = self.samples
+        return samples[-1] if samples else None
+
+    def latest_distance(self) -> int:
+        sample = self.latest()
+        return sample.distance if sample else INVALID_TOF
+
+    def distances(self, since: float, valid_only: bool = True) -> List[int]:
+        """Readings received at or after since, oldest first"""
+        return [s.distance for s in self.samples
+                if s.timestamp >= since and not (valid_only and s.distance == INVALID_TOF)]
+
+    def wait_for_distances(self, count: int, since: float, timeout_s: float) -> List[int]:
+        """
+        The newest count valid readings received at or after since. Returns at once if there are enough already,
+        otherwise waits for new samples up to timeout_s and returns what there is (possibly fewer than count).
+        """
+        deadline = time.time() + timeout_s
+        while True:
+            readings = self.distances(since)
+            if len(readings) >= count or time.time() >= deadline:
+                return readings[-count:]
+            time.sleep(self.poll_s)
@@ -0,0 +1,233 @@
+"""
+Low-latency H.264 decoder for the Tello video stream, using PyAV directly instead of djitellopy's BackgroundFrameRead.
+
+- Owns the UDP video socket (vs_udp_port). A receiver thread timestamps every datagram on arrival,
+  a decoder thread parses and decodes them with a configurable number of libav threads.
+- If decoding falls behind (datagram older than latency_budget_s), late frames are dropped and the decoder
+  skips ahead to the next keyframe instead of letting latency grow.
+- Decode errors are counted and reported through error_callback, instead of being string-matched from libav logs.
+
+Drop-in for BackgroundFrameRead: exposes .frame and .stop(). Frames are RGB, same as djitellopy.
+
+To test without a drone, see 0Diagnostics/replay_h264_udp.py (feeds a recorded .h264 file over loopback UDP).
+"""
+
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import av
+
+
+class H264DecoderThread:
+    """
+    Receives raw H.264 from the Tello video port and decodes it in the background.
+
+    Args:
+        video_port: UDP port the Tello streams to (CustomTello.vs_udp_port)
+        host: interface to bind to
+        decoder_threads: thread_count passed to the libav decoder
+        latency_budget_s: max age (arrival -> decode) before frames are dropped and we skip to the next keyframe
+        frame_callback: called as frame_callback(frame, capture_time) for every frame kept; e.g. DroneController._publish_frame
+        packet_callback: called as packet_callback(data, arrival_time) for every raw datagram (e.g. for recording)
+        error_callback: called as error_callback(reason) on every corrupt/undecodable packet (e.g. to hover)
+        max_queued_datagrams: receive backlog kept before the oldest datagrams are discarded
+    """
+    RECV_BUFSIZE = 2048     # Tello sends H.264 in <=1460 byte datagrams
+
+    def __init__(self, video_port: int, host: str = '0.0.0.0', decoder_threads: int = 2,
+                 latency_budget_s: float = 0.25,
+                 frame_callback: Optional[Callable] = None,
+                 packet_callback: Optional[Callable] = None,
+                 error_callback: Optional[Callable] = None,
+                 max_queued_datagrams: int = 2000):
+        self.address = (host, video_port)
+        self.decoder_threads = decoder_threads
+        self.latency_budget_s = latency_budget_s
+        self.frame_callback = frame_callback
+        self.packet_callback = packet_callback
+        self.error_callback = error_callback
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind(self.address)
+        self.sock.settimeout(0.5)
+
+        self.codec = av.CodecContext.create('h264', 'r')
+        self.codec.thread_count = decoder_threads
+        self.codec.thread_type = 'SLICE'    # frame threading adds one frame of delay per thread
+
+        self.datagrams = deque()    # (data, arrival_time)
+        self.max_queued_datagrams = max_queued_datagrams
+        self.datagram_cond = threading.Condition()
+
+        self.lock = threading.Lock()
+        self._frame = None
+        self.frame_time: float = None
+        self.skip_to_keyframe = True   # nothing decodes until the first keyframe (SPS/PPS) arrives anyway
+
+        self.metrics: Dict[str, float] = {
+            "datagrams_received": 0,
+            "datagrams_overflowed": 0,  # dropped because the decoder backlog was full
+            "packets_decoded": 0,
+            "packets_skipped": 0,       # discarded while waiting for the next keyframe
+            "frames_decoded": 0,
+            "frames_dropped": 0,        # decoded but too late to be worth converting
+            "keyframe_skips": 0,        # number of times latency budget was exceeded
+            "corrupt_slices": 0,
+            "decode_latency_ms": 0.0,   # arrival of the last datagram -> frame ready, exponential moving average
+            "decode_latency_max_ms": 0.0,
+        }
+
+        self.stopped = False
+        self.receiver = threading.Thread(target=self._receive_loop, daemon=True)
+        self.worker = threading.Thread(target=self._decode_loop, daemon=True)
+
+    def start(self):
+        """Start receiver and decoder threads."""
+        self.receiver.start()
+        self.worker.start()
+        logging.info(f"H264DecoderThread listening on {self.address[0]}:{self.address[1]} "
+                     f"({self.decoder_threads} decoder threads, {self.latency_budget_s*1000:.0f}ms latency budget)")
+        return self
+
+    def stop(self):
+        """Stop both threads and close the socket."""
+        self.stopped = True
+        with self.datagram_cond:
+            self.datagram_cond.notify_all()
+        for thread in (self.receiver, self.worker):
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=2)
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        logging.info(f"H264DecoderThread stopped. Metrics: {self.get_metrics()}")
+
+    @property
+    def frame(self):
+        """Latest decoded frame (RGB), same as BackgroundFrameRead.frame"""
+        with self.lock:
+            return self._frame
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Returns a copy of the decoder metrics"""
+        with self.lock:
+            metrics = dict(self.metrics)
+        with self.datagram_cond:
+            metrics["queued_datagrams"] = len(self.datagrams)
+        return metrics
+
+    def _receive_loop(self):
+        """Receiver thread: timestamps datagrams on arrival so decode lag can be measured"""
+        while not self.stopped:
+            try:
+                data, _ = self.sock.recvfrom(self.RECV_BUFSIZE)
+            except socket.timeout:
+                continue
+            except OSError:
+                break   # socket closed in stop()
+            arrival_time = time.time()
+
+            if self.packet_callback:
+                try:
+                    self.packet_callback(data, arrival_time)
+                except Exception as e:
+                    logging.error(f"H264DecoderThread packet_callback error: {e}")
+
+            with self.datagram_cond:
+                if len(self.datagrams) >= self.max_queued_datagrams:
+                    self.datagrams.popleft()
+                    self.metrics["datagrams_overflowed"] += 1
+                    self.skip_to_keyframe = True    # stream is now missing data
+                self.datagrams.append((data, arrival_time))
+                self.metrics["datagrams_received"] += 1
+                self.datagram_cond.notify()
+
+    def _decode_loop(self):
+        """Decoder thread: parse datagrams into packets, decode, drop what is too late"""
+        while not self.stopped:
+            with self.datagram_cond:
+                while not self.datagrams and not self.stopped:
+                    self.datagram_cond.wait(0.5)
+                if self.stopped:
+                    break
+                data, arrival_time = self.datagrams.popleft()
+
+            try:
+                packets = self.codec.parse(data)
+            except av.error.FFmpegError as e:
+                self._report_corrupt(f"parse error: {e}")
+                continue
+
+            for packet in packets:
+                self._decode_packet(packet, arrival_time)
+
+    def _decode_packet(self, packet, arrival_time: float):
+        lag = time.time() - arrival_time
+
+        if self.skip_to_keyframe:
+            if not packet.is_keyframe:
+                self.metrics["packets_skipped"] += 1
+                return
+            self.skip_to_keyframe = False
+            logging.debug(f"H264DecoderThread resynced on keyframe, lag {lag*1000:.0f}ms")
+        elif lag > self.latency_budget_s and not packet.is_keyframe:
+            # Fallen behind: decoding every packet in the backlog would keep us behind, so jump to the next keyframe
+            self.skip_to_keyframe = True
+            self.metrics["keyframe_skips"] += 1
+            self.metrics["packets_skipped"] += 1
+            logging.debug(f"H264DecoderThread lag {lag*1000:.0f}ms over budget, skipping to next keyframe")
+            return
+
+        if packet.is_corrupt:
+            self._report_corrupt("corrupt packet")
+
+        try:
+            frames = self.codec.decode(packet)
+        except av.error.FFmpegError as e:   # InvalidDataError etc.
+            self._report_corrupt(f"decode error: {e}")
+            return
+        self.metrics["packets_decoded"] += 1
+
+        for av_frame in frames:
+            self.metrics["frames_decoded"] += 1
+            if getattr(av_frame, "is_corrupt", False):
+                self._report_corrupt("corrupt frame")
+
+            # Newer data already waiting means this frame would be stale by the time anyone used it;
+            # skip the (expensive) colour conversion. Never drop while the backlog is empty.
+            with self.datagram_cond:
+                backlog = len(self.datagrams)
+            if backlog and time.time() - arrival_time > self.latency_budget_s / 2:
+                self.metrics["frames_dropped"] += 1
+                continue
+
+            image = av_frame.to_ndarray(format='rgb24')     # RGB to match djitellopy's BackgroundFrameRead
+            done_time = time.time()
+            latency_ms = (done_time - arrival_time) * 1000
+            with self.lock:
+                self._frame = image
+                self.frame_time = arrival_time
+                self.metrics["decode_latency_ms"] = 0.9 * self.metrics["decode_latency_ms"] + 0.1 * latency_ms
+                self.metrics["decode_latency_max_ms"] = max(self.metrics["decode_latency_max_ms"], latency_ms)
+
+            if self.frame_callback:
+                try:
+                    self.frame_callback(image, arrival_time)
+                except Exception as e:
+                    logging.error(f"H264DecoderThread frame_callback error: {e}")
+
+    def _report_corrupt(self, reason: str):
+        self.metrics["corrupt_slices"] += 1
+        logging.debug(f"H264DecoderThread: {reason}")
+        if self.error_callback:
+            try:
+                self.error_callback(reason)
+            except Exception as e:
+                logging.error(f"H264DecoderThread error_callback error: {e}")
@@ -0,0 +1,737 @@
+"""
+GUI-free core of the swarm server: the protocol and the shared state, on one asyncio event loop.
+
+Datagrams, the broadcast ticks, the marker / waypoint expiries and the takeoff barriers all run as callbacks / tasks
+of the same loop, so the state needs no lock. Anything outside the loop (the Tk monitor in swarmserverclient.MarkerServer,
+a test) only:
+- reads `core.state`, an immutable SwarmState snapshot republished (one reference assignment) on the broadcast tick
+  after anything changed;
+- calls the thread safe trigger_takeoff() / trigger_land() / stop().
+
+Headless (e.g. on a Linux box without a display):
+    python swarmserverclient.py --headless
+    SwarmCore(port=5005).run()                  # blocks
+    core = SwarmCore(port=5005).start_thread()  # in the background, e.g. under a GUI
+
+With journal_dir, every state change is journaled (swarmjournal.py) off the event loop. With journal_resume too, a
+restarted server resumes from the journal: same markers, waypoints and version, and the clients it knew get a
+snapshot at once. Without it (the default) the journal of the previous run is discarded: a new mission must not
+start with its landed / detected / occupied flags.
+
+See 0Diagnostics/bench_swarmserver.py for the load test.
+"""
+
+import copy
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Literal, Mapping, NamedTuple, Optional, Set
+
+try:
+    from swarmserver import swarmprotocol
+except ImportError:     # run from inside swarmserver/
+    import swarmprotocol
+try:
+    from swarmserver.swarmjournal import StateJournal
+except ImportError:
+    from swarmjournal import StateJournal
+
+SILENT_FIELDS = {"last_occupied_time"}     # server bookkeeping; changes to these alone are not broadcast
+RECENT_IDS = 256    # message ids remembered per client, to process retransmits only once
+REQUEST_AGAIN_S = 10   # takeoff requests from a released drone within this long are answered with its release again
+
+def _visible(entry: Dict) -> Dict:
+    return {k: v for k, v in entry.items() if k not in SILENT_FIELDS}
+
+def _frozen(table: Dict) -> Mapping:
+    return MappingProxyType({key: MappingProxyType(dict(entry)) for key, entry in table.items()})
+
+
+class SwarmState(NamedTuple):
+    """Read-only view of the server state at one moment, for observers outside the event loop"""
+    serial: int                 # changes whenever anything below does (drone_status changes do not bump version)
+    version: int                # state version broadcast to the clients
+    marker_status: Mapping[str, Mapping[str, Any]]
+    waypoint_status: Mapping[str, Mapping[str, Any]]
+    drone_status: Mapping[Any, Mapping[str, Any]]
+    clients: int
+    metrics: Mapping[str, int]
+
+
+class TakeoffBarrier:
+    """
+    One takeoff group, from the first ready drone's waiting list (drone_ids). Released by SwarmCore the moment every
+    drone of the list is ready, when the user triggers takeoff, or at the timeout if at least threshold of the list
+    is ready (otherwise aborted).
+    """
+    def __init__(self, barrier_id:int, drone_ids:Set):
+        self.id = barrier_id
+        self.drone_ids = set(drone_ids)
+        self.ready: Set = set()         # drones that asked to take off with this group
+        self.created = time.time()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.takeoff_at: Optional[float] = None     # server time the released drones take off at
+        self.released: List = []
+        self.reports: Dict[Any, float] = {}         # drone -> server time it actually took off (its estimate)
+        self.closed = False
+
+    def quorum(self) -> bool:
+        return self.drone_ids <= self.ready
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, core: "SwarmCore"):
+        self.core = core
+
+    def datagram_received(self, data: bytes, addr):
+        self.core.handle_datagram(data, addr)
+
+    def error_received(self, exc):
+        logging.warning(f"Swarm server socket error: {exc}")
+
+
+class SwarmCore:
+    """
+    Args:
+        tick_hz: broadcast ticks per second; changes in between are coalesced (urgent ones, e.g. landed, go at once)
+        snapshot_s: full state to every client this often, for clients that missed deltas or restarted
+        resend_s: a delta not yet acknowledged by a client is sent again after this long
+        marker_timeout / waypoint_timeout: a detected marker / occupied waypoint not refreshed for this long is released
+        valid_ids: markers that must all have landed before the landed flags are reset
+        takeoff_lead_s: a released group takes off this long after the release, all at the same (server) time, so
+            the takeoff message reaches every drone first
+        takeoff_timeout_s / takeoff_threshold: a group not complete after takeoff_timeout_s is released if at least
+            takeoff_threshold of it is ready, otherwise aborted
+        journal_dir: directory of the state journal (None: no journal)
+        journal_resume: resume from the journal in journal_dir (after a crash); False: discard it, start blank
+        journal_fsync_s: changes are written to disk in batches, at least this often
+        journal_snapshot_every: changes journaled between two snapshots (which compact the journal)
+    """
+    def __init__(self, host='0.0.0.0', port=5005, tick_hz:float = 20, snapshot_s:float = 5, resend_s:float = 0.5,
+                 marker_timeout:float = 5, waypoint_timeout:float = 10, valid_ids:Iterable[int] = range(1, 9),
+                 takeoff_lead_s:float = 0.3, takeoff_timeout_s:float = 600, takeoff_threshold:float = 0.8,
+                 journal_dir:Optional[str] = None, journal_resume:bool = False, journal_fsync_s:float = 0.05,
+                 journal_snapshot_every:int = 1000):
+        self.host = host
+        self.port = port
+        self.marker_timeout = marker_timeout
+        self.waypoint_timeout = waypoint_timeout
+        self.tick_s = 1 / tick_hz
+        self.snapshot_s = snapshot_s
+        self.resend_s = resend_s
+
+        self.marker_status: Dict[str, Dict[str, Any]] = {}
+        self.waypoints_status: Dict[str, Dict[str, Any]] = {}
+        self.drone_status: Dict[Any, Dict[str, Any]] = {}
+        self.last_updates: Dict[str, float] = {}
+        self.drone_addrs: Dict[Any, tuple] = {}     # drone id -> client addr it last sent from
+        self.client_clocks: Dict[Any, Dict] = {}    # drone id -> its clock offset / rtt to ours, from its pings
+
+        # Takeoff barriers (see register_ready_drone)
+        self.takeoff_lead_s = takeoff_lead_s
+        self.takeoff_timeout_s = takeoff_timeout_s
+        self.takeoff_threshold = takeoff_threshold
+        self.barriers: List[TakeoffBarrier] = []
+        self.takeoff_skews: List[Dict] = []    # per released group: release skew between its drones, as reported
+        self.valid_ids = valid_ids
+
+        # Expiry of detected markers / occupied waypoints (see _schedule_expiry): a min-heap of deadlines, entries
+        # refreshed or released since are skipped when they come up
+        self._expiry: List[tuple] = []                 # heap of (deadline, table, id)
+        self._deadlines: Dict[tuple, float] = {}       # (table, id) -> its current deadline (time.time())
+        self._expiry_timer: Optional[asyncio.TimerHandle] = None
+        self._expiry_at: Optional[float] = None
+
+        # Versioned state for delta broadcasts (see _broadcast)
+        self.tables = {"marker_status": self.marker_status, "waypoint_status": self.waypoints_status}
+        self.version = 0
+        self.entry_versions: Dict[tuple, int] = {}     # (table, id) -> version of the entry's last change
+        self._changed_at: Dict[tuple, float] = {}      # (table, id) -> time.time() of its last change (journal)
+        self.clients: Set[tuple] = set()
+        self.client_versions: Dict[tuple, int] = {}    # client addr -> version it acknowledged ("v" of its messages)
+        self.client_sent: Dict[tuple, tuple] = {}      # client addr -> (version, time) of the last delta sent to it
+        self.client_recent_ids: Dict[tuple, OrderedDict] = {}  # client addr -> message ids recently processed
+        self.json_clients: Set[tuple] = set()      # clients that sent JSON (old MarkerClient): answered in JSON, with
+                                                    # the full tables instead of snapshots / deltas (see _datagrams)
+        self.reassembler = swarmprotocol.Reassembler()
+        self.metrics = {"messages_received": 0, "invalid": 0, "changes": 0, "deltas_sent": 0, "snapshots_sent": 0,
+                        "duplicates": 0, "expired": 0, "expiry_stale": 0, "expiry_late_max_ms": 0.0,
+                        "takeoff_skew_max_ms": 0.0, "pings": 0}
+        self._prev_message = None
+
+        self.state = SwarmState(0, 0, MappingProxyType({}), MappingProxyType({}), MappingProxyType({}), 0,
+                                MappingProxyType(dict(self.metrics)))
+        self._state_dirty = False
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._urgent: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+        self.journal: Optional[StateJournal] = None
+        self.journal_snapshot_every = journal_snapshot_every
+        if journal_dir:
+            self.journal = StateJournal(journal_dir, journal_fsync_s)
+            if journal_resume:
+                recovered = self.journal.recover()
+                if recovered:
+                    self._restore(recovered)
+                    logging.warning(f"Resumed the previous run's state from {journal_dir}: version {self.version}, "
+                                    f"{len(self.marker_status)} markers, {len(self.waypoints_status)} waypoints")
+            else:
+                self.journal.reset()
+            self.journal.start()
+
+    ### RUNNING
+
+    async def serve(self):
+        """Runs the server on the current event loop until stop()"""
+        self.loop = asyncio.get_running_loop()
+        self._urgent = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self.transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=(self.host, self.port), allow_broadcast=True)
+        self.port = self.transport.get_extra_info("sockname")[1]    # if port 0 was asked for
+        logging.info(f"Swarm server started on {self.host}:{self.port}")
+        self._tasks = [asyncio.ensure_future(self._broadcast_loop())]
+        self._arm_expiry_timer()
+        for addr in self.clients:     # recovered from the journal: resync them to the recovered version at once
+            self.send_snapshot(addr)
+        try:
+            await self._stopping.wait()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            if self._expiry_timer:
+                self._expiry_timer.cancel()
+            self.transport.close()
+            if self.journal:
+                self.journal.close()
+            logging.info("Swarm server stopped.")
+
+    def run(self):
+        """Blocks until stop() (or Ctrl+C)"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    def start_thread(self, timeout:float = 5.0) -> "SwarmCore":
+        """Runs the event loop in a daemon thread; returns once the socket is bound"""
+        started = threading.Event()
+        async def serve():
+            task = asyncio.ensure_future(self.serve())
+            while self.transport is None and not task.done():
+                await asyncio.sleep(0.01)
+            started.set()
+            await task
+        threading.Thread(target=asyncio.run, args=(serve(),), name="swarm-core", daemon=True).start()
+        if not started.wait(timeout):
+            raise RuntimeError(f"Swarm server did not start on {self.host}:{self.port}")
+        return self
+
+    def call_soon(self, callback, *args):
+        """Runs callback(*args) on the event loop; thread safe"""
+        if self.loop is None:
+            raise RuntimeError("Swarm server is not running")
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def stop(self):
+        self.call_soon(self._stopping.set)
+
+    def trigger_takeoff(self):
+        """Sends a takeoff signal to all drones that are ready. Thread safe (e.g. from a GUI button)."""
+        self.call_soon(self._trigger_takeoff)
+
+    def trigger_land(self, send_repeat:int = 3):
+        """Sends a land signal to all connected drones. Thread safe."""
+        self.call_soon(self._trigger_land, send_repeat)
+
+    ### MESSAGES
+
+    def handle_datagram(self, data:bytes, addr):
+        try:
+            message:dict = self.reassembler.feed(data, addr)
+        except swarmprotocol.ProtocolError as e:
+            self.metrics["invalid"] += 1
+            logging.warning(f"Received invalid message from {addr}: {e}: {data[:64]}")
+            return
+        if message is None:     # fragment of a message not complete yet
+            return
+        try:
+            self.handle_message(message, addr, framed=swarmprotocol.is_framed(data))
+        except Exception as e:
+            logging.error(f"Error handling message {message} from {addr}: {e}")
+
+    def handle_message(self, message:Dict, addr, framed:bool = True):
+        received = time.time()
+        self.metrics["messages_received"] += 1
+        if framed:
+            self.json_clients.discard(addr)
+        else:
+            self.json_clients.add(addr)
+
+        # Any client we do not know yet (new, or this server restarted) is registered and gets a snapshot
+        if addr not in self.clients:
+            self.clients.add(addr)
+            self.client_versions[addr] = 0
+            if self.journal:
+                self.journal.append({"client": list(addr)})
+            self._state_dirty = True
+            logging.info(f"New client connected: {addr}")
+            self.send_snapshot(addr)
+
+        if "drone_id" in message:
+            self.drone_addrs[message["drone_id"]] = addr
+
+        duplicate = False
+        if "id" in message:     # reliable message from MarkerClient's send queue: ack it, process it once
+            self._send(addr, {"type": "received", "id": message["id"]})     # its "ts" is a clock sample for the client
+            recent_ids = self.client_recent_ids.setdefault(addr, OrderedDict())
+            duplicate = message["id"] in recent_ids
+            if duplicate:
+                self.metrics["duplicates"] += 1
+            else:
+                recent_ids[message["id"]] = None
+                if len(recent_ids) > RECENT_IDS:
+                    recent_ids.popitem(last=False)
+
+        if message != self._prev_message and not duplicate:
+            message_type = message.get("type")
+            if message.get("marker_id") == -1 or message_type == 'ack':
+                pass    # registration (handled above) / acknowledgement ("v" below)
+            elif message_type == 'takeoff_request' or message_type == 'status':
+                self.update_drone_status(message)
+            elif message_type == 'marker':
+                self.update_marker_status(message)
+            elif message_type == 'waypoint':
+                self.update_waypoint_status(message)
+            elif message_type == 'takeoff_released':
+                self.record_takeoff(message)
+            elif message_type == 'ping':
+                self._pong(message, addr, received)
+            else:
+                logging.warning(f"Invalid message format received from {addr}: {message}")
+        self._prev_message = message
+
+        if "v" in message:      # the client has applied the state up to this version
+            self.client_versions[addr] = min(message["v"], self.version)
+
+    def _pong(self, message:Dict, addr, received:float):
+        """
+        Answers a client's clock ping with our receive ("t1") and send ("t2") times. The ping carries the client's
+        current estimate of its offset to our clock and round trip time, kept per drone in client_clocks.
+        """
+        self._send(addr, {"type": "pong", "t0": message["t0"], "t1": received, "t2": time.time()})
+        self.metrics["pings"] += 1
+        if message.get("rtt") is not None:
+            drone_id = message.get("drone_id")
+            if drone_id not in self.client_clocks:
+                logging.info(f"Drone {drone_id} clock: offset {message['offset'] * 1000:.1f}ms, rtt {message['rtt'] * 1000:.1f}ms")
+            self.client_clocks[drone_id] = {"offset_ms": round(message["offset"] * 1000, 2),
+                                            "rtt_ms": round(message["rtt"] * 1000, 2), "at": received}
+
+    def update_marker_status(self, message:Dict):
+        """Update marker status and timestamp"""
+        marker_id = str(message["marker_id"])
+        if marker_id == "-1":
+            return
+        before = dict(self.marker_status.get(marker_id, {}))
+        entry = self.marker_status.setdefault(marker_id, {"detected": False, "landed": False})
+        entry["drone_id"] = message.get("drone_id", 0)  # Registers which drone ID detected that marker
+
+        if "detected" in message:
+            entry["detected"] = message["detected"]
+            if message["detected"]:     # Only update timestamp if marker is detected
+                self.last_updates[marker_id] = time.time()
+                self._schedule_expiry("marker_status", marker_id, self.last_updates[marker_id] + self.marker_timeout)
+            else:
+                self._schedule_expiry("marker_status", marker_id, None)
+        if "landed" in message:
+            entry["landed"] = message["landed"]
+            self._count_landed(marker_id, before.get("landed", False), entry["landed"])
+
+        # A claim or a landing is sent at once (other drones must not lock on); the rest waits for the tick
+        urgent = message.get("landed") is True or (message.get("detected") is True and not before.get("detected"))
+        if self._record_change("marker_status", marker_id, before, urgent=urgent):
+            logging.info(f"Marker {marker_id}: {entry}")
+
+    def update_waypoint_status(self, message:Dict):
+        """Update waypoint occupied status and timestamp"""
+        waypoint_id = str(message["marker_id"])
+        if waypoint_id == "-1":
+            return
+        before = dict(self.waypoints_status.get(waypoint_id, {}))
+        entry = self.waypoints_status.setdefault(waypoint_id, {"occupied": False, "last_occupied_time": 0})
+        entry["drone_id"] = message.get("drone_id", 0)  # Registers which drone ID occupies that waypoint
+
+        if "detected" in message:
+            entry["occupied"] = message["detected"]
+            if message["detected"]:     # Update last_occupied_time only if waypoint is occupied
+                entry["last_occupied_time"] = time.time()
+                self._schedule_expiry("waypoint_status", waypoint_id, entry["last_occupied_time"] + self.waypoint_timeout)
+            else:
+                self._schedule_expiry("waypoint_status", waypoint_id, None)
+        if self._record_change("waypoint_status", waypoint_id, before):
+            logging.info(f"Waypoint {waypoint_id}: {entry}")
+
+    def update_drone_status(self, message:Dict):
+        """Updates drones' readiness status based on message received."""
+        drone_id = message["drone_id"]
+        self.drone_status.setdefault(drone_id, {"ready": False})
+
+        if message["type"] == "takeoff_request":
+            logging.debug(f"{drone_id} requesting takeoff. Message: {message}")
+            self.register_ready_drone(drone_id, message["waiting_list"], message.get("status", None))
+        elif message["type"] == "status":
+            logging.debug(f"{drone_id} status update. Message: {message}")
+            self.drone_status[drone_id]["status"] = message["status"]
+        self._state_dirty = True
+
+        logging.info(f"Drone {drone_id}: {self.drone_status[drone_id]}")
+
+    def _record_change(self, table:Literal["marker_status", "waypoint_status"], entry_id:str, before:Dict = None,
+                       urgent:bool = False) -> bool:
+        """
+        Bumps the state version if the entry changed (fields in SILENT_FIELDS ignored).
+        before: the entry before the update; None if the caller already knows it changed.
+        """
+        if before is not None and _visible(before) == _visible(self.tables[table].get(entry_id, {})):
+            return False    # e.g. the same marker update, resent or repeated every frame
+        self.version += 1
+        self.entry_versions[(table, entry_id)] = self.version
+        self.metrics["changes"] += 1
+        self._state_dirty = True
+        if self.journal:
+            self._journal_change(table, entry_id)
+        if urgent:
+            self._urgent.set()
+        return True
+
+    ### JOURNAL
+
+    def _journal_change(self, table:Literal["marker_status", "waypoint_status"], entry_id:str):
+        """Queues the change for the journal writer thread (no disk access here); compacts every
+        journal_snapshot_every changes"""
+        now = time.time()
+        self.journal.append({"v": self.version, "table": table, "id": entry_id,
+                             "entry": dict(self.tables[table][entry_id]), "t": now})
+        self._changed_at[(table, entry_id)] = now
+        if self.journal.records_since_snapshot >= self.journal_snapshot_every:
+            self.journal.snapshot({
+                "version": self.version, "time": now, "tables": copy.deepcopy(self.tables),
+                "entry_versions": [[table, entry_id, version, self._changed_at.get((table, entry_id), now)]
+                                   for (table, entry_id), version in self.entry_versions.items()],
+                "clients": [[list(addr), self.client_versions.get(addr, 0)] for addr in self.clients]})
+
+    def _restore(self, recovered:Dict):
+        """Resumes from the state recovered from the journal (before serving)"""
+        for table, entries in recovered["tables"].items():
+            if table in self.tables:
+                self.tables[table].update(entries)
+        self.version = recovered["version"]
+        self.entry_versions.update(recovered["entry_versions"])
+        self._changed_at.update(recovered["changed_at"])
+        for addr, version in recovered["clients"].items():
+            self.clients.add(addr)
+            self.client_versions[addr] = min(version, self.version)
+        # Detected markers / occupied waypoints expire as if there had been no restart
+        for marker_id, entry in self.marker_status.items():
+            if entry.get("detected"):
+                self.last_updates[marker_id] = self._changed_at.get(("marker_status", marker_id), recovered["time"])
+                self._schedule_expiry("marker_status", marker_id, self.last_updates[marker_id] + self.marker_timeout)
+        for waypoint_id, entry in self.waypoints_status.items():
+            if entry.get("occupied"):
+                self._schedule_expiry("waypoint_status", waypoint_id,
+                                      entry.get("last_occupied_time", recovered["time"]) + self.waypoint_timeout)
+        self.valid_ids = self.valid_ids     # recounts the landed markers
+        self._state_dirty = True
+
+    ### BROADCASTS
+
+    def _send(self, addr, message:Dict) -> bool:
+        return self._send_datagrams(addr, self._datagrams(addr, message))
+
+    def _datagrams(self, addr, message:Dict) -> List[bytes]:
+        """
+        message encoded in the format the client at addr understands, stamped with our time ("ts") if not yet.
+        An old MarkerClient (JSON) knows no snapshots / deltas: it gets the full tables as the old server sent them,
+        one {"type": "marker_status" / "waypoint_status", "message": table} datagram each.
+        """
+        message.setdefault("ts", time.time())
+        if addr in self.json_clients:
+            if message.get("type") in ("snapshot", "delta"):
+                return [swarmprotocol.encode_json({"type": table, "message": self.tables[table]}) for table in self.tables]
+            return [swarmprotocol.encode_json(message)]
+        return swarmprotocol.encode(message)
+
+    def _send_datagrams(self, addr, datagrams:List[bytes]) -> bool:
+        try:
+            for datagram in datagrams:
+                self.transport.sendto(datagram, addr)
+            return True
+        except Exception as e:
+            logging.warning(f"Failed to send to client {addr}: {e}")
+            self._remove_client(addr)
+            return False
+
+    def _remove_client(self, addr):
+        self.clients.discard(addr)
+        for per_client in (self.client_versions, self.client_sent, self.client_recent_ids):
+            per_client.pop(addr, None)
+        self.json_clients.discard(addr)
+        self._state_dirty = True
+        if self.journal:
+            self.journal.append({"client_removed": list(addr)})
+        logging.info(f"Removed dead client: {addr}")
+
+    def _delta_since(self, version:int) -> Dict:
+        """Entries changed after version, per table"""
+        delta = {table: {} for table in self.tables}
+        for (table, entry_id), changed in self.entry_versions.items():
+            if changed > version:
+                delta[table][entry_id] = self.tables[table][entry_id]
+        return delta
+
+    def _snapshot_message(self) -> Dict:
+        return {"type": "snapshot", "version": self.version, **self.tables}
+
+    def send_snapshot(self, addr):
+        self.client_sent[addr] = (self.version, time.time())
+        self.metrics["snapshots_sent"] += 1
+        self._send(addr, self._snapshot_message())
+
+    def _send_to_all(self, message:Dict, addrs:Iterable[tuple]) -> int:
+        """Encodes message once per format (framed / JSON)"""
+        encoded: Dict[bool, List[bytes]] = {}
+        sent = 0
+        for addr in list(addrs):
+            is_json = addr in self.json_clients
+            if is_json not in encoded:
+                encoded[is_json] = self._datagrams(addr, message)
+            sent += self._send_datagrams(addr, encoded[is_json])
+        return sent
+
+    async def _broadcast_loop(self):
+        last_snapshot = time.time()
+        while True:
+            try:
+                await asyncio.wait_for(self._urgent.wait(), self.tick_s)
+            except asyncio.TimeoutError:
+                pass
+            self._urgent.clear()
+            now = time.time()
+            try:
+                if now - last_snapshot >= self.snapshot_s:
+                    last_snapshot = now
+                    self._broadcast_snapshot(now)
+                else:
+                    self._broadcast(now)
+                if self._state_dirty:
+                    self._publish_state()
+            except Exception as e:
+                logging.error(f"Error in broadcast: {e}")
+
+    def _broadcast(self, now:float):
+        """
+        Sends state changes to the clients, once per tick (or at once for urgent changes):
+        - each client behind the current version gets ONE delta with the entries changed since the version it
+          acknowledged, so a burst of updates (and their resends) costs one message per client;
+        - a delta not acknowledged within resend_s is sent again (covers lost datagrams).
+        """
+        by_base: Dict[int, List[tuple]] = {}    # clients that acknowledged the same version get the same delta
+        for addr in self.clients:
+            sent_version, sent_time = self.client_sent.get(addr, (0, 0))
+            # JSON clients never acknowledge: what they were sent counts as acknowledged (the snapshots resync them)
+            acked = sent_version if addr in self.json_clients else self.client_versions.get(addr, 0)
+            if acked >= self.version or (sent_version >= self.version and now - sent_time < self.resend_s):
+                continue
+            by_base.setdefault(acked, []).append(addr)
+            self.client_sent[addr] = (self.version, now)
+        for base, addrs in by_base.items():
+            delta = {"type": "delta", "base": base, "version": self.version, **self._delta_since(base)}
+            self.metrics["deltas_sent"] += self._send_to_all(delta, addrs)
+
+    def _broadcast_snapshot(self, now:float):
+        """Every snapshot_s, all clients get the full state, to resync clients that missed deltas or restarted"""
+        for addr in self.clients:
+            self.client_sent[addr] = (self.version, now)
+        self.metrics["snapshots_sent"] += self._send_to_all(self._snapshot_message(), self.clients)
+
+    def _publish_state(self):
+        self._state_dirty = False
+        self.state = SwarmState(self.state.serial + 1, self.version, _frozen(self.marker_status),
+                                _frozen(self.waypoints_status), _frozen(self.drone_status), len(self.clients),
+                                MappingProxyType(dict(self.metrics)))
+
+    ### TIMEOUTS
+
+    def _schedule_expiry(self, table:Literal["marker_status", "waypoint_status"], entry_id:str, deadline:Optional[float]):
+        """
+        The entry (detected marker / occupied waypoint) is released at deadline (time.time()), unless rescheduled
+        first; None: never. O(log n): the old deadline is left in the heap and skipped when it comes up.
+        """
+        key = (table, entry_id)
+        if deadline is None:
+            self._deadlines.pop(key, None)
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._expiry, (deadline, table, entry_id))
+        if len(self._expiry) > 4 * len(self._deadlines) + 64:     # mostly refreshed deadlines: rebuild
+            self._expiry = [(deadline, table, entry_id) for (table, entry_id), deadline in self._deadlines.items()]
+            heapq.heapify(self._expiry)
+        if self._expiry_at is None or deadline < self._expiry_at:
+            self._arm_expiry_timer()
+
+    def _arm_expiry_timer(self):
+        """One loop timer, for the earliest deadline in the heap"""
+        if self._expiry_timer:
+            self._expiry_timer.cancel()
+        self._expiry_timer = self._expiry_at = None
+        if self.loop is None or not self._expiry:
+            return
+        self._expiry_at = self._expiry[0][0]
+        self._expiry_timer = self.loop.call_later(max(0.0, self._expiry_at - time.time()), self._expire)
+
+    def _expire(self):
+        """Releases every entry whose deadline has passed (markers not seen for marker_timeout, waypoints not
+        refreshed for waypoint_timeout), then sleeps until the next deadline"""
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            deadline, table, entry_id = heapq.heappop(self._expiry)
+            if self._deadlines.get((table, entry_id)) != deadline:
+                self.metrics["expiry_stale"] += 1   # refreshed or released since
+                continue
+            del self._deadlines[(table, entry_id)]
+            self.metrics["expired"] += 1
+            self.metrics["expiry_late_max_ms"] = max(self.metrics["expiry_late_max_ms"], round((now - deadline) * 1000, 2))
+            if table == "marker_status":
+                logging.info(f"Clearing detected status for marker {entry_id} due to {self.marker_timeout}s timeout")
+                self.marker_status[entry_id]["detected"] = False
+            else:
+                logging.info(f"Releasing waypoint {entry_id} due to {self.waypoint_timeout}s timeout")
+                self.waypoints_status[entry_id]["occupied"] = False
+            self._record_change(table, entry_id)
+        self._arm_expiry_timer()
+
+    @property
+    def valid_ids(self) -> Set[int]:
+        return self._valid_ids
+
+    @valid_ids.setter
+    def valid_ids(self, ids:Iterable[int]):
+        self._valid_ids = set(ids)
+        self._valid_keys = {str(marker_id) for marker_id in self._valid_ids}
+        self._landed_valid = sum(bool(self.marker_status.get(key, {}).get("landed", False)) for key in self._valid_keys)
+
+    def _count_landed(self, marker_id:str, was_landed, landed):
+        """Keeps the number of valid markers landed; once all have, the landed flags are reset"""
+        if marker_id not in self._valid_keys or bool(was_landed) == bool(landed):
+            return
+        self._landed_valid += 1 if landed else -1
+        if self._landed_valid == len(self._valid_keys) > 0 and self.loop is not None:
+            self.loop.call_later(self.tick_s, self._reset_landed)  # after the tick that broadcasts the last landing
+
+    def _reset_landed(self):
+        if self._landed_valid < len(self._valid_keys):
+            return
+        logging.info(f"All valid markers {self.valid_ids} have landed. Resetting landed flags.")
+        for marker_id, entry in self.marker_status.items():
+            if entry.get("landed", False):
+                entry["landed"] = False
+                self._record_change("marker_status", marker_id, urgent=True)
+        self._landed_valid = 0
+
+    ### SIMUL TAKEOFF
+
+    def register_ready_drone(self, drone_id, waiting_list:List, status_str:str = None):
+        """
+        Registers a drone as ready. The first ready drone of a group opens its barrier (waiting_list + itself); drones
+        whose waiting list overlaps an open barrier join it. Released the moment the quorum is met.
+        """
+        self.drone_status[drone_id] = {"ready": True, "waiting_list": waiting_list, "status": status_str}
+        for barrier in self.barriers:
+            if drone_id in barrier.released and time.time() - barrier.takeoff_at < REQUEST_AGAIN_S:
+                self._send_takeoff(barrier, [self.drone_addrs[drone_id]])     # the takeoff message did not arrive
+                return
+
+        all_waiting_drones = set(waiting_list) | {drone_id}
+        barrier = next((b for b in self.barriers if not b.closed and b.drone_ids & all_waiting_drones), None)
+        if barrier is None:
+            barrier = TakeoffBarrier(len(self.barriers) + 1, all_waiting_drones)
+            barrier.timer = self.loop.call_later(self.takeoff_timeout_s, self._barrier_timeout, barrier)
+            self.barriers.append(barrier)
+            logging.info(f"Drone {drone_id} is first ready, takeoff barrier {barrier.id} waiting for {sorted(barrier.drone_ids)}")
+        elif drone_id not in barrier.ready:
+            logging.info(f"Drone {drone_id} is ready, joins takeoff barrier {barrier.id}")
+        barrier.ready.add(drone_id)
+        if barrier.quorum():
+            logging.info(f"All drones {sorted(barrier.drone_ids)} ready for takeoff!")
+            self.release_barrier(barrier)
+
+    def release_barrier(self, barrier:TakeoffBarrier):
+        """The group's ready drones take off together, takeoff_lead_s from now"""
+        barrier.closed = True
+        if barrier.timer:
+            barrier.timer.cancel()
+        barrier.released = sorted(barrier.ready)
+        barrier.takeoff_at = time.time() + self.takeoff_lead_s
+        logging.info(f"Takeoff barrier {barrier.id} released after {time.time() - barrier.created:.2f}s: "
+                     f"{barrier.released} take off in {self.takeoff_lead_s}s")
+        self._send_takeoff(barrier, list(self.clients))
+        self.loop.call_later(self.takeoff_lead_s + 5, self._report_skew, barrier)    # reports missing by then are left out
+
+    def _send_takeoff(self, barrier:TakeoffBarrier, addrs:List[tuple], send_repeat:int = 3):
+        """Each client takes off if in takeoff_list, at "at" (server time). Sent send_repeat times, 10ms apart."""
+        message = {"type": "takeoff", "takeoff_list": barrier.released, "at": barrier.takeoff_at, "barrier": barrier.id}
+        for repeat in range(send_repeat):
+            self.loop.call_later(0.01 * repeat, self._send_to_all, message, addrs)
+
+    def _barrier_timeout(self, barrier:TakeoffBarrier):
+        ready, expected = len(barrier.ready), len(barrier.drone_ids)
+        if ready / expected >= self.takeoff_threshold:
+            logging.warning(f"{self.takeoff_timeout_s}s timeout reached! {ready}/{expected} drones ready. Exceeded threshold of {self.takeoff_threshold*100}%. Sending only these drones: {sorted(barrier.ready)}")
+            self.release_barrier(barrier)
+        else:
+            logging.error(f"{self.takeoff_timeout_s}s timeout reached! {ready}/{expected} drones ready. Takeoff aborted.")
+            barrier.closed = True
+
+    def record_takeoff(self, message:Dict):
+        """A released drone's report of when it took off (in our timebase, from its clock offset estimate)"""
+        barrier = next((b for b in self.barriers if b.id == message.get("barrier")), None)
+        if barrier is None:
+            return
+        barrier.reports[message["drone_id"]] = message["t"]
+        if set(barrier.reports) >= set(barrier.released):
+            self._report_skew(barrier)
+
+    def _report_skew(self, barrier:TakeoffBarrier):
+        if not barrier.reports or any(skew["barrier"] == barrier.id for skew in self.takeoff_skews):
+            return
+        times = barrier.reports.values()
+        skew = {"barrier": barrier.id, "drones": len(barrier.reports), "released": len(barrier.released),
+                "skew_ms": round((max(times) - min(times)) * 1000, 2),
+                "late_max_ms": round((max(times) - barrier.takeoff_at) * 1000, 2)}
+        self.takeoff_skews.append(skew)
+        self.metrics["takeoff_skew_max_ms"] = max(self.metrics["takeoff_skew_max_ms"], skew["skew_ms"])
+        logging.info(f"Takeoff barrier {barrier.id}: {skew['drones']}/{skew['released']} drones reported, release skew "
+                     f"{skew['skew_ms']}ms, latest {skew['late_max_ms']}ms after the takeoff time")
+
+    def _trigger_takeoff(self):
+        """User trigger: every open barrier releases the drones ready so far"""
+        open_barriers = [barrier for barrier in self.barriers if not barrier.closed and barrier.ready]
+        if not open_barriers:
+            logging.warning("No drones are ready for takeoff.")
+        for barrier in open_barriers:
+            logging.info(f"Takeoff triggered by user. Drones {sorted(barrier.ready)} ready for takeoff!")
+            self.release_barrier(barrier)
+
+    def _trigger_land(self, send_repeat:int):
+        logging.info("Triggering landing...")
+        for _ in range(send_repeat):
+            self._send_to_all({"type": "land"}, self.clients)
+        logging.info(f"Land signal sent to all drones {send_repeat} times for reliability. ")
@@ -0,0 +1,192 @@
+"""
+Write-ahead journal of the swarm server state, so a restarted server resumes the mission instead of starting blank
+(drones landing on victims already claimed).
+
+    journal = StateJournal("swarm_journal")
+    recovered = journal.recover()           # before serving: None, or {"version", "tables", ...}
+    journal.start()
+    journal.append({"v": 12, "table": "marker_status", "id": "3", "entry": {...}})    # never blocks on disk
+    journal.snapshot(state)                 # compact: state replaces the journal written so far
+    journal.close()
+
+- append() only queues the record; the writer thread writes the queue as JSON lines and fsyncs once per fsync_s
+  (group commit), so a crash loses at most the last fsync_s of changes and the event loop never waits on the disk.
+- snapshot() is queued in order with the records. The writer writes it to a temp file, fsyncs and renames it over
+  snapshot.json, then starts a new journal segment (journal-<version>.log) and deletes the segments before it.
+- recover() loads snapshot.json and replays the segments after it. A torn last line (crash mid-write) is ignored.
+"""
+
+import os
+import glob
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+SNAPSHOT_FILE = "snapshot.json"
+
+
+class StateJournal:
+    """
+    Args:
+        directory: where the snapshot and journal segments are kept (created if needed)
+        fsync_s: longest time a record waits before it is on disk
+    """
+    def __init__(self, directory: str, fsync_s: float = 0.05):
+        self.directory = directory
+        self.fsync_s = fsync_s
+        self._queue: deque = deque()    # ("record", dict) / ("snapshot", dict), in order
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._segment = None
+        self.records_since_snapshot = 0
+        self.metrics = {"records": 0, "snapshots": 0, "fsyncs": 0, "bytes": 0, "max_batch": 0, "write_errors": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _segments(self):
+        return sorted(glob.glob(self._path("journal-*.log")))
+
+    def reset(self):
+        """Deletes the snapshot and journal: the next server starts blank"""
+        for path in self._segments() + [self._path(SNAPSHOT_FILE)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def recover(self) -> Optional[Dict]:
+        """
+        The last snapshot with every journaled record after it applied, or None if there is nothing to recover.
+        Returns {"version", "tables": {table: {id: entry}}, "entry_versions": {(table, id): version},
+        "changed_at": {(table, id): time.time() of its last change}, "clients": {addr: version}, "time"}.
+        """
+        start = time.perf_counter()
+        state = {"version": 0, "tables": {"marker_status": {}, "waypoint_status": {}}, "entry_versions": {},
+                 "changed_at": {}, "clients": {}, "time": 0.0}
+        found = False
+        snapshot_path = self._path(SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path) as f:
+                snapshot = json.load(f)
+            found = True
+            state["version"] = snapshot["version"]
+            state["time"] = snapshot["time"]
+            state["tables"].update(snapshot["tables"])
+            for table, entry_id, version, changed_at in snapshot["entry_versions"]:
+                state["entry_versions"][(table, entry_id)] = version
+                state["changed_at"][(table, entry_id)] = changed_at
+            state["clients"] = {tuple(addr): version for addr, version in snapshot["clients"]}
+
+        replayed = torn = 0
+        for path in self._segments():
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:      # torn write at the crash: nothing after it was acknowledged as durable
+                        torn += 1
+                        break
+                    found = True
+                    if "client" in record:
+                        state["clients"].setdefault(tuple(record["client"]), 0)
+                    elif "client_removed" in record:
+                        state["clients"].pop(tuple(record["client_removed"]), None)
+                    elif record["v"] > state["version"]:     # older records are in the snapshot already
+                        state["tables"].setdefault(record["table"], {})[record["id"]] = record["entry"]
+                        state["entry_versions"][(record["table"], record["id"])] = record["v"]
+                        state["changed_at"][(record["table"], record["id"])] = record["t"]
+                        state["version"] = record["v"]
+                        state["time"] = record["t"]
+                        replayed += 1
+        if not found:
+            return None
+        logging.info(f"Journal {self.directory}: recovered version {state['version']} "
+                     f"({sum(map(len, state['tables'].values()))} entries, {replayed} records replayed"
+                     f"{', torn last record ignored' if torn else ''}) in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return state
+
+    def start(self) -> "StateJournal":
+        segments = self._segments()
+        self._segment = open(segments[-1] if segments else self._path(f"journal-{0:012d}.log"), "a")
+        self._running = True
+        self._thread = threading.Thread(target=self._writer, name="swarm-journal", daemon=True)
+        self._thread.start()
+        return self
+
+    def append(self, record: Dict):
+        """Queues record (JSON serializable) for the writer thread"""
+        self._queue.append(("record", record))
+        self.records_since_snapshot += 1
+
+    def snapshot(self, state: Dict):
+        """
+        Queues a compact snapshot: {"version", "tables", "entry_versions": [[table, id, version, changed_at]...],
+        "clients": [[addr, version]...], "time"}. state must not be modified afterwards (pass copies).
+        """
+        self._queue.append(("snapshot", state))
+        self.records_since_snapshot = 0
+        self._wakeup.set()
+
+    def close(self, timeout: float = 2.0):
+        """Writes and fsyncs everything queued"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _writer(self):
+        while True:
+            self._wakeup.wait(self.fsync_s)
+            self._wakeup.clear()
+            batch = 0
+            try:
+                while self._queue:
+                    kind, item = self._queue.popleft()
+                    if kind == "record":
+                        line = json.dumps(item, separators=(",", ":")) + "\n"
+                        self._segment.write(line)
+                        self.metrics["bytes"] += len(line)
+                        self.metrics["records"] += 1
+                        batch += 1
+                    else:
+                        self._write_snapshot(item)
+                if batch:
+                    self._segment.flush()
+                    os.fsync(self._segment.fileno())
+                    self.metrics["fsyncs"] += 1
+                    self.metrics["max_batch"] = max(self.metrics["max_batch"], batch)
+            except (OSError, TypeError, ValueError) as e:
+                self.metrics["write_errors"] += 1
+                logging.error(f"Journal {self.directory}: write failed: {e}")
+            if not self._running and not self._queue:
+                self._segment.close()
+                return
+
+    def _write_snapshot(self, state: Dict):
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        tmp_path = self._path(SNAPSHOT_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(SNAPSHOT_FILE))
+        if hasattr(os, "O_DIRECTORY"):      # make the rename durable (not on Windows)
+            directory = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+        # Records up to the snapshot's version are in it: new segment, old ones deleted
+        old_segments = self._segments()
+        self._segment.close()
+        self._segment = open(self._path(f"journal-{state['version']:012d}.log"), "a")
+        for path in old_segments:
+            if path != self._segment.name:
+                os.remove(path)
+        self.metrics["snapshots"] += 1
@@ -0,0 +1,167 @@
+"""
+Wire format of the swarm server <-> MarkerClient messages.
+
+Messages used to be one JSON datagram each, read with recvfrom(1024): a snapshot of a large marker_status /
+waypoint_status was truncated and failed to parse. A framed datagram is:
+
+    header      magic (0xA7), protocol version, type tag, flags         4 bytes, struct "!BBBB"
+    [fragment]  message id, fragment index, fragment count              8 bytes, struct "!IHH", if FLAG_FRAGMENT
+    body        the message without "type", as compact JSON, zlib compressed if FLAG_ZLIB
+
+- The type is a one byte tag (TYPES); types not in TYPES keep their "type" in the body (tag 0).
+- Bodies of at least COMPRESS_MIN bytes are compressed when that makes them smaller (snapshots, big deltas).
+- A body larger than one datagram (max_payload, below the Ethernet MTU) is split into fragments; Reassembler joins
+  them, whatever order they arrive in, and drops incomplete messages after timeout_s.
+- JSON datagrams (the old format, always starting with "{") are still decoded, so old and new clients / servers can
+  run together during the rollout: the server answers each client in the format it last received from it.
+- Every message carries "ts": when it was created, on the server's clock (clients: MarkerClient.server_time()), so
+  messages and logs of all drones share one timebase. "ping" / "pong" keep each client's clock offset estimate current.
+
+    for datagram in encode({"type": "marker", "marker_id": 3, "detected": True}):
+        sock.sendto(datagram, addr)
+    message = reassembler.feed(data, addr)     # dict, or None until every fragment has arrived
+
+See 0Diagnostics/bench_swarmprotocol.py for encode / decode times and sizes vs JSON.
+"""
+
+import json
+import time
+import zlib
+import struct
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = 0xA7
+VERSION = 1
+HEADER = struct.Struct("!BBBB")
+FRAGMENT = struct.Struct("!IHH")
+FLAG_ZLIB = 0x01
+FLAG_FRAGMENT = 0x02
+
+MAX_DATAGRAM = 65535    # receive buffer size
+MAX_PAYLOAD = 1200      # bytes per datagram sent, under the 1500 byte MTU with IP / UDP headers
+COMPRESS_MIN = 256
+
+TYPES = ("marker", "status", "waypoint", "takeoff_request", "ack", "received", "snapshot", "delta", "takeoff", "land",
+         "ping", "pong")     # append only: the tags are on the wire
+TYPE_TAGS = {name: tag for tag, name in enumerate(TYPES, start=1)}
+
+_message_ids = itertools.count(1)
+
+
+class ProtocolError(ValueError):
+    """Datagram that is neither a valid frame nor JSON"""
+
+
+def is_framed(data: bytes) -> bool:
+    return bool(data) and data[0] == MAGIC
+
+
+def encode_json(message: Dict) -> bytes:
+    """Old format, for clients / servers that only read JSON"""
+    return json.dumps(message).encode()
+
+
+def encode(message: Dict, max_payload: int = MAX_PAYLOAD) -> List[bytes]:
+    """The datagrams to send for message (one, unless the body has to be fragmented)"""
+    tag = TYPE_TAGS.get(message.get("type"), 0)
+    fields = {k: v for k, v in message.items() if k != "type"} if tag else message
+    body = json.dumps(fields, separators=(",", ":")).encode()
+    flags = 0
+    if len(body) >= COMPRESS_MIN:
+        compressed = zlib.compress(body, 6)
+        if len(compressed) < len(body):
+            body, flags = compressed, FLAG_ZLIB
+
+    if HEADER.size + len(body) <= max_payload:
+        return [HEADER.pack(MAGIC, VERSION, tag, flags) + body]
+
+    chunk = max_payload - HEADER.size - FRAGMENT.size
+    count = -(-len(body) // chunk)
+    if count > 0xFFFF:
+        raise ProtocolError(f"Message of {len(body)} bytes is too large to fragment")
+    message_id = next(_message_ids) & 0xFFFFFFFF
+    header = HEADER.pack(MAGIC, VERSION, tag, flags | FLAG_FRAGMENT)
+    return [header + FRAGMENT.pack(message_id, index, count) + body[index * chunk:(index + 1) * chunk]
+            for index in range(count)]
+
+
+def _decode_body(tag: int, flags: int, body: bytes) -> Dict:
+    try:
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        message = json.loads(body)
+    except (zlib.error, ValueError) as e:
+        raise ProtocolError(f"Bad message body: {e}") from e
+    if tag:
+        if tag > len(TYPES):
+            raise ProtocolError(f"Unknown type tag {tag}")
+        message["type"] = TYPES[tag - 1]
+    return message
+
+
+def _parse_header(data: bytes) -> Tuple[int, int]:
+    if len(data) < HEADER.size:
+        raise ProtocolError(f"Truncated frame ({len(data)} bytes)")
+    _, version, tag, flags = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version} (this side speaks {VERSION})")
+    return tag, flags
+
+
+def decode(data: bytes) -> Dict:
+    """One unfragmented datagram, framed or JSON"""
+    if not is_framed(data):
+        try:
+            return json.loads(data.decode())
+        except ValueError as e:     # includes JSONDecodeError, UnicodeDecodeError
+            raise ProtocolError(f"Invalid JSON: {e}") from e
+    tag, flags = _parse_header(data)
+    if flags & FLAG_FRAGMENT:
+        raise ProtocolError("Fragment outside a Reassembler")
+    return _decode_body(tag, flags, data[HEADER.size:])
+
+
+class Reassembler:
+    """
+    Decodes datagrams from any number of senders, joining fragmented messages. Single thread only.
+    Args:
+        timeout_s: an incomplete message is dropped if no fragment of it arrived for this long
+    """
+    def __init__(self, timeout_s: float = 2.0):
+        self.timeout_s = timeout_s
+        self._pending: Dict[tuple, list] = {}   # (addr, message id) -> [last fragment time, count, {index: chunk}]
+        self.metrics = {"framed": 0, "json": 0, "fragments": 0, "reassembled": 0, "expired": 0}
+
+    def feed(self, data: bytes, addr=None) -> Optional[Dict]:
+        """The message, or None while fragments are missing. Raises ProtocolError on a bad datagram."""
+        if not is_framed(data):
+            self.metrics["json"] += 1
+            return decode(data)
+        self.metrics["framed"] += 1
+        tag, flags = _parse_header(data)
+        if not flags & FLAG_FRAGMENT:
+            return _decode_body(tag, flags, data[HEADER.size:])
+
+        if len(data) < HEADER.size + FRAGMENT.size:
+            raise ProtocolError(f"Truncated fragment ({len(data)} bytes)")
+        message_id, index, count = FRAGMENT.unpack_from(data, HEADER.size)
+        if index >= count:
+            raise ProtocolError(f"Fragment {index} of {count}")
+        self.metrics["fragments"] += 1
+        now = time.time()
+        self._expire(now)
+        key = (addr, message_id)
+        pending = self._pending.setdefault(key, [now, count, {}])
+        pending[0] = now
+        pending[2][index] = data[HEADER.size + FRAGMENT.size:]
+        if len(pending[2]) < count:
+            return None
+        del self._pending[key]
+        self.metrics["reassembled"] += 1
+        return _decode_body(tag, flags, b"".join(pending[2][i] for i in range(count)))
+
+    def _expire(self, now: float):
+        for key in [key for key, pending in self._pending.items() if now - pending[0] > self.timeout_s]:
+            del self._pending[key]
+            self.metrics["expired"] += 1
@@ -1,42 +1,57 @@
 """
 Works 20 Feb
-Run directly in terminal to open GUI for swarmserver.
-"""
+Run directly in terminal to open GUI for swarmserver (--headless: no GUI, e.g. on a Linux box).
+The server itself is swarmcore.SwarmCore (asyncio, no GUI); MarkerServer is its Tk monitor.
 
-import threading, socket, json, time, logging, argparse
-from typing import Dict, Set, Any, List, Literal
-import tkinter as tk
-from tkinter import ttk
+Client -> server messages are queued by MarkerClient.send_update and sent from a background thread with a message
+"id"; the server answers each with a "received" ack and the client retransmits (with backoff) until it arrives.
 
-class MarkerServer:
-    def __init__(self, host='0.0.0.0', port=5005, show_waypoints_window=False):
-        self.host = host
-        self.port = port
-        self.marker_timeout = 5
-        self.waypoint_timeout = 10
-        self.marker_status: Dict[str, Dict[str, Any]] = {}
-        self.drone_status: Dict[str, Dict[str, Any]] = {}
-        self.takeoff_waitlist = set()
-        self.waypoints_status: Dict[str, Dict[str, Any]] = {}
-        self.clients: Set[tuple] = set()
-        self.lock = threading.Lock()
-        self.last_updates: Dict[str, float] = {}
-        self.takeoff_triggered = False
-        self.show_waypoints_window = show_waypoints_window
+Server -> client state (marker_status, waypoint_status) is versioned: every change bumps SwarmCore.version, and
+clients get "delta" messages with only the entries changed since the version they acknowledged (the "v" of each of
+their messages), coalesced into broadcast ticks, plus a periodic full "snapshot" to resync. See SwarmCore._broadcast.
 
-        # Initialize sockets and logging as before
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        self.sock.bind((self.host, self.port))
+Messages are framed, possibly compressed and fragmented datagrams (swarmprotocol.py). JSON datagrams are still
+understood both ways; the server answers each client in the format it last received from it.
 
-        self.broadcast_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.broadcast_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        self.broadcast_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+Every client keeps an estimate of the server's clock (NTP-style pings, see MarkerClient._clock_sample): messages are
+stamped with MarkerClient.server_time(), and ServerTimeFilter puts log records on the same clock, so the logs of all
+drones and of the server line up.
+"""
 
-        self.valid_ids = set(range(1, 9))
+import threading, socket, time, logging, argparse, itertools
+from collections import OrderedDict, deque
+from typing import Dict, Set, Any, List, Literal, Optional
+try:
+    import tkinter as tk
+    from tkinter import ttk
+except ImportError:     # headless box: MarkerClient and SwarmCore still work
+    tk = ttk = None
+
+try:
+    from shared_utils.profiler import profiled
+except ImportError:     # run from inside swarmserver/ (e.g. example.py): no profiling
+    def profiled(name=None):
+        return lambda fn: fn
+
+try:
+    from swarmserver import swarmprotocol
+    from swarmserver.swarmcore import SwarmCore
+except ImportError:     # run from inside swarmserver/
+    import swarmprotocol
+    from swarmcore import SwarmCore
 
-        logging.info(f"Swarm server started on {self.host}:{self.port}")
+class MarkerServer:
+    """
+    Tk monitor of the swarm server. The protocol and state live in swarmcore.SwarmCore, on its own event loop thread;
+    the GUI only polls the core's immutable state snapshots, and its buttons call the core's thread safe triggers.
+    Args: as SwarmCore (tick_hz, snapshot_s, resend_s, ...), plus show_waypoints_window
+    """
+    def __init__(self, host='0.0.0.0', port=5005, show_waypoints_window=False, **core_args):
+        if tk is None:
+            raise RuntimeError("tkinter is not available: run the server with --headless")
+        self.core = SwarmCore(host, port, **core_args)
+        self.show_waypoints_window = show_waypoints_window
+        self.shown_serial = -1
 
         # Initialize GUI
         self.root = tk.Tk()
@@ -67,10 +82,10 @@ class MarkerServer:
         self.root.bind("<Configure>", lambda event: self.adjust_column_widths())
 
         # Add buttons for takeoff and landing
-        self.takeoff_button = tk.Button(self.root, text="Takeoff Ready Drones", command=self.trigger_takeoff)
+        self.takeoff_button = tk.Button(self.root, text="Takeoff Ready Drones", command=self.core.trigger_takeoff)
         self.takeoff_button.pack(fill=tk.X, pady=10)
 
-        self.land_button = tk.Button(self.root, text="Land All Drones", command=self.trigger_land)
+        self.land_button = tk.Button(self.root, text="Land All Drones", command=lambda: self.core.trigger_land())
         self.land_button.pack(fill=tk.X, pady=10)
 
         # Initialize waypoints status window if enabled
@@ -88,351 +103,15 @@ class MarkerServer:
         # Start updating the GUI periodically
         self.update_gui()
 
-    def trigger_takeoff(self):
-        """
-        Sends a takeoff signal to all drones that are ready.
-        """
-        ready_drones = [drone_id for drone_id, status in self.drone_status.items() if status.get("ready", False)]
-        if ready_drones:
-            self.takeoff_triggered = True     # resets countdown in wait_and_takeoff
-            logging.info(f"Takeoff triggered by user. Drones currently ready: {ready_drones}")      # NOTE: logic and ready_drones in wait_and_takeoff
-        else:
-            logging.warning("No drones are ready for takeoff.")
-
-    def trigger_land(self, send_repeat:int = 3):
-        """
-        Sends a land signal to all connected drones.
-        """
-        logging.info("Triggering landing...")
-        land_message = json.dumps({"type": "land"}).encode()
-        with self.lock:
-            for client_addr in self.clients:
-                for _ in range(send_repeat):
-                    try:
-                        self.broadcast_sock.sendto(land_message, client_addr)
-                    except Exception as e:
-                        logging.warning(f"Failed to send land signal to client {client_addr}: {e}")
-        logging.info(f"Land signal sent to all drones {send_repeat} times for reliability. ")
-
-    def check_timeouts(self):
-        """Check for markers and waypoints that haven't been updated and clear their status.
-        Also check if all valid markers have landed, and if so, reset all landed flags."""
-        while True:
-            try:
-                current_time = time.time()
-                status_changed = False
-                
-                with self.lock:
-                    # Check for marker timeouts
-                    for marker_id in list(self.marker_status.keys()):
-                        last_update = self.last_updates.get(marker_id, 0)
-                        if current_time - last_update > self.marker_timeout:
-                            if marker_id in self.marker_status and self.marker_status[marker_id].get("detected", False):
-                                logging.info(f"Clearing detected status for marker {marker_id} due to {self.marker_timeout}s timeout")
-                                self.marker_status[marker_id]["detected"] = False
-                                status_changed = True
-                    
-                    # Check for waypoint timeouts (1 minute timeout)
-                    for waypoint_id in list(self.waypoints_status.keys()):
-                        waypoint_data = self.waypoints_status[waypoint_id]
-                        if waypoint_data.get("occupied", False):
-                            last_occupied_time = waypoint_data.get("last_occupied_time", 0)
-                            if current_time - last_occupied_time > self.waypoint_timeout:
-                                logging.info(f"Releasing waypoint {waypoint_id} due to {self.waypoint_timeout}s timeout")
-                                self.waypoints_status[waypoint_id]["occupied"] = False
-                                status_changed = True
-                    
-                    # Check if all valid markers have landed
-                    all_landed = True
-                    valid_markers_exist = False
-                    
-                    for marker_id in self.valid_ids:
-                        str_marker_id = str(marker_id)
-                        if str_marker_id in self.marker_status:
-                            valid_markers_exist = True
-                            if not self.marker_status[str_marker_id].get("landed", False):
-                                all_landed = False
-                                break
-                        else:  # not all valid IDs are in marker_status - not all have landed!
-                            all_landed = False
-                            break
-                    
-                    # Reset all landed flags if all valid markers have landed
-                    if all_landed and valid_markers_exist:
-                        logging.info(f"All valid markers {self.valid_ids} have landed. Resetting landed flags.")
-                        for marker_id in self.marker_status:
-                            if self.marker_status[marker_id].get("landed", False):
-                                self.marker_status[marker_id]["landed"] = False
-                                status_changed = True
-                
-                if status_changed:
-                    self.broadcast_status('marker_status', self.marker_status)  # Broadcast updates to all clients
-                    self.broadcast_status('waypoint_status', self.waypoints_status)  # Broadcast waypoint updates
-                
-                time.sleep(1)  # Check every second
-            except Exception as e:
-                logging.error(f"Error in check_timeouts: {e}")
-                raise
-
-    def update_marker_status(self, message:Dict):
-        """Update marker status and timestamp"""
-        with self.lock:
-            try:
-                marker_id = str(message["marker_id"])
-                if marker_id != "-1" and marker_id is not None:
-                    # Initialize marker status if not exists
-                    if marker_id not in self.marker_status:
-                        self.marker_status[marker_id] = {
-                            "detected": False,
-                            "landed": False
-                        }
-
-                    self.marker_status[marker_id]["drone_id"] = message.get("drone_id", 0)  # Registers which drone ID detected that marker
-                    
-                    # Update status
-                    if "detected" in message:
-                        self.marker_status[marker_id]["detected"] = message["detected"]
-                        # Only update timestamp if marker is detected
-                        if message["detected"]:
-                            self.last_updates[marker_id] = time.time()
-                    
-                    if "landed" in message:
-                        self.marker_status[marker_id]["landed"] = message["landed"]
-                    
-                    logging.debug(f"Updated marker {marker_id} status: {self.marker_status[marker_id]}")
-            except Exception as e:
-                logging.error(f"Error updating marker status: {e}")
-
-        logging.info(f"Marker Statuses: {self.marker_status}")
-
-    def update_waypoint_status(self, message: Dict):
-        """NEW 6 MAR - Update waypoint occupied status and timestamp."""
-        with self.lock:
-            try:
-                waypoint_id = str(message["marker_id"])
-                if waypoint_id != "-1" and waypoint_id is not None:
-                    # Initialize waypoint status if not exists
-                    if waypoint_id not in self.waypoints_status:
-                        self.waypoints_status[waypoint_id] = {
-                            "occupied": False,
-                            "last_occupied_time": 0  # Initialize last_occupied_time
-                        }
-
-                    self.waypoints_status[waypoint_id]["drone_id"] = message.get("drone_id", 0)  # Registers which drone ID detected that waypoint
-                    
-                    # Update status
-                    if "detected" in message:
-                        self.waypoints_status[waypoint_id]["occupied"] = message["detected"]
-                        if message["detected"]:  # Update last_occupied_time only if waypoint is occupied
-                            self.waypoints_status[waypoint_id]["last_occupied_time"] = time.time()
-                    
-                    logging.debug(f"Updated waypoint {waypoint_id} status: {self.waypoints_status[waypoint_id]}")
-            except Exception as e:
-                logging.error(f"Error updating waypoint status: {e}")
-
-        logging.info(f"Waypoint Statuses: {self.waypoints_status}")
-
-    def update_drone_status(self, message):
-        """
-        Updates drones' readiness status based on message received.
-        """
-        drone_id = message["drone_id"]
-
-        if drone_id not in self.drone_status:
-            self.drone_status[drone_id] = {"ready": False}
-
-        # if "ready" in message:
-        #     # self.drone_status[drone_id]["ready"] = message["ready"]
-        #     # self.drone_status[drone_id]["status"] = message.get("status", "WOW") 
-        #     self.drone_status[drone_id]["status"] = message['status'] 
-        #     # self.drone_status[drone_id]["status"] = "WOW WHAT1"
-        #     logging.debug(f"{drone_id} ready")
-
-        if message["type"] == "takeoff_request":
-            logging.debug(f"{drone_id} requesting takeoff. Message: {message}")
-            self.drone_status[drone_id]["status"] = "WOW WHAT2"
-            waiting_list = message["waiting_list"]
-            status = message.get("status", None)
-            self.register_ready_drone(drone_id, waiting_list, status)
-
-        elif message["type"] == "status":
-            logging.debug(f"{drone_id} status update. Message: {message}")
-            self.drone_status[drone_id]["status"] = message["status"]
-
-        logging.info(f"Drone Statuses: {self.drone_status}")
-
-    def register_ready_drone(self, drone_id, waiting_list:List, status_str:str = None):
-        """
-        Registers a drone as ready and checks if all required drones are also ready.
-        """
-        with self.lock:
-            self.drone_status[drone_id] = {
-                "ready": True,
-                "waiting_list": waiting_list,
-                "status": status_str
-            }
-            all_waiting_drones = set(waiting_list) | {drone_id}
-
-            logging.debug(f"all_waiting_drones: {all_waiting_drones}")
-
-            # Check if we are the first drone to be ready in this group
-            if not (set(waiting_list) & self.takeoff_waitlist):  # No intersection
-                logging.info(f"Drone {drone_id} is first ready, starting countdown for {all_waiting_drones}")
-                threading.Thread(target=self.wait_and_takeoff, args=(all_waiting_drones,)).start()
-            else:
-                logging.info(f"Drone {drone_id} is ready, but waiting for others.")
-
-            self.takeoff_waitlist.update(all_waiting_drones)
-            logging.debug(f"Current Waitlist: {self.takeoff_waitlist}")
-    
-    def handle_messages(self):
-        prev_message = None
-        while True:
-            try:
-                data, addr = self.sock.recvfrom(1024)
-                try:
-                    message:dict = json.loads(data.decode())
-                    logging.debug(f"Received message from {addr}: {message}")
-
-                    if message != prev_message:
-                    
-                        # Handle client registration message
-                        if message.get("marker_id") == -1:
-                            if addr not in self.clients:
-                                with self.lock:
-                                    self.clients.add(addr)
-                                    logging.info(f"New client connected: {addr}")
-                                self.broadcast_status_to_one(addr, 'marker_status', self.marker_status)
-                        elif message.get("type") == 'takeoff_request' or message.get("type") == 'status':
-                            self.update_drone_status(message)
-                        elif message.get("type") == 'marker':
-                            self.update_marker_status(message)
-                        elif message.get("type") == 'waypoint':
-                            self.update_waypoint_status(message)
-                        else:
-                            logging.warning("Invalid message format received. See handle_messages in swarmserverclient")
-                            if addr not in self.clients:
-                                with self.lock:
-                                    self.clients.add(addr)
-                                    logging.info(f"New client connected: {addr}")
-                                self.broadcast_status_to_one(addr, "marker_status", self.marker_status)
-                                self.broadcast_status_to_one(addr, "waypoint_status", self.waypoints_status)
-                    
-                    prev_message = message
-                    self.broadcast_status('marker_status', self.marker_status)
-                    self.broadcast_status('waypoint_status', self.waypoints_status)     # NEW NEW NEW 6 MAR
-                        
-                except json.JSONDecodeError:
-                    logging.warning(f"Received invalid JSON from {addr}: {data}")
-                    
-            except Exception as e:
-                logging.error(f"Error handling message: {e}")
-
-    def broadcast_status_to_one(self, addr, message_type:Literal["marker_status", "waypoint_status"], message):
-        try:
-            message_to_send = {"type": message_type, "message": message}
-            status_json = json.dumps(message_to_send).encode()
-            self.broadcast_sock.sendto(status_json, addr)
-        except Exception as e:
-            logging.error(f"Error broadcasting to {addr}: {e}")
-
-    def broadcast_status(self, message_type:Literal["marker_status", "waypoint_status"], message):
-        try:
-            with self.lock:
-                message_to_send = {"type": message_type, "message": message}
-                status_json = json.dumps(message_to_send).encode()
-                
-                dead_clients = set()
-                for client_addr in self.clients:
-                    try:
-                        self.broadcast_sock.sendto(status_json, client_addr)
-                    except Exception as e:
-                        logging.warning(f"Failed to send to client {client_addr}: {e}")
-                        dead_clients.add(client_addr)
-                
-                # Remove dead clients
-                self.clients -= dead_clients
-                if dead_clients:
-                    logging.info(f"Removed dead clients: {dead_clients}")
-        except Exception as e:
-            logging.error(f"Error in broadcast_status: {e}")
-
     def run(self):
         try:
-            threads = [
-                threading.Thread(target=self.handle_messages, daemon=True),
-                threading.Thread(target=self.check_timeouts, daemon=True)
-            ]
-            for thread in threads:
-                thread.start()
-
-            # Start the GUI main loop
-            self.root.mainloop()
-
-            # # Keep main thread alive
-            # while True:
-            #     time.sleep(2)
-            #     logging.debug("GUI closed, but server is still running...")
-
+            self.core.start_thread()
+            self.root.mainloop()    # Start the GUI main loop
+            self.core.stop()
             logging.info("Swarm server terminated.")
         except Exception as e:
             logging.error(f"Error in server run: {e}")
 
-    ### SIMUL TAKEOFF FUNCTIONS
-
-    def wait_and_takeoff(self, all_waiting_drones, takeoff_timeout=600, threshold=0.8):
-        """
-        NEW FXN 17 FEB
-        Waits for all drones in the waiting list to be ready before sending a takeoff signal.
-        2 Mar - does not close thread; cannot run twice
-        """
-        logging.debug("wait_and_takeoff thread started.")
-        start_time = time.time()
-        while time.time() - start_time < takeoff_timeout:
-            status_copy = self.drone_status.copy()
-            ready_drones_inwaitlist = [d for d in all_waiting_drones if status_copy.get(d, {}).get("ready", False)]     # THIS ASSUMES THE FIRST DRONE REGISTERED HAS THE CORRECT WAITLIST - other drones' waitlists are disregarded 
-            ready_drones = [drone_id for drone_id, status in self.drone_status.items() if status.get("ready", False)]
-            if set(ready_drones_inwaitlist) == set(all_waiting_drones):
-                logging.info(f"All drones {ready_drones_inwaitlist} ready for takeoff!")
-                self.send_takeoff_signal(ready_drones_inwaitlist)
-                break
-            elif self.takeoff_triggered:
-                logging.info(f"User triggered takeoff. Drones {ready_drones} ready for takeoff!")
-                self.send_takeoff_signal(ready_drones)
-                break
-            time.sleep(1)
-            logging.debug(f"Waiting: {round((time.time() - start_time),0)}/{takeoff_timeout}s. Ready drones: {ready_drones}. Waitlist set by 1st ready drone: {all_waiting_drones}")
-
-        if not self.takeoff_triggered:
-            if len(ready_drones) / len(all_waiting_drones) >= threshold:
-                logging.warning(f"{takeoff_timeout}s timeout reached! {len(ready_drones)}/{len(all_waiting_drones)} drones ready. Exceeded threshold of {threshold*100}%. Sending only these drones: {ready_drones}")
-                self.send_takeoff_signal(ready_drones)
-            else:
-                logging.error(f"{takeoff_timeout}s timeout reached! {len(ready_drones)}/{len(all_waiting_drones)} drones ready. Takeoff aborted.")
-        
-        self.takeoff_triggered = False
-        logging.debug("wait_and_takeoff thread ended.")
-
-    def send_takeoff_signal(self, ready_drones:List, send_repeat: int = 3):
-        """
-        Sends takeoff signal to all ready drones.
-        """
-        if not ready_drones:
-            logging.warning("No drones were ready for takeoff.")
-            return
-
-        takeoff_message = json.dumps({"type": "takeoff", "takeoff_list": ready_drones}).encode()
-        with self.lock:
-            for client_addr in self.clients:
-                for _ in range(send_repeat):  # Send the message N times for reliability
-                    try:
-                        self.broadcast_sock.sendto(takeoff_message, client_addr)
-                        time.sleep(0.01)  # Small 10ms delay to prevent flooding
-                    except Exception as e:
-                        logging.warning(f"Failed to send to client {client_addr}: {e}")
-
-                    logging.debug(f"MarkerServer sent {takeoff_message} to {client_addr} (sent {send_repeat} times for reliability)")
-    
     ### 20 FEB GUI FUNCTIONS
 
     def adjust_column_widths(self):
@@ -452,17 +131,21 @@ class MarkerServer:
         self.drone_tree.column("Status", width=int(total_width * dec2 * 2.5))
 
     def update_gui(self):
-        """Update the GUI with the latest marker, drone, and waypoints statuses."""
+        """Update the GUI with the latest marker, drone, and waypoints statuses (a snapshot from the core)."""
         try:
-            # Clear the current tables
-            for row in self.marker_tree.get_children():
-                self.marker_tree.delete(row)
-            for row in self.drone_tree.get_children():
-                self.drone_tree.delete(row)
-
-            # Add rows for each marker status
-            for marker_id, status in self.marker_status.items():
-                if isinstance(status, dict):
+            state = self.core.state
+            if state.serial != self.shown_serial:   # tables are rebuilt only when something changed
+                self.shown_serial = state.serial
+                self.root.title(f"Marker and Drone Status Monitor - v{state.version}, {state.clients} clients")
+
+                # Clear the current tables
+                for row in self.marker_tree.get_children():
+                    self.marker_tree.delete(row)
+                for row in self.drone_tree.get_children():
+                    self.drone_tree.delete(row)
+
+                # Add rows for each marker status
+                for marker_id, status in state.marker_status.items():
                     detected = status.get("detected", False)
                     landed = status.get("landed", False)
                     drone_id = status.get("drone_id", 0)
@@ -472,9 +155,8 @@ class MarkerServer:
 
                     self.marker_tree.insert("", "end", values=(marker_id, detected_str, landed_str, drone_id))
 
-            # Add rows for each drone status
-            for drone_id, status in self.drone_status.items():
-                if isinstance(status, dict):
+                # Add rows for each drone status
+                for drone_id, status in state.drone_status.items():
                     ready = status.get("ready", False)
                     waiting_list = status.get("waiting_list", [])
                     status_str = status.get("status", "no status")
@@ -484,13 +166,12 @@ class MarkerServer:
 
                     self.drone_tree.insert("", "end", values=(drone_id, ready_str, waiting_list_str, status_str))
 
-            # Update waypoints status window if enabled
-            if self.show_waypoints_window:
-                for row in self.waypoints_tree.get_children():
-                    self.waypoints_tree.delete(row)
+                # Update waypoints status window if enabled
+                if self.show_waypoints_window:
+                    for row in self.waypoints_tree.get_children():
+                        self.waypoints_tree.delete(row)
 
-                for waypoint_id, status in self.waypoints_status.items():
-                    if isinstance(status, dict):
+                    for waypoint_id, status in state.waypoint_status.items():
                         occupied = status.get("occupied", False)
                         drone_id = status.get("drone_id", 0)
 
@@ -505,43 +186,129 @@ class MarkerServer:
         self.root.after(500, self.update_gui)
 
 
+PING_BURST = 4      # first clock pings, ping_s / 10 apart, for a quick first estimate
+LEGACY_SENDS = 3    # sends of each message to a server that predates acks (it was sent 3 times)
+
+
+class ServerTimeFilter(logging.Filter):
+    """
+    Puts log records on the swarm server's clock, as estimated by client: %(asctime)s and %(created)f are server
+    time, %(local_created)f keeps this machine's. Add it to handlers (see MarkerClient.log_in_server_time).
+    """
+    def __init__(self, client:"MarkerClient"):
+        super().__init__()
+        self.client = client
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        if not hasattr(record, "local_created"):    # once per record, whatever number of handlers it goes through
+            record.local_created = record.created
+            record.created += self.client.clock_offset
+            record.msecs = (record.created - int(record.created)) * 1000
+        return True
+
+
+class _OutgoingMessage:
+    __slots__ = ("id", "key", "message", "datagrams", "attempts", "next_send", "sent_at")
+
+    def __init__(self, message_id:int, key:tuple, message:Dict, datagrams:List[bytes]):
+        self.id = message_id
+        self.key = key
+        self.message = message      # to encode it again, if the server turns out not to understand frames
+        self.datagrams = datagrams
+        self.attempts = 0
+        self.next_send = 0.0    # at once
+        self.sent_at = 0.0
+
 class MarkerClient:
-    def __init__(self, drone_id=0, server_port=5005, broadcast_ip="255.255.255.255", land_callback=None):
+    """
+    Args:
+        retry_s: first retransmit delay of an unacknowledged message, doubled per attempt up to max_retry_s
+        max_attempts: sends of one message before it is dropped (server unreachable)
+        framed: True: send swarmprotocol frames; False: JSON, for a server that predates them; None: frames, falling
+            back to JSON if the server does not answer in frames within negotiate_s (then also, as the old server
+            acks nothing, each message is sent LEGACY_SENDS times, not retransmitted until acked)
+        ping_s: clock pings to the server this often (0: none, the clock offset then comes from acks only)
+    """
+    def __init__(self, drone_id=0, server_port=5005, broadcast_ip="255.255.255.255", land_callback=None,
+                 retry_s:float = 0.05, max_retry_s:float = 1.0, max_attempts:int = 8,
+                 framed:Optional[bool] = None, negotiate_s:float = 1.0, ping_s:float = 1.0):
         self.drone_id = drone_id
         self.server_port = server_port
         self.broadcast_ip = broadcast_ip
+        self.framed = framed is not False
+        self._negotiating = framed is None     # until the server's first answer (see _negotiated)
+        self.legacy_server = False      # the server predates frames and acks (fallen back to JSON)
+        self.reassembler = swarmprotocol.Reassembler()
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow reuse of address
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)  # Enable broadcast
         self.sock.bind(("0.0.0.0", 0))  # Bind to any available port
         self.ready = False
         self.takeoff_signal = False
+        self.takeoff_event = threading.Event()     # set by receive_updates when the server releases this drone
+        self.takeoff_at: Optional[float] = None    # local time to take off at (the server's shared takeoff time)
+        self.takeoff_barrier = None
         self.land_signal = False
         self.land_callback = land_callback
         
         self.marker_status = {}  # Keeps a local copy of marker_status
         self.waypoint_status = {}  # Keeps a local copy of waypoint_status
+        self.status_version = 0  # server state version applied to the local copies; sent as "v" with every message (acknowledges it)
+
+        # Reliable send queue: send_update only queues, _sender sends and retransmits until the server acks
+        self.retry_s = retry_s
+        self.max_retry_s = max_retry_s
+        self.max_attempts = max_attempts
+        self._message_ids = itertools.count(1)
+        self._outbox: "OrderedDict[tuple, _OutgoingMessage]" = OrderedDict()    # collapse key -> latest unacknowledged message
+        self._outbox_ids: Dict[int, tuple] = {}     # message id -> collapse key
+        self._send_cond = threading.Condition()
+        self._sending = True
+        self.send_metrics = {"queued": 0, "sent": 0, "retransmits": 0, "acked": 0, "superseded": 0, "expired": 0,
+                             "unacked": 0}
+
+        # Server clock - our clock, from pings and the acks' server timestamps (see _clock_sample)
+        self.ping_s = ping_s
+        self.clock_offset = 0.0
+        self.clock_rtt: Optional[float] = None      # None: no estimate yet, server_time() is our own clock
+        self._clock_samples: deque = deque(maxlen=16)     # (rtt, offset) of recent exchanges
+        threading.Thread(target=self._sender, daemon=True).start()
         threading.Thread(target=self.receive_updates, daemon=True).start()
+        if ping_s and self.framed:   # servers that predate frames do not answer pings
+            threading.Thread(target=self._pinger, daemon=True).start()
 
         self.send_update('marker', marker_id=-1)  # Send an initial message to register with the server
+        if self._negotiating:
+            timer = threading.Timer(negotiate_s, self._negotiated, args=(False,))
+            timer.daemon = True
+            timer.start()
         logging.info(f"Marker client {drone_id} broadcasting on {self.broadcast_ip}:{self.server_port}")
 
     def client_takeoff_simul(self, drones_list:list, status_message:str = None):
         """
         This is the holding pattern that releases the Client once takeoff_signal is received from server.
         (caa 13 Mar) Must launch server BEFORE client can register for it to work!
+        Blocks on takeoff_event (no polling delay), then waits for the group's shared takeoff time, so all drones of
+        the group are released together; when it actually released is reported to the server (release skew).
 
         Args:
             drones_list: For manual clicking, use drones_list = [99]
         """
         self._send_takeoff_request(drones_list, status_message=status_message)
-        
-        while not self.takeoff_signal:      # This is a holding pattern, which releases upon takeoff_signal being set by the server.
-            logging.debug(f"Tello {self.drone_id} waiting to take off. takeoff_signal: {self.takeoff_signal}")
+
+        while not self.takeoff_event.wait(0.5):     # This is a holding pattern, which releases upon the server's takeoff message
+            logging.debug(f"Tello {self.drone_id} waiting to take off.")
             self._send_takeoff_request(drones_list, status_message=status_message)   # TBC 12 MAR - continue sending takeoff requests, just in case. (will it be too spammy?)
-            time.sleep(0.5)  # Wait for takeoff command
 
-        logging.info(f"Tello {self.drone_id} is taking off!")
+        delay = self.takeoff_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        released = time.time()
+        self.takeoff_signal = True
+        self._enqueue({"type": "takeoff_released", "drone_id": self.drone_id, "barrier": self.takeoff_barrier,
+                       "t": released + self.clock_offset})
+        logging.info(f"Tello {self.drone_id} is taking off! ({(released - self.takeoff_at) * 1000:.1f}ms after the "
+                     f"group's takeoff time, clock offset {self.clock_offset * 1000:.1f}ms, rtt {(self.clock_rtt or 0) * 1000:.1f}ms)")
 
     def _send_takeoff_request(self, waiting_list:list, status_message:str=None):
         """
@@ -553,16 +320,14 @@ class MarkerClient:
             "drone_id": self.drone_id,
             "waiting_list": waiting_list,
             "ready": True,
-            "status": status_message
+            "status": status_message,
+            "v": self.status_version
         }
-        message_json = json.dumps(message).encode()
-
-        for _ in range(3):  # Send the message 5 times for reliability
-            self.sock.sendto(message_json, (self.broadcast_ip, self.server_port))
-            time.sleep(0.01)  # Small delay to prevent flooding
+        self._enqueue(message)     # delivered reliably by _sender (was: sent 3 times)
 
         logging.info(f"Drone {self.drone_id} is ready and waiting for {waiting_list} to takeoff together.")
     
+    @profiled("swarm.send_update")
     def send_update(self, 
                     update_type:Literal["status","marker","waypoint"], 
                     marker_id:int=None, detected:bool=None, landed:bool=None,
@@ -582,8 +347,11 @@ class MarkerClient:
             # insert search here
             send_update("waypoint", 1, detected = False)
 
+        Only queues the message and returns (microseconds): _sender sends it and retransmits until the server acks.
+        A newer update of the same kind (status, or the same fields of the same marker / waypoint) replaces one
+        that is not acknowledged yet. send_repeat is no longer used.
         """
-        message:Dict = {"drone_id": self.drone_id}       # initializes the message with drone_id (client's class attribute)
+        message:Dict = {"drone_id": self.drone_id, "v": self.status_version}       # initializes the message with drone_id (client's class attribute) and the state version we have
 
         if update_type == "marker" and marker_id is not None:
             message["type"] = "marker"
@@ -602,22 +370,152 @@ class MarkerClient:
             message["marker_id"] = marker_id
             message["detected"] = detected
 
-        message_json = json.dumps(message).encode()
-        for _ in range(send_repeat):  # Send the message N times for reliability
-            self.sock.sendto(message_json, (self.broadcast_ip, self.server_port))
-            time.sleep(0.01)  # Small 10ms delay to prevent flooding
+        self._enqueue(message)
+        logging.debug(f"MarkerClient {self.drone_id} queued {message}")
+
+    @staticmethod
+    def _collapse_key(message:Dict) -> tuple:
+        """Queued messages with the same key supersede each other, e.g. status strings, or detected updates of one marker"""
+        fields = tuple(k for k in ("detected", "landed") if k in message)
+        return (message.get("type"), message.get("marker_id"), fields)
+
+    def _enqueue(self, message:Dict):
+        with self._send_cond:
+            message["id"] = next(self._message_ids)
+            outgoing = _OutgoingMessage(message["id"], self._collapse_key(message), message, self._encode(message))
+            superseded = self._outbox.pop(outgoing.key, None)
+            if superseded is not None:
+                self._outbox_ids.pop(superseded.id, None)
+                self.send_metrics["superseded"] += 1
+            self._outbox[outgoing.key] = outgoing
+            self._outbox_ids[outgoing.id] = outgoing.key
+            self.send_metrics["queued"] += 1
+            self._send_cond.notify_all()
+
+    def _sender(self):
+        """Background thread: sends queued messages, and retransmits each with exponential backoff until acknowledged"""
+        while True:
+            with self._send_cond:
+                if not self._sending:
+                    return
+                now = time.time()
+                due = [m for m in self._outbox.values() if m.next_send <= now]
+                if not due:
+                    next_send = min((m.next_send for m in self._outbox.values()), default=None)
+                    self._send_cond.wait(None if next_send is None else next_send - now)
+                    continue
+                datagrams = []
+                for outgoing in due:
+                    if outgoing.attempts >= (LEGACY_SENDS if self.legacy_server else self.max_attempts):
+                        del self._outbox[outgoing.key]
+                        self._outbox_ids.pop(outgoing.id, None)
+                        if self.legacy_server:      # no ack will ever come: sent as the old client did
+                            self.send_metrics["unacked"] += 1
+                        else:
+                            self.send_metrics["expired"] += 1
+                            logging.warning(f"MarkerClient {self.drone_id}: no ack for message {outgoing.id} {outgoing.key} after {outgoing.attempts} sends, dropped")
+                        self._send_cond.notify_all()
+                        continue
+                    if outgoing.attempts:
+                        self.send_metrics["retransmits"] += 1
+                    outgoing.attempts += 1
+                    outgoing.sent_at = now
+                    outgoing.next_send = now + min(self.retry_s * 2 ** (outgoing.attempts - 1), self.max_retry_s)
+                    datagrams.extend(outgoing.datagrams)
+            sock = self.sock
+            if sock is None:
+                return
+            for datagram in datagrams:
+                try:
+                    sock.sendto(datagram, (self.broadcast_ip, self.server_port))
+                    self.send_metrics["sent"] += 1
+                except OSError as e:
+                    logging.warning(f"MarkerClient {self.drone_id} send failed: {e}")
 
-        logging.debug(f"MarkerClient {self.drone_id} sent {message} (sent {send_repeat} times for reliability)")
+    def _negotiated(self, server_framed:bool):
+        """
+        The server's first answer came in frames (server_framed), as JSON, or not within negotiate_s (False): a
+        server that predates frames cannot decode them and does not ack, so everything is sent again as JSON.
+        """
+        with self._send_cond:
+            if not self._negotiating:
+                return
+            self._negotiating = False
+            if server_framed:
+                return
+            self.framed = False
+            self.legacy_server = True
+            for outgoing in self._outbox.values():
+                outgoing.datagrams = self._encode(outgoing.message)
+                outgoing.attempts = 0
+                outgoing.next_send = 0.0
+            self._send_cond.notify_all()
+        logging.warning(f"MarkerClient {self.drone_id}: no framed answer from the server at port {self.server_port}, "
+                        f"sending JSON (server predates swarmprotocol)")
+
+    def server_time(self) -> float:
+        """time.time() on the server's clock (our own clock until the first ping / ack is answered)"""
+        return time.time() + self.clock_offset
+
+    def log_in_server_time(self, logger:logging.Logger = None):
+        """Adds a ServerTimeFilter to the handlers of logger (default: root), so their records are in server time"""
+        for handler in (logger or logging.getLogger()).handlers:
+            if not any(isinstance(f, ServerTimeFilter) for f in handler.filters):
+                handler.addFilter(ServerTimeFilter(self))
+
+    def _pinger(self):
+        """Background thread: clock pings, so the offset estimate follows clock drift even while we send nothing"""
+        for n in itertools.count():
+            while self._negotiating:    # no pings before the server has answered in frames
+                time.sleep(self.ping_s / 10)
+            sock = self.sock
+            if sock is None or not self.framed:    # cleanup() / old server
+                return
+            ping = {"type": "ping", "drone_id": self.drone_id, "t0": time.time(), "offset": self.clock_offset,
+                    "rtt": self.clock_rtt}
+            try:
+                for datagram in self._encode(ping):
+                    sock.sendto(datagram, (self.broadcast_ip, self.server_port))
+            except OSError as e:
+                if self.sock is not None:
+                    logging.warning(f"MarkerClient {self.drone_id} ping failed: {e}")
+            time.sleep(self.ping_s / 10 if n < PING_BURST else self.ping_s)
+
+    def _clock_sample(self, t0:float, t1:float, t2:float, t3:float):
+        """
+        One exchange, NTP-style: we sent at t0 and received the answer at t3 (our clock), the server received at t1
+        and answered at t2 (its clock; t1 == t2 for acks). Assuming symmetric paths, offset = ((t1 - t0) + (t2 - t3)) / 2
+        and rtt = (t3 - t0) - (t2 - t1). The offset of the fastest recent exchange is kept (min-filter): queueing
+        delays only ever add to the round trip, and make the paths asymmetric.
+        """
+        self._clock_samples.append(((t3 - t0) - (t2 - t1), ((t1 - t0) + (t2 - t3)) / 2))
+        self.clock_rtt, self.clock_offset = min(self._clock_samples)
+
+    def flush(self, timeout:float = 1.0) -> bool:
+        """Waits until every queued message is acknowledged (or dropped), up to timeout. True if none is pending."""
+        deadline = time.time() + timeout
+        with self._send_cond:
+            while self._outbox and time.time() < deadline:
+                self._send_cond.wait(deadline - time.time())
+            return not self._outbox
 
     def receive_updates(self):  # Background thread
-        while True:
+        while self.sock is not None:    # until cleanup()
             try:
-                data, _ = self.sock.recvfrom(1024)
-                message = json.loads(data.decode())
-
-                if message.get("type") == "takeoff" and self.drone_id in message.get("takeoff_list"):
-                    logging.info(f"Received takeoff signal for Tello {self.drone_id}")
-                    self.takeoff_signal = True  # Set flag for DroneController         
+                data, addr = self.sock.recvfrom(swarmprotocol.MAX_DATAGRAM)
+                message = self.reassembler.feed(data, addr)
+                if message is None:     # fragment of a message not complete yet
+                    continue
+                if self._negotiating:
+                    self._negotiated(swarmprotocol.is_framed(data))
+
+                if message.get("type") == "takeoff":
+                    if self.drone_id in message.get("takeoff_list") and not self.takeoff_event.is_set():
+                        # "at": the group's takeoff time on the server's clock (servers without barriers: now)
+                        self.takeoff_at = message["at"] - self.clock_offset if "at" in message else time.time()
+                        self.takeoff_barrier = message.get("barrier")
+                        self.takeoff_event.set()
+                        logging.info(f"Received takeoff signal for Tello {self.drone_id}, takeoff in {self.takeoff_at - time.time():.3f}s")
 
                 elif message.get("type") == "land":
                     logging.info(f"Received land signal for Tello {self.drone_id}")
@@ -625,7 +523,36 @@ class MarkerClient:
                     if self.land_callback:  # Trigger the callback
                         self.land_callback() 
                 
-                elif message.get("type") == "marker_status":
+                elif message.get("type") == "received":     # the server got one of our messages: stop retransmitting it
+                    with self._send_cond:
+                        self.legacy_server = False      # it acks after all (started after our negotiate_s)
+                        key = self._outbox_ids.pop(message.get("id"), None)
+                        if key is not None:
+                            outgoing = self._outbox.pop(key)
+                            server_time = message.get("ts", message.get("t"))
+                            if outgoing.attempts == 1 and server_time:     # a retransmitted message's ack is ambiguous
+                                self._clock_sample(outgoing.sent_at, server_time, server_time, time.time())
+                            self.send_metrics["acked"] += 1
+                            self._send_cond.notify_all()
+
+                elif message.get("type") == "pong":
+                    self._clock_sample(message["t0"], message["t1"], message["t2"], time.time())
+
+                elif message.get("type") == "snapshot":
+                    self._apply_state(message, replace=True)
+                    self._send_ack()
+                    logging.debug(f"Client's state is now version {self.status_version}: {self.marker_status}")
+
+                elif message.get("type") == "delta":
+                    # Holds every entry changed after base, so it applies to any local version from base on
+                    if message["base"] <= self.status_version < message["version"]:
+                        self._apply_state(message)
+                        self._send_ack()
+                        logging.debug(f"Applied delta {message['base']}->{message['version']}: {message}")
+                    else:
+                        logging.debug(f"Ignored delta {message['base']}->{message['version']} at version {self.status_version}")
+
+                elif message.get("type") == "marker_status":     # servers without versioned state
                     logging.info(f"Received marker status")
                     self.marker_status = message.get("message", None)
                     logging.debug(f"Client's marker_status is now: {self.marker_status}")
@@ -642,8 +569,28 @@ class MarkerClient:
             except socket.timeout:  # Handle timeouts (if a timeout is set)
                 pass
             except Exception as e:  # Catch any other exceptions
+                if self.sock is None:   # closed by cleanup() while receiving
+                    break
                 logging.error(f"Error receiving updates: {e}")
 
+    def _apply_state(self, message:Dict, replace:bool = False):
+        """Applies a snapshot (replace) or delta. New dicts are swapped in, so readers never see a half-applied update."""
+        markers, waypoints = message.get("marker_status", {}), message.get("waypoint_status", {})
+        self.marker_status = dict(markers) if replace else {**self.marker_status, **markers}
+        self.waypoint_status = dict(waypoints) if replace else {**self.waypoint_status, **waypoints}
+        self.status_version = message["version"]
+
+    def _send_ack(self):
+        """Acknowledges status_version, so the server does not resend what we already have"""
+        ack = {"type": "ack", "drone_id": self.drone_id, "v": self.status_version}
+        for datagram in self._encode(ack):
+            self.sock.sendto(datagram, (self.broadcast_ip, self.server_port))
+
+    def _encode(self, message:Dict) -> List[bytes]:
+        """message stamped with its creation time on the server's clock ("ts"), encoded"""
+        message.setdefault("ts", self.server_time())
+        return swarmprotocol.encode(message) if self.framed else [swarmprotocol.encode_json(message)]
+
     def is_marker_available(self, marker_id):
         marker_id = str(marker_id)  # Ensure it's a string to match dictionary keys
         marker_data:dict = self.marker_status.get(marker_id)
@@ -664,19 +611,29 @@ class MarkerClient:
     def get_invalid_markers(self, markers_list: list) -> list:
         return [id for id in markers_list if not self.is_marker_available(id)]
     
-    def cleanup(self):
-        """Clean up the socket when the program exits."""
+    def cleanup(self, flush_timeout:float = 1.0):
+        """Clean up the socket when the program exits, after up to flush_timeout for queued messages (e.g. Landed)."""
         if self.sock:
-            self.sock.close()
-            self.sock = None
+            if flush_timeout:
+                self.flush(flush_timeout)
+            with self._send_cond:
+                self._sending = False
+                self._send_cond.notify_all()
+            logging.debug(f"MarkerClient {self.drone_id} send metrics: {self.send_metrics}")
+            sock, self.sock = self.sock, None   # first, so the receive / ping threads see it as closed, not failed
+            sock.close()
 
     def __del__(self):
         """Destructor to ensure cleanup."""
-        self.cleanup()
+        self.cleanup(flush_timeout=0)
 
 def main():
     parser = argparse.ArgumentParser(description="Run the Marker Server with optional waypoints status window.")
     parser.add_argument("-w", "--show-waypoints", action="store_true", help="Enable the waypoints status window")
+    parser.add_argument("--headless", action="store_true", help="Run the server without the GUI")
+    parser.add_argument("--journal", default="swarm_journal", help="State journal directory")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume the state journaled by the previous run (after a crash); default: start blank")
     args = parser.parse_args()
 
     file_handler = logging.FileHandler("log_markerserver.log", mode='w')
@@ -686,8 +643,10 @@ def main():
     console_handler.setFormatter(formatter)
     logging.basicConfig(level=logging.DEBUG, handlers=[file_handler, console_handler])
 
-    server = MarkerServer(show_waypoints_window=args.show_waypoints)
-    server.run()
+    if args.headless:
+        SwarmCore(journal_dir=args.journal, journal_resume=args.resume).run()
+    else:
+        MarkerServer(show_waypoints_window=args.show_waypoints, journal_dir=args.journal, journal_resume=args.resume).run()
 
 if __name__ == "__main__": # Run directly to launch server!
     main()
\ No newline at end of file